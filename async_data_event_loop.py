@@ -0,0 +1,232 @@
+import asyncio
+import concurrent.futures
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+import log
+from data_event_loop import KlineTask, Task, decode_kline
+from model import Kline
+from sharded_executor import CoalescingMailbox
+from utils.json_util import dumps, loads
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover - uvloop不支持Windows
+    uvloop = None  # type: ignore[assignment]
+
+logger = log.getLogger(__name__)
+
+
+class AsyncTask:
+    """
+    原生异步任务
+    run_kline在事件循环中执行, 订单查询等IO操作可以直接await, 不占用线程池
+    """
+
+    def __init__(self):
+        self.name: str
+
+    def streams(self) -> List[str]:
+        """订阅的stream列表, 如 ['btcusdt@kline_5m']"""
+        raise NotImplementedError()
+
+    async def run_kline(self, kline: Kline) -> None:
+        pass
+
+
+class SyncTaskAdapter(AsyncTask):
+    """
+    将同步的KlineTask(StrategyTask/BacktestTask)接入异步事件循环
+    同步任务在线程池中执行, 同一任务的K线仍按顺序处理
+    """
+
+    def __init__(self, task: KlineTask, executor: Optional[concurrent.futures.Executor] = None):
+        super().__init__()
+        self.task = task
+        self.name = f'SyncTaskAdapter({getattr(task, "name", type(task).__name__)})'
+        self.executor = executor
+
+    def streams(self) -> List[str]:
+        return self.task.streams()
+
+    async def run_kline(self, kline: Kline) -> None:
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.task.run_kline, kline)
+
+
+class _TaskWorker:
+    """每个任务一个消费协程, 未完成K线按stream合并, 只处理最新一条"""
+
+    def __init__(self, task: AsyncTask):
+        self.task = task
+        self.mailbox: CoalescingMailbox[Kline] = CoalescingMailbox()
+        self.wakeup = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def put(self, kline: Kline, stream: str) -> None:
+        self.mailbox.put(kline, stream, replaceable=not kline.finished)
+        self.idle.clear()
+        self.wakeup.set()
+
+    async def run(self) -> None:
+        while True:
+            if not self.mailbox:
+                self.idle.set()
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            kline = self.mailbox.get()
+            try:
+                await self.task.run_kline(kline)
+            except Exception:
+                logger.error(f"Task {self.task.name} failed on kline {kline.timestamp}", exc_info=True)
+
+
+class AsyncBinanceDataEventLoop:
+    """
+    基于asyncio/uvloop的Binance K线事件循环
+    连接和心跳在事件循环中处理, 不与策略线程争用GIL
+    """
+
+    SET_PROPERTY_ID = 1
+    SUBSCRIBE_KLINE_ID = 2
+
+    def __init__(self, kline_subscribes: Optional[List[str]] = None,
+                 websocket_url: str = "wss://fstream.binance.com/stream",
+                 ping_interval: float = 20, ping_timeout: float = 15,
+                 max_reconnect_delay: float = 60, stop_timeout: float = 10):
+        self.kline_subscribes: List[str] = kline_subscribes if kline_subscribes is not None else []
+        self.websocket_url = websocket_url
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.max_reconnect_delay = max_reconnect_delay
+        self.tasks: List[AsyncTask] = []
+        self.stream_workers: Dict[str, List[_TaskWorker]] = {}
+        self._workers: List[_TaskWorker] = []
+        self._worker_futures: List[asyncio.Task[None]] = []
+        # 停止时等待任务处理完已投递K线的最长时间(秒)
+        self.stop_timeout = stop_timeout
+        self._running: bool = False
+        # 运行中的事件循环、run()任务和当前连接, stop()通过它们从其他线程停止
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._run_task: Optional[asyncio.Task[None]] = None
+        self._ws: Any = None
+
+    def add_task(self, task: AsyncTask | Task) -> None:
+        """添加任务, 同步KlineTask会自动包装为SyncTaskAdapter"""
+        if not isinstance(task, AsyncTask):
+            if not isinstance(task, KlineTask):
+                raise TypeError(f"Task {type(task).__name__} must be an AsyncTask or KlineTask")
+            task = SyncTaskAdapter(task)
+        self.tasks.append(task)
+        worker = _TaskWorker(task)
+        self._workers.append(worker)
+        for stream in task.streams():
+            self.stream_workers.setdefault(stream, []).append(worker)
+
+    def subscribed_streams(self) -> List[str]:
+        return self.kline_subscribes or list(self.stream_workers.keys())
+
+    def dispatch(self, kline: Kline, stream: Optional[str] = None) -> None:
+        if stream is None:
+            stream = kline.symbol.binance_ws_sub_kline(kline.timeframe)
+        for worker in self.stream_workers.get(stream, ()):
+            worker.put(kline, stream)
+
+    def handle_message(self, data: str | bytes) -> None:
+        data_obj: Dict[str, Any] = loads(data)
+        kline = decode_kline(data_obj)
+        if kline is not None:
+            self.dispatch(kline, data_obj['stream'])
+
+    def start_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._worker_futures = [loop.create_task(worker.run()) for worker in self._workers]
+
+    async def join(self) -> None:
+        """等待所有已投递的K线处理完成"""
+        for worker in self._workers:
+            await worker.idle.wait()
+
+    async def stop_workers(self) -> None:
+        for future in self._worker_futures:
+            future.cancel()
+        await asyncio.gather(*self._worker_futures, return_exceptions=True)
+        self._worker_futures = []
+
+    async def _subscribe(self, ws: Any) -> None:
+        await ws.send(dumps({"method": "SET_PROPERTY", "params": ["combined", True], "id": self.SET_PROPERTY_ID}))
+        kline_subscribes = self.subscribed_streams()
+        await ws.send(dumps({"method": "SUBSCRIBE", "params": kline_subscribes, "id": self.SUBSCRIBE_KLINE_ID}))
+        logger.info(f"### AsyncBinanceDataEventLoop Subscribed ### {kline_subscribes}")
+
+    async def _connect_forever(self) -> None:
+        reconnect_delay = 1.0
+        while self._running:
+            try:
+                async with websockets.connect(self.websocket_url, ping_interval=self.ping_interval,
+                                              ping_timeout=self.ping_timeout) as ws:
+                    self._ws = ws
+                    logger.info("### AsyncBinanceDataEventLoop Opened ###")
+                    await self._subscribe(ws)
+                    reconnect_delay = 1.0
+                    async for message in ws:
+                        self.handle_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error('AsyncBinanceDataEventLoop Error: %s', e)
+
+            if self._running:
+                logger.warning(f"### AsyncBinanceDataEventLoop Closed ### reconnect in {reconnect_delay}s")
+                await asyncio.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, self.max_reconnect_delay)
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._run_task = asyncio.current_task()
+        self._running = True
+        self.start_workers()
+        try:
+            await self._connect_forever()
+        except asyncio.CancelledError:
+            # stop()触发的取消正常结束, 其他取消继续传播
+            if self._running:
+                raise
+        finally:
+            self._running = False
+            self._ws = None
+            await self._drain()
+            await self.stop_workers()
+            self._run_task = None
+            self._loop = None
+
+    async def _drain(self) -> None:
+        """等待各任务处理完已投递的K线"""
+        try:
+            await asyncio.wait_for(self.join(), self.stop_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"AsyncBinanceDataEventLoop stop: tasks still busy after {self.stop_timeout}s")
+
+    def start(self) -> None:
+        """阻塞运行, 可用时使用uvloop"""
+        if uvloop is not None:
+            uvloop.run(self.run())
+        else:
+            asyncio.run(self.run())
+
+    def stop(self) -> None:
+        """停止运行, 可以在任意线程调用; 关闭连接并取消run(), run()在任务处理完已投递的K线后返回"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            self._running = False
+            return
+        loop.call_soon_threadsafe(self._request_stop)
+
+    def _request_stop(self) -> None:
+        self._running = False
+        if self._ws is not None:
+            asyncio.get_running_loop().create_task(self._ws.close())
+        if self._run_task is not None:
+            self._run_task.cancel()
@@ -1,9 +1,14 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
+import bisect
+import heapq
+import itertools
 import threading
+import numpy as np
 
 from client.ex_client import ExSwapClient
-from model import Symbol, SymbolInfo, OrderSide, PositionSide, OrderStatus, Kline
+from model import Symbol, SymbolInfo, OrderSide, PositionSide, OrderStatus, Kline, KlineBatch
+from data_event_loop import timeframe_to_ms
 import log
 
 logger = log.getLogger(__name__)
@@ -56,6 +61,56 @@ class BacktestPosition:
     unrealized_pnl: float = 0.0
 
 
+class OpenOrderBook:
+    """
+    某个symbol的未成交限价单
+    买单按价格从高到低、卖单按价格从低到高保存在堆中, 每根K线只弹出被[low, high]触及的订单, O(k log n)
+    撤销的订单不立即从堆中删除, 到达堆顶时丢弃; 失效订单超过一半时重建堆
+    """
+
+    def __init__(self):
+        # (-price, 序号, 订单)
+        self._buys: List[Tuple[float, int, BacktestOrder]] = []
+        # (price, 序号, 订单)
+        self._sells: List[Tuple[float, int, BacktestOrder]] = []
+        self._stale: int = 0
+
+    def __len__(self) -> int:
+        return len(self._buys) + len(self._sells) - self._stale
+
+    def add(self, order: BacktestOrder, seq: int) -> None:
+        if order.side == OrderSide.BUY:
+            heapq.heappush(self._buys, (-order.price, seq, order))
+        else:
+            heapq.heappush(self._sells, (order.price, seq, order))
+
+    def discard(self) -> None:
+        """标记一个订单已撤销"""
+        self._stale += 1
+        if self._stale > len(self._buys) + len(self._sells) - self._stale:
+            self._buys = [entry for entry in self._buys if entry[2].status == OrderStatus.OPEN]
+            self._sells = [entry for entry in self._sells if entry[2].status == OrderStatus.OPEN]
+            heapq.heapify(self._buys)
+            heapq.heapify(self._sells)
+            self._stale = 0
+
+    def pop_crossed(self, low: float, high: float) -> List[Tuple[int, BacktestOrder]]:
+        """弹出价格被[low, high]触及的订单, 返回(序号, 订单)"""
+        crossed = []
+        for heap, is_crossed in ((self._buys, lambda key: -key >= low), (self._sells, lambda key: key <= high)):
+            while heap:
+                key, seq, order = heap[0]
+                if order.status != OrderStatus.OPEN:
+                    heapq.heappop(heap)
+                    self._stale -= 1
+                elif is_crossed(key):
+                    heapq.heappop(heap)
+                    crossed.append((seq, order))
+                else:
+                    break
+        return crossed
+
+
 class BacktestClient(ExSwapClient):
     """回测客户端，模拟交易操作"""
 
@@ -73,7 +128,11 @@ class BacktestClient(ExSwapClient):
         self._symbol_infos: Dict[str, SymbolInfo] = symbol_infos or {}
 
         # 订单和持仓管理
+        # 全部订单(包括已成交和已撤销), 用于按ID查询
         self.orders: Dict[str, BacktestOrder] = {}
+        # symbol -> 未成交限价单
+        self._open_orders: Dict[str, OpenOrderBook] = {}
+        self._order_seq = itertools.count()
         self._positions: Dict[str, BacktestPosition] = {}
         self.order_history: List[BacktestOrder] = []
 
@@ -81,7 +140,9 @@ class BacktestClient(ExSwapClient):
 
         self.current_prices: Dict[str, float] = {}
 
-        self.historical_data: Dict[str, List[Kline]] = {}
+        self.historical_data: Dict[str, List[Kline] | KlineBatch] = {}
+        # timeframe -> 与historical_data中K线列表对应的收盘时间, 用于二分查找
+        self._close_times: Dict[str, List[int]] = {}
         self.current_timestamp: int = 0
 
         logger.info(f"BacktestClient initialized with balance: {initial_balance}")
@@ -99,16 +160,10 @@ class BacktestClient(ExSwapClient):
     def check_pending_orders(self, kline: Kline):
         """每根K线处理完后检查限价挂单是否触及成交"""
         with self.lock:
-            pending = [o for o in self.orders.values() if o.status == OrderStatus.OPEN
-                       and o.order_type == 'limit' and o.symbol.binance() == kline.symbol.binance()]
-            for order in pending:
-                triggered = False
-                if order.side == OrderSide.BUY and kline.low <= order.price:
-                    triggered = True
-                elif order.side == OrderSide.SELL and kline.high >= order.price:
-                    triggered = True
-
-                if triggered:
+            book = self._open_orders.get(kline.symbol.binance())
+            if book is not None:
+                # 同一根K线触及的订单按下单顺序成交
+                for _, order in sorted(book.pop_crossed(kline.low, kline.high), key=lambda entry: entry[0]):
                     self._fill_order(order)
 
         # 更新持仓浮盈
@@ -152,6 +207,8 @@ class BacktestClient(ExSwapClient):
                 order = self.orders[custom_id]
                 if order.status == OrderStatus.OPEN:
                     order.status = OrderStatus.CANCELED
+                    if order.order_type == 'limit':
+                        self._open_orders[order.symbol.binance()].discard()
                     logger.debug(f"Order {custom_id} canceled")
                 return order.to_dict()
             raise ValueError(f"Order {custom_id} not found")
@@ -191,7 +248,14 @@ class BacktestClient(ExSwapClient):
         )
 
         with self.lock:
+            replaced = self.orders.get(custom_id)
+            if replaced is not None and replaced.status == OrderStatus.OPEN and replaced.order_type == 'limit':
+                # 相同ID的新订单覆盖旧订单, 旧订单无法再查询, 不再参与撮合
+                replaced.status = OrderStatus.CANCELED
+                self._open_orders[replaced.symbol.binance()].discard()
             self.orders[custom_id] = order
+            if order_type == 'limit':
+                self._open_orders.setdefault(symbol.binance(), OpenOrderBook()).add(order, next(self._order_seq))
 
         if order_type == 'market':
             self._fill_order(order, fill_price=current_price)
@@ -309,25 +373,38 @@ class BacktestClient(ExSwapClient):
     def get_final_balance(self) -> float:
         return self._balance
 
-    def load_historical_data(self, timeframe: str, klines: List[Kline]):
+    def load_historical_data(self, timeframe: str, klines: List[Kline] | KlineBatch):
         with self.lock:
-            self.historical_data[timeframe] = sorted(klines, key=lambda k: k.timestamp)
+            if isinstance(klines, KlineBatch):
+                # 列式数据已按时间排序, 直接引用不复制
+                self.historical_data[timeframe] = klines
+                self._close_times.pop(timeframe, None)
+            else:
+                self.historical_data[timeframe] = sorted(klines, key=lambda k: k.timestamp)
+                timeframe_ms = timeframe_to_ms(timeframe)
+                self._close_times[timeframe] = [k.timestamp + timeframe_ms - 1 for k in self.historical_data[timeframe]]
             logger.info(f"Loaded {len(klines)} klines for timeframe {timeframe}")
 
-    def fetch_ohlcv(self, symbol: Symbol, timeframe: str, limit: int = 100) -> List[Kline]:
-        """返回截至当前回测时间的K线数据"""
+    def fetch_ohlcv(self, symbol: Symbol, timeframe: str, limit: int = 100) -> List[Kline] | KlineBatch:
+        """
+        返回截至当前回测时间已收盘的最近limit根K线, 二分查找收盘时间的位置后切片
+        高时间框架的K线在其收盘前不可见, 避免用到未来的OHLC
+        历史数据为KlineBatch时返回其列视图, 不创建Kline对象
+        """
         with self.lock:
             if timeframe not in self.historical_data:
                 logger.warning(f"No historical data available for timeframe {timeframe}")
                 return []
 
             klines = self.historical_data[timeframe]
-            current_klines = [k for k in klines if k.timestamp <= self.current_timestamp]
+            if isinstance(klines, KlineBatch):
+                # 收盘时间 <= 当前时间 等价于 开盘时间 <= 当前时间 - 周期 + 1, 不为整列计算收盘时间
+                end = int(np.searchsorted(klines.timestamp, self.current_timestamp - timeframe_to_ms(timeframe) + 1,
+                                          side='right'))
+            else:
+                end = bisect.bisect_right(self._close_times[timeframe], self.current_timestamp)
 
-            if not current_klines:
+            if end == 0:
                 logger.warning(f"No klines available before timestamp {self.current_timestamp} for timeframe {timeframe}")
                 return []
-
-            recent_klines = current_klines[-limit:] if len(current_klines) >= limit else current_klines
-
-            return recent_klines
+            return klines[max(0, end - limit):end]
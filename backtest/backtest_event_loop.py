@@ -1,10 +1,10 @@
 from typing import List, Dict, Any, Optional, Callable
 import log
 
-from data_event_loop import DataEventLoop, Task
+from data_event_loop import DataEventLoop, KlineTask, Task, timeframe_to_ms
 from model import Kline, Symbol
 from backtest.backtest_client import BacktestClient
-import json
+from utils.json_util import dumps
 
 logger = log.getLogger(__name__)
 
@@ -17,7 +17,8 @@ class BacktestEventLoop(DataEventLoop):
     def __init__(self, historical_klines: List[Kline],
                  on_progress_callback: Optional[Callable[[int, int], None]] = None,
                  start_timestamp: Optional[int] = None,
-                 start_index: Optional[int] = None):
+                 start_index: Optional[int] = None,
+                 wire_compat: bool = False):
         """
         初始化回测事件循环
 
@@ -26,10 +27,12 @@ class BacktestEventLoop(DataEventLoop):
             on_progress_callback: 进度回调函数，参数为(当前索引, 总数)
             start_timestamp: 回测起始时间戳（优先使用）
             start_index: 回测起始索引（向后兼容，默认300条预热数据）
+            wire_compat: 将K线编码为WebSocket消息再由任务解析, 用于验证实盘的消息解析路径; 默认直接投递Kline对象
         """
         super().__init__()
         self.historical_klines = historical_klines
         self.on_progress_callback = on_progress_callback
+        self.wire_compat = wire_compat
 
         if start_timestamp is not None:
             self.start_index = 0
@@ -58,6 +61,21 @@ class BacktestEventLoop(DataEventLoop):
         for task in self.tasks:
             task.run(data)
 
+    def dispatch(self, kline: Kline, stream: Optional[str] = None, received_at: Optional[float] = None):
+        """同步将Kline直接投递给订阅了对应stream的任务, 未声明stream的任务仍然接收WebSocket消息"""
+        if stream is None:
+            stream = kline.symbol.binance_ws_sub_kline(kline.timeframe)
+        subscribers = self.stream_tasks.get(stream, ())
+        message_data = None
+        for task in self.tasks:
+            if isinstance(task, KlineTask):
+                if task in subscribers:
+                    task.run_kline(kline)
+            else:
+                if message_data is None:
+                    message_data = self._kline_to_ws_message(kline)
+                task.run(message_data)
+
     def start(self):
         """开始回测（同步执行，阻塞直到完成）"""
         if self.is_running:
@@ -99,10 +117,13 @@ class BacktestEventLoop(DataEventLoop):
 
         if self.backtest_client:
             self.backtest_client.update_current_price(kline.symbol, kline.close)
-            self.backtest_client.update_current_timestamp(kline.timestamp)
+            # 时钟取K线收盘时间, fetch_ohlcv按收盘时间过滤, 当前K线可见
+            self.backtest_client.update_current_timestamp(kline.timestamp + timeframe_to_ms(kline.timeframe) - 1)
 
-        message_data = self._kline_to_ws_message(kline)
-        self.loop(message_data)
+        if self.wire_compat:
+            self.loop(self._kline_to_ws_message(kline))
+        else:
+            self.dispatch(kline)
 
         # 策略执行完后检查限价挂单是否触及成交
         if self.backtest_client:
@@ -138,7 +159,7 @@ class BacktestEventLoop(DataEventLoop):
                 }
             }
         }
-        return json.dumps(ws_data)
+        return dumps(ws_data)
 
     def _get_timeframe_ms(self, timeframe: str) -> int:
         if timeframe.endswith('m'):
@@ -1,5 +1,6 @@
+import os
+import numpy as np
 import pandas as pd
-import json
 from typing import List, Dict, Any, Optional, Union
 from pathlib import Path
 from datetime import datetime
@@ -7,7 +8,8 @@ import time
 import ccxt
 import log
 
-from model import Kline, Symbol
+from model import KLINE_BATCH_DTYPE, Kline, KlineBatch, Symbol, intern_symbol
+from utils.json_util import loads
 from ccxt.base.types import ConstructorArgs
 
 logger = log.getLogger(__name__)
@@ -39,6 +41,7 @@ class HistoricalDataLoader:
 
     def _df_to_klines(self, df: pd.DataFrame, symbol: Symbol, timeframe: str) -> List[Kline]:
         """将 DataFrame 向量化转为 Kline 列表"""
+        symbol = intern_symbol(symbol)
         return [
             Kline(
                 symbol=symbol,
@@ -70,6 +73,56 @@ class HistoricalDataLoader:
         logger.info(f"Loaded {len(klines)} klines from {file_path}")
         return klines
 
+    def load_batch(self, file_path: str, symbol: Symbol, timeframe: str) -> KlineBatch:
+        """从CSV/JSON文件加载为列式KlineBatch, 不创建Kline对象"""
+        if not Path(file_path).exists():
+            raise FileNotFoundError(f"Data file not found: {file_path}")
+        if file_path.endswith('.json'):
+            df = self._load_df(file_path, lambda path: pd.DataFrame(loads(Path(path).read_bytes())))
+        else:
+            df = self._load_df(file_path, pd.read_csv)
+        batch = KlineBatch.from_columns(symbol, timeframe, df['timestamp'].to_numpy(), df['open'].to_numpy(),
+                                        df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy(),
+                                        df['volume'].to_numpy())
+        logger.info(f"Loaded {len(batch)} klines from {file_path} as batch")
+        return batch
+
+    def publish_columns(self, file_path: str) -> str:
+        """
+        将CSV/JSON中的OHLCV按列写入同名的.npy文件(数据文件更新后重新生成)
+        @return .npy文件路径
+        """
+        if not Path(file_path).exists():
+            raise FileNotFoundError(f"Data file not found: {file_path}")
+        npy_path = str(Path(file_path).with_suffix('.npy'))
+        if os.path.exists(npy_path) and os.path.getmtime(npy_path) >= os.path.getmtime(file_path):
+            return npy_path
+
+        if file_path.endswith('.json'):
+            df = self._load_df(file_path, lambda path: pd.DataFrame(loads(Path(path).read_bytes())))
+        else:
+            df = self._load_df(file_path, pd.read_csv)
+        df = df.sort_values('timestamp', kind='stable')
+        data = np.empty(len(df), dtype=KLINE_BATCH_DTYPE)
+        for name in KLINE_BATCH_DTYPE.names:
+            data[name] = df[name].to_numpy()
+        # 先写临时文件再替换, 并发的进程不会读到写了一半的文件
+        tmp_path = f"{npy_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, data)
+        os.replace(tmp_path, npy_path)
+        logger.info(f"Published {len(data)} klines from {file_path} to {npy_path}")
+        return npy_path
+
+    def load_mmap(self, file_path: str, symbol: Symbol, timeframe: str) -> KlineBatch:
+        """
+        以内存映射方式加载历史K线, 不创建Kline对象
+        多进程回测时各进程映射同一个文件, 内存占用不随进程数增长; KlineBatch传给子进程时只传递文件路径
+        """
+        batch = KlineBatch.open_file(self.publish_columns(file_path), symbol, timeframe)
+        logger.info(f"Mapped {len(batch)} klines from {batch.path}")
+        return batch
+
     def load_json(self, file_path: str, symbol: Symbol, timeframe: str) -> List[Kline]:
         """从JSON文件加载历史K线数据"""
         if not Path(file_path).exists():
@@ -77,7 +130,7 @@ class HistoricalDataLoader:
 
         def _read_json(path: str) -> pd.DataFrame:
             with open(path, 'r') as f:
-                return pd.DataFrame(json.load(f))
+                return pd.DataFrame(loads(f.read()))
 
         df = self._load_df(file_path, _read_json)
         klines = self._df_to_klines(df, symbol, timeframe)
@@ -1,68 +1,90 @@
-import time
-from typing import List, Dict, Any, Optional, Callable
+import bisect
+import heapq
+import itertools
+from typing import Iterable, Iterator, List, Dict, Optional, Callable, Tuple
 import log
 
-from data_event_loop import Task
-from model import Kline
+import numpy as np
+
+from data_event_loop import KlineTask, Task, timeframe_to_ms
+from model import Kline, KlineBatch
 from backtest.backtest_client import BacktestClient
-import json
+from utils.json_util import dumps
 
 logger = log.getLogger(__name__)
 
+# 历史数据的key: timeframe, 或多个symbol时的(symbol, timeframe)
+SourceKey = str | Tuple[str, str]
+
+
+def source_timeframe(key: SourceKey) -> str:
+    return key if isinstance(key, str) else key[1]
+
 
 class MultiTimeframeBacktestEventLoop:
     """
     多时间框架回测事件循环，同时处理多个时间框架的历史数据重放（同步模式）
+    各(symbol, timeframe)的K线已按时间排序, 重放时用heapq.merge按K线收盘时间惰性归并:
+    - 内存占用与数据源数量成正比, 不复制全部K线
+    - 收盘时间相同时较小的时间框架先投递, 如15m K线在其区间内的最后一根5m K线之后投递
     """
 
-    def __init__(self, historical_data: Dict[str, List[Kline]],
+    def __init__(self, historical_data: Dict[SourceKey, List[Kline] | KlineBatch],
                  on_progress_callback: Optional[Callable[[int, int], None]] = None,
                  start_timestamp: Optional[int] = None,
-                 start_index: Optional[int] = None):
+                 start_index: Optional[int] = None,
+                 wire_compat: bool = False):
         """
         初始化多时间框架回测事件循环
 
         Args:
-            historical_data: 字典，key为timeframe，value为对应的历史K线数据列表
+            historical_data: 字典，key为timeframe(多个symbol时为(symbol, timeframe))，value为按时间排序的历史K线数据
             on_progress_callback: 进度回调函数，参数为(当前索引, 总数)
             start_timestamp: 回测起始时间戳（优先使用）
             start_index: 回测起始索引（向后兼容用）
+            wire_compat: 将K线编码为WebSocket消息再由任务解析, 用于验证实盘的消息解析路径; 默认直接投递Kline对象
         """
         self.historical_data = historical_data
-        self.timeframes = list(historical_data.keys())
+        self.timeframes = list(dict.fromkeys(source_timeframe(key) for key in historical_data))
         self.on_progress_callback = on_progress_callback
+        self.wire_compat = wire_compat
 
         # 任务列表
         self.tasks: List[Task] = []
+        # stream -> 订阅该stream的任务
+        self.stream_tasks: Dict[str, List[KlineTask]] = {}
 
-        # 为每个时间框架设置起始索引
-        self.start_indices = {}
-        for timeframe in self.timeframes:
-            klines = historical_data[timeframe]
+        # 为每个数据源设置起始索引
+        self.start_indices: Dict[SourceKey, int] = {}
+        for key, klines in historical_data.items():
             if start_timestamp is not None:
-                # 根据时间戳找到对应的索引
-                start_idx = 0
-                for i, kline in enumerate(klines):
-                    if kline.timestamp >= start_timestamp:
-                        start_idx = i
-                        break
-                self.start_indices[timeframe] = max(0, min(start_idx, len(klines) - 1))
+                # 根据时间戳找到对应的索引, 没有更晚的K线时从头开始
+                if isinstance(klines, KlineBatch):
+                    start_idx = int(np.searchsorted(klines.timestamp, start_timestamp, side='left'))
+                else:
+                    start_idx = bisect.bisect_left(klines, start_timestamp, key=lambda k: k.timestamp)
+                if start_idx == len(klines):
+                    start_idx = 0
+                self.start_indices[key] = max(0, min(start_idx, len(klines) - 1))
             elif start_index is not None:
                 # 使用索引（向后兼容）
-                self.start_indices[timeframe] = max(0, min(start_index, len(klines) - 1))
+                self.start_indices[key] = max(0, min(start_index, len(klines) - 1))
             else:
                 # 默认值
-                self.start_indices[timeframe] = 300
+                self.start_indices[key] = 300
 
-        # 收集所有K线并按时间排序
-        self.sorted_klines = self._collect_and_sort_klines()
+        self.total_klines = sum(self._count_finished(key) for key in historical_data)
         self.current_kline_index = 0
+        self._replay: Optional[Iterator[Kline]] = None
+        self._current_kline: Optional[Kline] = None
+        self._exhausted = False
 
         self.is_running = False
         self.is_paused = False
         self.backtest_client: Optional[BacktestClient] = None
 
-        logger.info(f"MultiTimeframeBacktestEventLoop initialized with timeframes: {self.timeframes}, total sorted klines: {len(self.sorted_klines)}")
+        logger.info(f"MultiTimeframeBacktestEventLoop initialized with {len(historical_data)} sources, "
+                    f"timeframes: {self.timeframes}, total klines: {self.total_klines}")
 
     def set_backtest_client(self, client: BacktestClient):
         """设置回测客户端"""
@@ -71,25 +93,41 @@ class MultiTimeframeBacktestEventLoop:
     def add_task(self, task: Task):
         """添加任务"""
         self.tasks.append(task)
+        if isinstance(task, KlineTask):
+            for stream in task.streams():
+                self.stream_tasks.setdefault(stream, []).append(task)
 
     def loop(self, data: str):
         """同步执行所有任务"""
         for task in self.tasks:
             task.run(data)
 
+    def dispatch(self, kline: Kline):
+        """同步将Kline直接投递给订阅了对应stream的任务, 未声明stream的任务仍然接收WebSocket消息"""
+        subscribers = self.stream_tasks.get(kline.symbol.binance_ws_sub_kline(kline.timeframe), ())
+        message_data = None
+        for task in self.tasks:
+            if isinstance(task, KlineTask):
+                if task in subscribers:
+                    task.run_kline(kline)
+            else:
+                if message_data is None:
+                    message_data = self._kline_to_ws_message(kline)
+                task.run(message_data)
+
     def start(self):
         """开始回测（同步执行）"""
         if self.is_running:
             logger.warning("Backtest already running")
             return
 
-        if not self.sorted_klines:
-            logger.error("No sorted klines available")
+        if self.total_klines == 0:
+            logger.error("No klines available")
             return
 
         self.is_running = True
         self.is_paused = False
-        self.current_kline_index = 0
+        self.seek_to_index(0)
 
         logger.info("Multi-timeframe backtest started (synchronous mode)")
 
@@ -114,51 +152,72 @@ class MultiTimeframeBacktestEventLoop:
         logger.warning("Step not supported in synchronous mode")
 
     def seek_to_index(self, index: int):
-        """跳转到指定索引"""
-        if 0 <= index < len(self.sorted_klines):
+        """跳转到指定索引, 从头归并并跳过前index根K线"""
+        if 0 <= index < self.total_klines:
+            self._replay = self.replay()
+            self._current_kline = None
+            self._exhausted = False
+            for _ in itertools.islice(self._replay, index):
+                pass
             self.current_kline_index = index
             logger.info(f"Seeked to kline index {index}")
         else:
-            logger.warning(f"Invalid index {index}, total klines: {len(self.sorted_klines)}")
+            logger.warning(f"Invalid index {index}, total klines: {self.total_klines}")
+
+    def _source(self, key: SourceKey) -> Iterable[Kline]:
+        """从起始索引开始的K线, KlineBatch切片为视图, 列表按迭代器读取, 都不复制"""
+        klines = self.historical_data[key]
+        start_idx = self.start_indices[key]
+        if isinstance(klines, KlineBatch):
+            return klines[start_idx:]
+        # 只处理完成的K线
+        return (kline for kline in itertools.islice(klines, start_idx, None) if kline.finished)
 
-    def _collect_and_sort_klines(self) -> List[Kline]:
-        """收集所有时间框架的K线并按时间戳排序"""
-        all_klines = []
+    def _count_finished(self, key: SourceKey) -> int:
+        klines = self.historical_data[key]
+        if isinstance(klines, KlineBatch):
+            return max(0, len(klines) - self.start_indices[key])
+        return sum(1 for _ in self._source(key))
 
-        for timeframe in self.timeframes:
-            klines = self.historical_data[timeframe]
-            start_idx = self.start_indices[timeframe]
+    def replay(self) -> Iterator[Kline]:
+        """按收盘时间归并所有数据源的K线, 收盘时间相同时较小的时间框架在前"""
+        timeframe_ms = {timeframe: timeframe_to_ms(timeframe) for timeframe in self.timeframes}
 
-            # 只包含从start_index开始的K线，并且只处理完成的K线
-            for i in range(start_idx, len(klines)):
-                kline = klines[i]
-                if kline.finished:
-                    all_klines.append(kline)
+        def close_time(kline: Kline) -> Tuple[int, int]:
+            ms = timeframe_ms[kline.timeframe]
+            return kline.timestamp + ms, ms
 
-        # 按时间戳排序
-        all_klines.sort(key=lambda k: k.timestamp)
+        return heapq.merge(*(self._source(key) for key in self.historical_data), key=close_time)
 
-        logger.info(f"Collected and sorted {len(all_klines)} klines from {len(self.timeframes)} timeframes")
-        return all_klines
+    def _close_time(self, kline: Kline) -> int:
+        """K线的收盘时间(最后一毫秒), 与Binance消息中的T字段一致"""
+        return kline.timestamp + timeframe_to_ms(kline.timeframe) - 1
 
     def _run_backtest_sync(self):
         """同步运行回测的主循环"""
-        while self.is_running and self.current_kline_index < len(self.sorted_klines):
+        while self.is_running:
             # 处理当前K线
-            current_kline = self.sorted_klines[self.current_kline_index]
-
-            # 更新回测客户端的价格和时间戳
+            current_kline = next(self._replay, None)
+            if current_kline is None:
+                self._exhausted = True
+                break
+            self._current_kline = current_kline
+
+            # 更新回测客户端的价格和时间戳; 按收盘时间归并, 时钟取K线收盘时间才单调递增,
+            # fetch_ohlcv也只返回已经投递的K线
             if self.backtest_client:
                 self.backtest_client.update_current_price(current_kline.symbol, current_kline.close)
-                self.backtest_client.update_current_timestamp(current_kline.timestamp)
+                self.backtest_client.update_current_timestamp(self._close_time(current_kline))
 
-            # 构造WebSocket消息并同步执行所有任务
-            message_data = self._kline_to_ws_message(current_kline)
-            self.loop(message_data)
+            # 同步执行所有任务, wire_compat时构造WebSocket消息
+            if self.wire_compat:
+                self.loop(self._kline_to_ws_message(current_kline))
+            else:
+                self.dispatch(current_kline)
 
             # 进度回调
             if self.on_progress_callback:
-                self.on_progress_callback(self.current_kline_index + 1, len(self.sorted_klines))
+                self.on_progress_callback(self.current_kline_index + 1, self.total_klines)
 
             self.current_kline_index += 1
 
@@ -199,37 +258,26 @@ class MultiTimeframeBacktestEventLoop:
             }
         }
 
-        return json.dumps(ws_data)
+        return dumps(ws_data)
 
     def _get_timeframe_ms(self, timeframe: str) -> int:
         """将时间框架转换为毫秒"""
-        # 解析时间框架，如"1m", "5m", "1h", "1d"
-        if timeframe.endswith('m'):
-            return int(timeframe[:-1]) * 60 * 1000
-        elif timeframe.endswith('h'):
-            return int(timeframe[:-1]) * 60 * 60 * 1000
-        elif timeframe.endswith('d'):
-            return int(timeframe[:-1]) * 24 * 60 * 60 * 1000
-        else:
-            # 默认1分钟
-            return 60 * 1000
+        return timeframe_to_ms(timeframe)
 
     @property
     def progress(self) -> float:
         """获取回测进度（0.0-1.0）"""
-        if not self.sorted_klines:
+        if self.total_klines == 0:
             return 0.0
 
-        return min(1.0, max(0.0, self.current_kline_index / len(self.sorted_klines)))
+        return min(1.0, max(0.0, self.current_kline_index / self.total_klines))
 
     @property
     def current_kline(self) -> Optional[Kline]:
         """获取当前K线"""
-        if 0 <= self.current_kline_index - 1 < len(self.sorted_klines):
-            return self.sorted_klines[self.current_kline_index - 1]
-        return None
+        return self._current_kline
 
     @property
     def is_completed(self) -> bool:
         """检查回测是否完成"""
-        return self.current_kline_index >= len(self.sorted_klines)
+        return self._exhausted or self.current_kline_index >= self.total_klines
@@ -0,0 +1,287 @@
+"""
+参数扫描: 对SignalGridStrategyConfig/AlphaTrendStrategyConfig的参数网格或随机采样并行回测
+- 每组参数在独立进程中使用独立的BacktestClient和临时的订单/状态文件
+- 历史数据使用HistoricalDataLoader.load_mmap加载时, 子进程映射同一个文件, 内存占用不随进程数增长
+- 结果汇总为按指标排序的DataFrame
+- 每完成一组参数追加一行到results_file(JSONL), 中断后重新运行会跳过已完成的参数;
+  run_id包含基础配置、回测环境和历史数据内容的摘要, 这些变化后不会误用旧结果
+"""
+import hashlib
+import itertools
+import os
+import random
+import tempfile
+from enum import Enum
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel, ValidationError
+
+import log
+from backtest.analyzer import BacktestAnalyzer
+from backtest.backtest_client import BacktestClient
+from backtest.backtest_event_loop import BacktestEventLoop
+from backtest.multi_timeframe_backtest_event_loop import MultiTimeframeBacktestEventLoop
+from model import Kline, KlineBatch
+from strategy import MultiTimeframeStrategy, Signal
+from strategy.alpha_trend_strategy import AlphaTrendStrategy, AlphaTrendStrategyConfig
+from strategy.grids_strategy_v2 import SignalGridStrategy, SignalGridStrategyConfig
+from task.backtest_task import BacktestTask
+from utils.json_util import dumps, loads
+
+logger = log.getLogger(__name__)
+
+StrategyConfig = SignalGridStrategyConfig | AlphaTrendStrategyConfig
+
+
+class SweepSettings(BaseModel):
+    """
+    回测环境, 所有参数组合共用
+    @param start_timestamp 回测起始时间戳, 之前的K线作为策略预热数据; None时跳过前300根
+    """
+    initial_balance: float = 10000.0
+    maker_fee: float = 0.0002
+    taker_fee: float = 0.0004
+    start_timestamp: Optional[int] = None
+    precompute_signals: bool = True
+
+
+def grid_search(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """参数网格的全部组合, 如 {'grid_spacing_rate': [0.05, 0.1], 'max_order': [12, 24]}"""
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_search(space: Dict[str, Any], n: int, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    随机采样n组参数
+    @param space 参数空间: 列表表示从中选取, (low, high)元组表示均匀分布, 两端都是int时取整数
+    """
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(n):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                params[name] = rng.randint(low, high) if isinstance(low, int) and isinstance(high, int) else rng.uniform(low, high)
+            else:
+                params[name] = rng.choice(list(values))
+        samples.append(params)
+    return samples
+
+
+def run_id(params: Dict[str, Any], context: str = '') -> str:
+    """
+    参数组合的标识, 用于断点续跑
+    @param context sweep_context的返回值, 基础配置、回测环境或数据不同时标识也不同
+    """
+    return hashlib.sha1((context + dumps(dict(sorted(params.items())))).encode()).hexdigest()[:16]
+
+
+def _signal_params(signal: Optional[Signal]) -> Any:
+    """信号的类型和标量参数, 嵌套的信号递归展开; 忽略指标状态等运行时对象"""
+    if signal is None:
+        return None
+    params: Dict[str, Any] = {'type': type(signal).__name__}
+    for name, value in vars(signal).items():
+        if isinstance(value, Signal):
+            params[name] = _signal_params(value)
+        elif isinstance(value, Enum):
+            params[name] = value.value
+        elif value is None or isinstance(value, (bool, int, float, str)):
+            params[name] = value
+    return params
+
+
+def _data_digest(klines: List[Kline] | KlineBatch) -> str:
+    """历史数据内容的摘要, 内存映射和内存中的相同数据摘要相同"""
+    if isinstance(klines, KlineBatch):
+        columns = (klines.timestamp, klines.open, klines.high, klines.low, klines.close, klines.volume)
+    else:
+        columns = (np.array([k.timestamp for k in klines], dtype=np.int64),
+                   *(np.array([getattr(k, name) for k in klines], dtype=np.float64)
+                     for name in ('open', 'high', 'low', 'close', 'volume')))
+    digest = hashlib.sha1()
+    for column in columns:
+        digest.update(np.ascontiguousarray(column).tobytes())
+    return digest.hexdigest()
+
+
+def sweep_context(base_config: StrategyConfig, historical_data: Dict[str, List[Kline] | KlineBatch],
+                  settings: SweepSettings) -> str:
+    """基础配置、回测环境和所用历史数据的摘要"""
+    context = {
+        'strategy': type(base_config).__name__,
+        # 订单/状态文件路径每次回测都会替换为临时文件
+        'config': base_config.model_dump(mode='json', exclude={'signal', 'order_file_path', 'backup_file_path'}),
+        'signal': _signal_params(getattr(base_config, 'signal', None)),
+        'settings': settings.model_dump(mode='json'),
+        'data': {timeframe: _data_digest(klines) for timeframe, klines in sorted(historical_data.items())},
+    }
+    return hashlib.sha1(dumps(context).encode()).hexdigest()
+
+
+def build_config(base_config: StrategyConfig, params: Dict[str, Any]) -> StrategyConfig:
+    """用参数覆盖基础配置并校验, 参数名不存在或值不合法时抛出ValueError"""
+    config_type = type(base_config)
+    unknown = set(params) - set(config_type.model_fields)
+    if unknown:
+        raise ValueError(f"Unknown {config_type.__name__} fields: {sorted(unknown)}")
+    try:
+        config = config_type.model_validate({**base_config.model_dump(), **params})
+    except ValidationError as e:
+        raise ValueError(f"Invalid parameters {params}: {e}") from e
+    # 信号等对象在model_dump中按引用保留, 深拷贝后每次回测使用独立的状态
+    return config.model_copy(deep=True)
+
+
+def _timeframes(config: StrategyConfig) -> List[str]:
+    if isinstance(config, SignalGridStrategyConfig):
+        return [config.timeframe]
+    return list(config.timeframes)
+
+
+def _build_strategy(config: StrategyConfig, client: BacktestClient, state_dir: str) -> MultiTimeframeStrategy:
+    if isinstance(config, SignalGridStrategyConfig):
+        config.order_file_path = os.path.join(state_dir, 'orders.json')
+        return SignalGridStrategy(config, client)
+    if isinstance(config, AlphaTrendStrategyConfig):
+        config.backup_file_path = os.path.join(state_dir, 'state.json')
+        return AlphaTrendStrategy(client, config)
+    raise ValueError(f"Unsupported strategy config: {type(config).__name__}")
+
+
+def run_backtest(config: StrategyConfig, historical_data: Dict[str, List[Kline] | KlineBatch],
+                 settings: SweepSettings) -> Dict[str, Any]:
+    """
+    运行一次回测并返回汇总指标
+    策略的订单/状态文件写入临时目录, 回测结束后删除
+    """
+    client = BacktestClient(initial_balance=settings.initial_balance, maker_fee=settings.maker_fee,
+                            taker_fee=settings.taker_fee)
+    timeframes = _timeframes(config)
+    data = {timeframe: historical_data[timeframe] for timeframe in timeframes}
+
+    with tempfile.TemporaryDirectory(prefix='sweep-') as state_dir:
+        strategy = _build_strategy(config, client, state_dir)
+        task = BacktestTask(config.symbol, strategy, client, data, precompute_signals=settings.precompute_signals)
+        if len(timeframes) == 1:
+            event_loop = BacktestEventLoop(data[timeframes[0]], start_timestamp=settings.start_timestamp)
+        else:
+            event_loop = MultiTimeframeBacktestEventLoop(data, start_timestamp=settings.start_timestamp)
+        event_loop.set_backtest_client(client)
+        event_loop.add_task(task)
+        event_loop.start()
+        event_loop.stop()
+        results = task.get_results()
+
+    analysis = BacktestAnalyzer(settings.initial_balance).analyze(results['trade_history'])
+    summary, risk, trade = analysis['summary'], analysis['risk_metrics'], analysis['trade_metrics']
+    return {
+        'final_balance': float(results['final_balance']),
+        'total_trades': int(summary['total_trades']),
+        'total_return': float(summary['total_return']),
+        'total_return_pct': float(summary['total_return_pct']),
+        'net_return': float(summary['net_return']),
+        'total_fees': float(summary['total_fees']),
+        'max_drawdown_pct': float(risk['max_drawdown_pct']),
+        'sharpe_ratio': float(risk['sharpe_ratio']),
+        'win_rate_pct': float(trade['win_rate_pct']),
+        'profit_factor': float(trade['profit_factor']),
+    }
+
+
+# 工作进程中的历史数据, 每个进程只传输一次; KlineBatch只传输文件路径
+_worker_data: Dict[str, List[Kline] | KlineBatch] = {}
+
+
+def _init_worker(historical_data: Dict[str, List[Kline] | KlineBatch]):
+    global _worker_data
+    _worker_data = historical_data
+
+
+def _run_job(base_config: StrategyConfig, params: Dict[str, Any], settings: SweepSettings) -> Tuple[Dict[str, Any], Optional[str]]:
+    try:
+        return run_backtest(build_config(base_config, params), _worker_data, settings), None
+    except Exception as e:
+        logger.error(f"Backtest failed for {params}: {e}", exc_info=True)
+        return {}, f"{type(e).__name__}: {e}"
+
+
+def _load_completed(results_file: str) -> Dict[str, Dict[str, Any]]:
+    completed: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(results_file):
+        return completed
+    with open(results_file, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = loads(line)
+            except Exception:
+                # 中断时写了一半的行
+                logger.warning(f"Skip malformed line in {results_file}")
+                continue
+            if not row.get('error'):
+                completed[row['run_id']] = row
+    return completed
+
+
+def run_sweep(base_config: StrategyConfig, param_sets: List[Dict[str, Any]],
+              historical_data: Dict[str, List[Kline] | KlineBatch], settings: Optional[SweepSettings] = None,
+              max_workers: Optional[int] = None, results_file: Optional[str] = None,
+              sort_by: str = 'net_return', ascending: bool = False) -> pd.DataFrame:
+    """
+    并行回测每组参数并返回排序后的结果表
+    @param base_config 基础配置, 每组参数覆盖其中的同名字段
+    @param param_sets grid_search/random_search生成的参数组合
+    @param max_workers 进程数, 默认为CPU核数
+    @param results_file 结果文件(JSONL), 相同基础配置、回测环境和数据下已有结果的参数组合不再运行; 失败的组合会在下次运行时重试
+    @param sort_by 排序的指标列
+    """
+    settings = settings or SweepSettings()
+    # 提前校验所有参数组合, 不合法的参数在启动进程池之前失败
+    for params in param_sets:
+        build_config(base_config, params)
+    context = sweep_context(base_config, historical_data, settings)
+    completed = _load_completed(results_file) if results_file else {}
+    rows = []
+    pending = []
+    seen = set()
+    for params in param_sets:
+        key = run_id(params, context)
+        if key in seen:
+            continue
+        seen.add(key)
+        if key in completed:
+            rows.append(completed[key])
+        else:
+            pending.append(params)
+    logger.info(f"Sweep: {len(param_sets)} parameter sets, {len(rows)} already completed, {len(pending)} to run")
+
+    if pending:
+        if results_file:
+            directory = os.path.dirname(results_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(historical_data,)) as pool:
+            futures = {pool.submit(_run_job, base_config, params, settings): params for params in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                params = futures[future]
+                metrics, error = future.result()
+                row = {'run_id': run_id(params, context), **params, **metrics, 'error': error}
+                rows.append(row)
+                if results_file:
+                    with open(results_file, 'ab') as f:
+                        f.write(dumps(row).encode() + b'\n')
+                logger.info(f"Sweep progress {done}/{len(pending)}: {params} -> {sort_by}={metrics.get(sort_by)}")
+
+    table = pd.DataFrame(rows)
+    if not table.empty and sort_by in table.columns:
+        table = table.sort_values(sort_by, ascending=ascending, na_position='last').reset_index(drop=True)
+    return table
@@ -88,7 +88,7 @@ def run_signal_grid_backtest(data_file="data/ethusdt_2025_10_1m.csv"):
         # 5. 创建回测任务
         # 准备历史数据字典
         historical_data = {timeframe: historical_klines}
-        backtest_task = BacktestTask(symbol, strategy, backtest_client, historical_data)
+        backtest_task = BacktestTask(symbol, strategy, backtest_client, historical_data, precompute_signals=True)
 
         # 6. 创建回测事件循环
         def progress_callback(current, total):
@@ -0,0 +1,113 @@
+"""
+K线对象微基准: 原有实现(带__dict__、构造时格式化datetime) vs __slots__的Kline vs 列式KlineBatch
+- 构造一年1m K线(约52.5万根)的耗时和内存
+- 全部访问一次datetime的额外耗时(惰性格式化只在需要时发生)
+- 策略的实际路径: 每根K线先推送一次未完成更新再推送完成, 写入KlineBuffer, 定期构建DataFrame;
+  KlineBuffer只保存时间戳, datetime在构建DataFrame时为新K线格式化
+
+运行: python -m benchmark.kline_bench
+"""
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Tuple
+
+import numpy as np
+
+from model import Kline, KlineBatch, Symbol
+from strategy.kline_buffer import KlineBuffer
+
+YEAR_OF_1M = 365 * 24 * 60
+
+
+class LegacyKline:
+    """原有实现"""
+
+    def __init__(self, symbol: Symbol, timeframe: str, open: float, high: float, low: float, close: float,
+                 volume: float, timestamp: int, finished: bool):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.timestamp = timestamp
+        self.datetime = datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S')
+        self.finished = finished
+
+
+def _columns(n: int) -> Tuple[list, ...]:
+    rng = np.random.default_rng(7)
+    close = 2000 + np.cumsum(rng.normal(0, 1, n))
+    timestamp = 1_700_000_000_000 + np.arange(n, dtype=np.int64) * 60_000
+    return (timestamp.tolist(), close.tolist(), (close + 1).tolist(), (close - 1).tolist(), close.tolist(),
+            rng.uniform(1, 10, n).tolist())
+
+
+def _measure(build: Callable[[], Any]) -> Tuple[Any, float, int]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _report(name: str, elapsed: float, peak: int, baseline: Tuple[float, int]) -> None:
+    print(f"{name:<28} {elapsed * 1e3:9.1f}ms  {peak / 2 ** 20:8.1f}MiB  "
+          f"time x{baseline[0] / elapsed:5.1f}  memory x{baseline[1] / peak:5.1f}")
+
+
+def _replay(cls, symbol: Symbol, rows: list, frame_every: int) -> None:
+    buffer = KlineBuffer(maxlen=500)
+    for i, (ts, o, h, l, c, v) in enumerate(rows):
+        buffer.upsert(cls(symbol=symbol, timeframe='1m', open=o, high=h, low=l, close=c, volume=v, timestamp=ts,
+                          finished=False))
+        buffer.upsert(cls(symbol=symbol, timeframe='1m', open=o, high=h, low=l, close=c, volume=v, timestamp=ts,
+                          finished=True))
+        if i % frame_every == 0:
+            buffer.to_frame()
+
+
+def main(n: int = YEAR_OF_1M, frame_every: int = 15) -> None:
+    symbol = Symbol(base='eth', quote='usdt')
+    timestamp, open_, high, low, close, volume = _columns(n)
+    rows = list(zip(timestamp, open_, high, low, close, volume))
+
+    def build(cls):
+        return lambda: [cls(symbol=symbol, timeframe='1m', open=o, high=h, low=l, close=c, volume=v, timestamp=ts,
+                            finished=True) for ts, o, h, l, c, v in rows]
+
+    print(f"{n} klines")
+    legacy, t_legacy, m_legacy = _measure(build(LegacyKline))
+    baseline = (t_legacy, m_legacy)
+    _report('legacy Kline', t_legacy, m_legacy, baseline)
+    del legacy
+
+    klines, elapsed, peak = _measure(build(Kline))
+    _report('slots Kline', elapsed, peak, baseline)
+    start = time.perf_counter()
+    for kline in klines:
+        kline.datetime
+    print(f"{'  + format every datetime':<28} {(time.perf_counter() - start) * 1e3:9.1f}ms")
+    del klines
+
+    _, elapsed, peak = _measure(lambda: KlineBatch.from_columns(symbol, '1m', timestamp, open_, high, low, close, volume))
+    _report('KlineBatch', elapsed, peak, baseline)
+
+    print(f"replay into KlineBuffer, 2 updates per kline, DataFrame every {frame_every} klines")
+    timings = {}
+    for name, cls in (('legacy Kline', LegacyKline), ('slots Kline', Kline)):
+        start = time.perf_counter()
+        _replay(cls, symbol, rows, frame_every)
+        timings[name] = time.perf_counter() - start
+    for name, elapsed in timings.items():
+        print(f"{name:<28} {elapsed * 1e3:9.1f}ms  time x{timings['legacy Kline'] / elapsed:5.1f}")
+
+
+if __name__ == '__main__':
+    main()
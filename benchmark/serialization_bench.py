@@ -0,0 +1,63 @@
+"""
+序列化微基准: 原有实现(标准库json / pydantic model_dump_json) vs utils.json_util
+- 真实的Binance组合流K线消息的解析与生成
+- 带数千条历史订单的网格状态文件(OrderRecorder / OrderPairListModel)的写入与读取
+
+运行: python -m benchmark.serialization_bench
+"""
+import json
+import timeit
+from typing import Any, Callable
+
+from model import OrderSide, PositionSide, Symbol
+from strategy.grids_strategy_v2 import Order, OrderRecorder
+from strategy.simple_grid_strategy_v2 import OrderPair, OrderPairListModel
+from utils import json_util
+
+WS_MESSAGE = ('{"stream":"dogeusdc@kline_5m","data":{"e":"kline","E":1727712000123,"s":"DOGEUSDC",'
+              '"k":{"t":1727711700000,"T":1727711999999,"s":"DOGEUSDC","i":"5m","f":100,"L":200,'
+              '"o":"0.16521","c":"0.16534","h":"0.16540","l":"0.16510","v":"1523402","n":100,"x":false,'
+              '"q":"251882.31","V":"760201","Q":"125690.22","B":"0"}}}')
+
+
+def _order_recorder(n: int) -> OrderRecorder:
+    orders = [Order(entry_id=f'BUY{i:010x}', side=OrderSide.BUY, price=0.1 + i * 1e-5, quantity=200,
+                    fixed_take_profit_rate=0.01, signal_min_take_profit_rate=0.005,
+                    exit_price=0.101 + i * 1e-5, status='closed', exit_id=f'SELL{i:010x}')
+              for i in range(n)]
+    return OrderRecorder(order_file_path='', orders=orders[:10], history_orders=orders)
+
+
+def _order_pairs(n: int) -> OrderPairListModel:
+    symbol = Symbol(base='doge', quote='usdc')
+    return OrderPairListModel(items=[
+        OrderPair(position_side=PositionSide.LONG, entry_side=OrderSide.BUY, symbol=symbol,
+                  entry_price=0.1 + i * 1e-5, exit_price=0.101 + i * 1e-5, quantity=200)
+        for i in range(n)])
+
+
+def _bench(name: str, baseline: Callable[[], Any], fast: Callable[[], Any], number: int) -> None:
+    t_base = timeit.timeit(baseline, number=number) / number
+    t_fast = timeit.timeit(fast, number=number) / number
+    print(f"{name:<32} before {t_base * 1e6:10.1f}us  after {t_fast * 1e6:10.1f}us  x{t_base / t_fast:5.1f}")
+
+
+def main(history_orders: int = 5000) -> None:
+    kline_obj = json.loads(WS_MESSAGE)
+    _bench('ws message loads', lambda: json.loads(WS_MESSAGE), lambda: json_util.loads(WS_MESSAGE), 200000)
+    _bench('ws message dumps', lambda: json.dumps(kline_obj), lambda: json_util.dumps(kline_obj), 200000)
+
+    recorder = _order_recorder(history_orders)
+    _bench(f'OrderRecorder dump ({history_orders})', recorder.model_dump_json, lambda: json_util.dumpb(recorder), 20)
+    text = recorder.model_dump_json()
+    _bench(f'json loads ({history_orders} orders)', lambda: json.loads(text), lambda: json_util.loads(text), 20)
+    _bench(f'state dict dumps ({history_orders} orders)', lambda: json.dumps(json.loads(text)),
+           lambda: json_util.dumpb(json_util.loads(text)), 20)
+
+    pairs = _order_pairs(history_orders)
+    _bench(f'OrderPairList dump ({history_orders})', lambda: pairs.model_dump_json(indent=2),
+           lambda: json_util.dumpb(pairs, indent=True), 20)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,11 +3,11 @@ from client.ex_client import ExSwapClient
 
 import asyncio
 import websockets
-import json
 import ssl
 from model import OrderStatus, PlaceOrderBehavior, Symbol
 from model import OrderSide
 import log
+from utils.json_util import loads
 
 logger = log.getLogger(__name__)
 
@@ -181,7 +181,7 @@ class LimitOrderChaser:
                         msg = await asyncio.wait_for(ws.recv(), timeout=10)
                         msg_str = str(msg)
                         if '"c"' in msg_str and '24hrMiniTicker' in msg_str:
-                            data = json.loads(msg)
+                            data = loads(msg)
                             current_price = float(data['c'])
                             if self.first_price is not None:
                                 deviation = abs(current_price - self.first_price)
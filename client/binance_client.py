@@ -3,6 +3,7 @@ from typing import Any, Dict, List, Optional
 
 from client.binance_chaser_order import LimitOrderChaser
 from client.ex_client import ExSwapClient
+from metrics import metrics
 
 import requests
 from model import PositionSide, Symbol, PlaceOrderBehavior, SymbolInfo
@@ -75,21 +76,25 @@ class BinanceSwapClient(ExSwapClient):
             place_order_behavior=place_order_behavior,
         )
     
+    @metrics.timed('exchange.balance')
     def balance(self, coin: str) -> float:
         balance = self.exchange.fetch_balance()  # type: ignore
         return balance[coin.upper()]['free']
 
+    @metrics.timed('exchange.cancel')
     def cancel(self, custom_id: str, symbol: Symbol):
         return self.exchange.cancel_order(id='', symbol=symbol.ccxt(), params={  # type: ignore
             'origClientOrderId': custom_id
         })
 
+    @metrics.timed('exchange.query_order')
     def query_order(self, custom_id: str, symbol: Symbol):
         order = self.exchange.fetch_order(id='', symbol=symbol.ccxt(), params={  # type: ignore
             'origClientOrderId': custom_id
         })
         return order
 
+    @metrics.timed('exchange.place_order_v2')
     def place_order_v2(self, custom_id: str, symbol: Symbol, order_side: OrderSide, quantity: float, price: Optional[float] = None, **kwargs: Any) -> Optional[Dict[str, Any]]:
         position_side = kwargs.pop('position_side', None)
         if isinstance(position_side, PositionSide):
@@ -2,7 +2,8 @@ import time
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
 
-from model import Symbol, SymbolInfo, Kline
+from metrics import metrics
+from model import Symbol, SymbolInfo, Kline, intern_symbol
 from ccxt.base.exchange import Exchange
 
 from model import OrderSide
@@ -36,11 +37,13 @@ class ExClient(ABC):
         """
         pass
 
+    @metrics.timed('exchange.fetch_ohlcv')
     def fetch_ohlcv(self, symbol: Symbol, timeframe: str, limit: int = 100) -> list[Kline]:
         if limit < 1:
             return []
 
         list_ohlcv = self.exchange.fetch_ohlcv(symbol.ccxt(), timeframe, limit=limit)
+        symbol = intern_symbol(symbol)
         klines: list[Kline]= []
         for ohlcv in list_ohlcv:
             klines.append(
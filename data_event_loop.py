@@ -1,12 +1,77 @@
 import concurrent.futures
-import json
-from typing import Any, List
+import itertools
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+import time
 import websocket
 import logging
-import random
+
+from client.ex_client import ExClient
+from metrics import metrics
+from model import Kline, Symbol, intern_symbol
+from sharded_executor import OverflowPolicy, ShardedExecutor
+from strategy.market_data_store import MarketDataStore, market_data_store
+from utils.json_util import dumps, loads
 
 logger = logging.getLogger(__name__)
 
+_KLINE_STREAM_PATTERN = re.compile(r'(\w+)(usdt|usdc|btc)@kline_(\d+\w)')
+
+# stream -> (Symbol, timeframe)，每个stream只解析一次
+_stream_cache: Dict[str, Tuple[Symbol, str]] = {}
+
+
+def parse_kline_stream(stream: str) -> Tuple[Symbol, str]:
+    """解析 `btcusdt@kline_5m` 形式的stream名称"""
+    cached = _stream_cache.get(stream)
+    if cached is not None:
+        return cached
+    match = _KLINE_STREAM_PATTERN.match(stream)
+    if not match:
+        raise ValueError(f'Invalid kline key: {stream}')
+    cached = (intern_symbol(Symbol(base=match.group(1), quote=match.group(2))), match.group(3))
+    _stream_cache[stream] = cached
+    return cached
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """将时间框架转换为毫秒, 如 '5m' -> 300000"""
+    units = {'s': 1000, 'm': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000, 'w': 7 * 24 * 60 * 60 * 1000}
+    unit = timeframe[-1]
+    if unit not in units:
+        raise ValueError(f'Unsupported timeframe: {timeframe}')
+    return int(timeframe[:-1]) * units[unit]
+
+
+def decode_kline(data_obj: Dict[str, Any]) -> Optional[Kline]:
+    """将已解码的combined stream消息转换为Kline, 非K线消息返回None"""
+    stream: str = data_obj.get('stream', '')
+    if '@kline_' not in stream:
+        return None
+    kline: Dict[str, Any] | None = data_obj.get('data', {}).get('k', None)
+    if not kline:
+        return None
+
+    symbol, timeframe = parse_kline_stream(stream)
+    return Kline(
+        symbol=symbol,
+        timeframe=timeframe,
+        open=float(kline['o']),
+        high=float(kline['h']),
+        low=float(kline['l']),
+        close=float(kline['c']),
+        volume=float(kline['v']),
+        timestamp=int(kline['t']),
+        finished=kline.get('x', False)
+    )
+
+
+def parse_kline_message(data: str) -> Optional[Kline]:
+    """解析WebSocket原始消息, 非K线消息返回None"""
+    return decode_kline(loads(data))
+
+
 class Task:
     def __init__(self):
         self.name: str
@@ -15,77 +80,469 @@ class Task:
         pass
 
 
+class KlineTask(Task):
+    """
+    按K线stream订阅的任务
+    事件循环对每帧只解码一次, 再将Kline直接投递给订阅了该stream的任务
+    """
+
+    def streams(self) -> List[str]:
+        """订阅的stream列表, 如 ['btcusdt@kline_5m']"""
+        raise NotImplementedError()
+
+    def run_kline(self, kline: Kline) -> None:
+        pass
+
+    def use_market_data_store(self, store: MarketDataStore) -> None:
+        """事件循环提供共享行情存储时调用, 默认不使用"""
+        pass
+
+    def warm_up_jobs(self) -> List[Callable[[], None]]:
+        """启动前预热历史K线的任务, 每个任务通常对应一次交易所请求"""
+        return []
+
+    def release_market_data(self) -> None:
+        pass
+
+    def run(self, data: str) -> None:
+        """兼容字符串消息的入口"""
+        kline = parse_kline_message(data)
+        if kline is not None and kline.symbol.binance_ws_sub_kline(kline.timeframe) in self.streams():
+            self.run_kline(kline)
+
+
+class _RateLimiter:
+    """按固定间隔放行请求"""
+
+    def __init__(self, max_per_second: float):
+        self.interval = 1 / max_per_second if max_per_second > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
 class DataEventLoop:
-    def __init__(self):
+    """
+    数据事件循环
+    每个任务拥有独立的串行lane, 保证同一任务内K线按到达顺序处理; 不同任务在线程池上并行
+    任务繁忙时, 同一stream积压的未完成K线只保留最新一条
+    @param max_workers 线程池大小
+    @param lane_lag_threshold 任务积压超过该值时告警
+    @param max_pending 每个任务默认的积压上限, None表示不限制
+    @param overflow_policy 积压达到上限时默认的处理策略, 已完成K线不会被丢弃
+    @param market_data_store 共享行情存储, 设置后订阅相同stream的策略共享K线数据
+    """
+
+    def __init__(self, max_workers: int = 5, lane_lag_threshold: int = 100,
+                 max_pending: Optional[int] = 1000, overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 market_data_store: Optional[MarketDataStore] = None):
         self.tasks: List[Task] = []
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=5)
+        # stream -> 订阅该stream的任务
+        self.stream_tasks: Dict[str, List[KlineTask]] = {}
+        # 未声明stream的任务仍然接收原始消息
+        self.raw_tasks: List[Task] = []
+        self.executor = ShardedExecutor(max_workers=max_workers, lag_threshold=lane_lag_threshold)
+        self.max_pending = max_pending
+        self.overflow_policy = overflow_policy
+        self.market_data_store = market_data_store
+        self.warmed_up: bool = False
+        # 投递序号, 共享行情存储据此丢弃晚于更新数据到达的旧K线
+        self._dispatch_seq = itertools.count(1)
 
-    def add_task(self, task: Task):
+    def register_gauges(self) -> None:
+        """将该事件循环的执行器队列深度注册为全局仪表, 由实盘入口调用一次, 回测等其他事件循环不注册"""
+        metrics.register_gauge('executor.queue_depth', lambda: sum(self.executor.lane_depths().values()))
+
+    def add_task(self, task: Task, max_pending: Optional[int] = None,
+                 overflow_policy: Optional[OverflowPolicy] = None):
+        """
+        添加任务
+        @param max_pending 该任务的积压上限, 默认使用事件循环的设置
+        @param overflow_policy 该任务积压达到上限时的处理策略, 如下单较慢的策略可以选择BLOCK或SHED
+        """
         self.tasks.append(task)
+        self.executor.configure_lane(task, max_pending if max_pending is not None else self.max_pending,
+                                     overflow_policy or self.overflow_policy)
+        if isinstance(task, KlineTask):
+            if self.market_data_store is not None:
+                task.use_market_data_store(self.market_data_store)
+            for stream in task.streams():
+                self.stream_tasks.setdefault(stream, []).append(task)
+        else:
+            self.raw_tasks.append(task)
+
+    def remove_task(self, task: Task):
+        """移除任务并释放其引用的共享行情"""
+        if task not in self.tasks:
+            return
+        self.tasks.remove(task)
+        if isinstance(task, KlineTask):
+            for stream in task.streams():
+                stream_tasks = self.stream_tasks.get(stream, [])
+                if task in stream_tasks:
+                    stream_tasks.remove(task)
+                if not stream_tasks:
+                    self.stream_tasks.pop(stream, None)
+            task.release_market_data()
+        else:
+            self.raw_tasks.remove(task)
+        self.executor.remove_lane(task)
+
+    def subscribed_streams(self) -> List[str]:
+        return list(self.stream_tasks.keys())
 
     def loop(self, data: str):
-        for task in self.tasks:
-            self.executor.submit(task.run, data)
+        received_at = time.perf_counter()
+        received_ms = time.time() * 1000
+        for task in self.raw_tasks:
+            self.executor.submit(task, task.run, data)
+
+        if not self.stream_tasks:
+            return
+        with metrics.timer('decode'):
+            data_obj: Dict[str, Any] = loads(data)
+            kline = decode_kline(data_obj)
+        event_time = data_obj.get('data', {}).get('E')
+        if event_time is not None:
+            # 交易所生成事件到本地收到消息的延迟, 包含网络传输和两端的时钟偏差
+            metrics.observe('receive', received_ms - event_time)
+        if kline is not None:
+            self.dispatch(kline, data_obj['stream'], received_at)
+
+    def dispatch(self, kline: Kline, stream: Optional[str] = None, received_at: Optional[float] = None):
+        """将Kline投递给订阅了对应stream的任务"""
+        if stream is None:
+            stream = kline.symbol.binance_ws_sub_kline(kline.timeframe)
+        if received_at is None:
+            received_at = time.perf_counter()
+        kline.seq = next(self._dispatch_seq)
+        with metrics.timer('dispatch'):
+            for task in self.stream_tasks.get(stream, ()):
+                # 未完成K线只保留最新一条, 已完成K线按顺序投递且只投递一次
+                self.executor.submit(task, self._run_kline, task, kline, received_at,
+                                     coalesce_key=stream, replaceable=not kline.finished)
+
+    @staticmethod
+    def _run_kline(task: KlineTask, kline: Kline, received_at: float):
+        started_at = time.perf_counter()
+        metrics.observe('queue_wait', (started_at - received_at) * 1000)
+        try:
+            task.run_kline(kline)
+        finally:
+            # 从收到消息到策略处理完成的端到端耗时
+            metrics.observe('pipeline', (time.perf_counter() - received_at) * 1000)
+
+    def warm_up(self, max_concurrency: int = 4, max_requests_per_second: float = 10) -> int:
+        """
+        并发加载所有任务的历史K线, 使第一根实时K线到达时无需再请求交易所
+        失败的任务仍会在收到第一根K线时加载
+        @param max_concurrency 同时进行的请求数
+        @param max_requests_per_second 每秒请求数上限, 需低于交易所的频率限制
+        @return 失败的任务数
+        """
+        jobs = [job for task in self.tasks if isinstance(task, KlineTask) for job in task.warm_up_jobs()]
+        self.warmed_up = True
+        if not jobs:
+            return 0
+
+        limiter = _RateLimiter(max_requests_per_second)
+
+        def run(job: Callable[[], None]) -> None:
+            limiter.acquire()
+            job()
+
+        failed = 0
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='warm-up') as pool:
+            for future in concurrent.futures.as_completed([pool.submit(run, job) for job in jobs]):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Warm up failed: {e}")
+        logger.info(f"Warm up {len(jobs)} series in {time.perf_counter() - start:.2f}s, failed: {failed}")
+        return failed
 
     def start(self):
-        pass
+        if not self.warmed_up:
+            self.warm_up()
 
     def stop(self):
         self.executor.shutdown(wait=False)
 
-class BinanceDataEventLoop(DataEventLoop):
-    SET_PROPERTY_ID = 1
-    SUBSCRIBE_KLINE_ID = 2
 
-    def __init__(self, kline_subscribes: List[str]):
-        super().__init__()
-        self.kline_subscribes = kline_subscribes
+def plan_stream_shards(streams: List[str], num_connections: int,
+                       stream_rates: Optional[Dict[str, float]] = None,
+                       max_streams_per_connection: int = 200) -> List[List[str]]:
+    """
+    将stream分配到多个连接, 按消息速率做负载均衡
+    结果只取决于输入, 同样的输入总是得到同样的分配
+    @param stream_rates stream -> 每秒消息数, 未知的stream按平均速率估算
+    @return 每个连接订阅的stream列表, 连接数不足以容纳全部stream时自动增加
+    """
+    unique_streams = sorted(set(streams))
+    num_connections = max(1, num_connections, -(-len(unique_streams) // max_streams_per_connection))
+    stream_rates = stream_rates or {}
+    known_rates = [rate for stream, rate in stream_rates.items() if stream in unique_streams]
+    default_rate = sum(known_rates) / len(known_rates) if known_rates else 1.0
+
+    # 速率从高到低依次放入当前负载最小的连接
+    ordered = sorted(unique_streams, key=lambda stream: (-stream_rates.get(stream, default_rate), stream))
+    shards: List[List[str]] = [[] for _ in range(num_connections)]
+    stream_loads = [0.0] * num_connections
+    for stream in ordered:
+        candidates = [i for i in range(num_connections) if len(shards[i]) < max_streams_per_connection]
+        index = min(candidates, key=lambda i: (stream_loads[i], len(shards[i]), i))
+        shards[index].append(stream)
+        stream_loads[index] += stream_rates.get(stream, default_rate)
+    return [sorted(shard) for shard in shards]
+
+
+class BinanceStreamConnection:
+    """
+    单个combined stream连接
+    断线后按指数退避重连, 每次连接成功后重新订阅本连接负责的全部stream
+    """
+
+    def __init__(self, event_loop: 'BinanceDataEventLoop', index: int, streams: List[str]):
+        self.event_loop = event_loop
+        self.index = index
+        self.streams: List[str] = streams
+        self.ws_session: Optional[websocket.WebSocketApp] = None
+        self.thread: Optional[threading.Thread] = None
+        self.connected: bool = False
+        self.opened_before: bool = False
+        self.reconnect_delay: float = event_loop.min_reconnect_delay
+        self._lock = threading.Lock()
 
     def start(self):
-        websocket_url = "wss://fstream.binance.com/stream"
-        ws_session = websocket.WebSocketApp(websocket_url,
-                                            on_open=self.on_open,
-                                            on_message=self.on_message,
-                                            on_error=self.on_error,
-                                            on_close=self.on_close,
-                                            on_pong=self.on_pong
-                                            )
-        ws_session.run_forever(ping_interval=20, ping_timeout=15) # type: ignore[call-arg]
-
-    def _subscribe(self, ws: websocket.WebSocket):
-        params: dict[str, Any] = {
-            "method": "SUBSCRIBE",
-            "params": self.kline_subscribes,
-            "id": self.SUBSCRIBE_KLINE_ID
-        }
-        ws.send(json.dumps(params))
-        logger.info(f"### BinanceDataEventLoop Subscribed ### {self.kline_subscribes}")
+        self.thread = threading.Thread(target=self.run_forever, name=f'binance-ws-{self.index}', daemon=True)
+        self.thread.start()
+
+    def run_forever(self):
+        while self.event_loop.is_running:
+            self.ws_session = websocket.WebSocketApp(self.event_loop.websocket_url,
+                                                     on_open=self.on_open,
+                                                     on_message=self.on_message,
+                                                     on_error=self.on_error,
+                                                     on_close=self.on_close,
+                                                     on_pong=self.on_pong
+                                                     )
+            self.ws_session.run_forever(ping_interval=20, ping_timeout=15)  # type: ignore[call-arg]
+            self.connected = False
+            if not self.event_loop.is_running:
+                break
+            logger.warning(f"### BinanceStreamConnection[{self.index}] reconnect in {self.reconnect_delay:.1f}s ###")
+            time.sleep(self.reconnect_delay)
+            self.reconnect_delay = min(self.reconnect_delay * 2, self.event_loop.max_reconnect_delay)
+
+    def close(self):
+        if self.ws_session is not None:
+            self.ws_session.close()
+
+    def _send(self, method: str, params: List[Any], request_id: int):
+        if self.ws_session is None or not self.connected:
+            return
+        self.ws_session.send(dumps({"method": method, "params": params, "id": request_id}))
+
+    def subscribe(self, streams: List[str]):
+        with self._lock:
+            added = [stream for stream in streams if stream not in self.streams]
+            self.streams = sorted(self.streams + added)
+        if added:
+            self._send("SUBSCRIBE", added, BinanceDataEventLoop.SUBSCRIBE_KLINE_ID)
+            logger.info(f"### BinanceStreamConnection[{self.index}] Subscribed ### {added}")
+
+    def unsubscribe(self, streams: List[str]):
+        with self._lock:
+            removed = [stream for stream in streams if stream in self.streams]
+            self.streams = [stream for stream in self.streams if stream not in removed]
+        if removed:
+            self._send("UNSUBSCRIBE", removed, BinanceDataEventLoop.UNSUBSCRIBE_KLINE_ID)
+            logger.info(f"### BinanceStreamConnection[{self.index}] Unsubscribed ### {removed}")
+
+    def on_open(self, ws: websocket.WebSocket):
+        logger.info(f"### BinanceStreamConnection[{self.index}] Opened ###")
+        self.connected = True
+        self.reconnect_delay = self.event_loop.min_reconnect_delay
+        ws.send(dumps({"method": "SET_PROPERTY", "params": ["combined", True],
+                            "id": BinanceDataEventLoop.SET_PROPERTY_ID}))
+        with self._lock:
+            streams = list(self.streams)
+        if streams:
+            ws.send(dumps({"method": "SUBSCRIBE", "params": streams,
+                                "id": BinanceDataEventLoop.SUBSCRIBE_KLINE_ID}))
+        logger.info(f"### BinanceStreamConnection[{self.index}] Subscribed ### {streams}")
+
+        # 重连时补齐断线期间完成的K线; 本回调返回前该连接的实时消息不会被处理, 补齐数据先于实时数据投递
+        if self.opened_before:
+            self.event_loop.backfill(streams)
+        self.opened_before = True
 
     def on_message(self, ws: websocket.WebSocket, message: str):
-        self.loop(message)
+        self.event_loop.loop(message)
 
     def on_error(self, ws: websocket.WebSocket, error: Exception):
-        logger.error('BinanceDataEventLoop Error: %s', error)
+        logger.error('BinanceStreamConnection[%s] Error: %s', self.index, error)
 
     def on_close(self, ws: websocket.WebSocket, close_status_code: int | str, close_msg: str):
-        logger.warning(f"### BinanceDataEventLoop Closed ### {close_status_code}: {close_msg}")
-        self.stop()
-
-    def on_open(self, ws: websocket.WebSocket):
-        logger.info("### BinanceDataEventLoop Opened ###")
-        params: dict[str, Any] = {
-            "method": "SET_PROPERTY",
-            "params": [
-                "combined",
-                True
-            ],
-            "id": self.SET_PROPERTY_ID
-        }
-        ws.send(json.dumps(params))
-        self._subscribe(ws)
+        self.connected = False
+        logger.warning(f"### BinanceStreamConnection[{self.index}] Closed ### {close_status_code}: {close_msg}")
 
     def on_pong(self, ws: websocket.WebSocket, message: str):
         logger.debug("Pong")
-        if random.randint(1, 100) == 1:
-            self._subscribe(ws)
 
+
+class BinanceDataEventLoop(DataEventLoop):
+    """
+    Binance K线事件循环
+    订阅分散到多个连接, 单个连接变慢或断开不会影响其他连接
+    @param kline_subscribes 订阅的stream, 未指定时订阅已注册任务声明的全部stream
+    @param num_connections 连接数, stream数超过单连接上限时自动增加
+    @param max_streams_per_connection 单连接最多订阅的stream数
+    @param rebalance_interval 按消息速率重新分配stream的间隔(秒), 0表示不重新分配
+    @param backfill_client 重连后通过REST补齐断线期间已完成K线的客户端, 为None时不补齐
+    @param max_backfill_klines 每个stream单次最多补齐的K线数
+    """
+    SET_PROPERTY_ID = 1
+    SUBSCRIBE_KLINE_ID = 2
+    UNSUBSCRIBE_KLINE_ID = 3
+
+    def __init__(self, kline_subscribes: Optional[List[str]] = None, num_connections: int = 1,
+                 max_streams_per_connection: int = 200, rebalance_interval: float = 600,
+                 websocket_url: str = "wss://fstream.binance.com/stream",
+                 min_reconnect_delay: float = 1.0, max_reconnect_delay: float = 60.0,
+                 backfill_client: Optional[ExClient] = None, max_backfill_klines: int = 1500, **kwargs: Any):
+        # 实盘默认使用进程内共享的行情存储
+        kwargs.setdefault('market_data_store', market_data_store)
+        super().__init__(**kwargs)
+        self.kline_subscribes: List[str] = kline_subscribes if kline_subscribes is not None else []
+        self.num_connections = num_connections
+        self.max_streams_per_connection = max_streams_per_connection
+        self.rebalance_interval = rebalance_interval
+        self.websocket_url = websocket_url
+        self.min_reconnect_delay = min_reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.backfill_client = backfill_client
+        self.max_backfill_klines = max_backfill_klines
+        self.connections: List[BinanceStreamConnection] = []
+        self.is_running: bool = False
+        # stream -> 上次重新分配以来收到的消息数
+        self.stream_message_counts: Dict[str, int] = {}
+        self._rates_since: float = time.monotonic()
+        # stream -> 最后一根已完成K线的时间戳, 用于丢弃重复的已完成K线
+        self.last_finished_timestamps: Dict[str, int] = {}
+        self._finished_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """预热历史K线后启动全部连接, 阻塞直到stop"""
+        if not self.warmed_up:
+            self.warm_up()
+        streams = self.kline_subscribes or self.subscribed_streams()
+        shards = plan_stream_shards(streams, self.num_connections,
+                                    max_streams_per_connection=self.max_streams_per_connection)
+        self.is_running = True
+        self._stop_event.clear()
+        self._rates_since = time.monotonic()
+        self.connections = [BinanceStreamConnection(self, i, shard) for i, shard in enumerate(shards)]
+        for connection in self.connections:
+            connection.start()
+
+        while not self._stop_event.wait(self.rebalance_interval or None):
+            self.rebalance()
+
+    def stop(self):
+        self.is_running = False
+        self._stop_event.set()
+        for connection in self.connections:
+            connection.close()
+        super().stop()
+
+    def stream_rates(self) -> Dict[str, float]:
+        """各stream自上次重新分配以来的每秒消息数"""
+        elapsed = max(time.monotonic() - self._rates_since, 1e-6)
+        return {stream: count / elapsed for stream, count in self.stream_message_counts.items()}
+
+    def rebalance(self, imbalance_threshold: float = 1.5):
+        """按消息速率重新分配stream, 负载最大的连接超过平均负载的imbalance_threshold倍时才迁移"""
+        if len(self.connections) < 2:
+            return
+        rates = self.stream_rates()
+        stream_loads = [sum(rates.get(stream, 0.0) for stream in connection.streams)
+                        for connection in self.connections]
+        average = sum(stream_loads) / len(stream_loads)
+        if average <= 0 or max(stream_loads) <= average * imbalance_threshold:
+            return
+
+        streams = [stream for connection in self.connections for stream in connection.streams]
+        shards = plan_stream_shards(streams, len(self.connections), rates, self.max_streams_per_connection)
+        logger.info(f"Rebalance streams, connection loads: {[round(load, 2) for load in stream_loads]}")
+        # 先在新连接订阅, 再从旧连接退订, 迁移期间重复的已完成K线会被丢弃
+        for connection, shard in zip(self.connections, shards):
+            connection.subscribe(shard)
+        for connection, shard in zip(self.connections, shards):
+            connection.unsubscribe([stream for stream in connection.streams if stream not in shard])
+
+        self.stream_message_counts = {}
+        self._rates_since = time.monotonic()
+
+    def _fetch_missing_klines(self, stream: str, last_timestamp: int) -> List[Kline]:
+        assert self.backfill_client is not None
+        symbol, timeframe = parse_kline_stream(stream)
+        missing = (int(time.time() * 1000) - last_timestamp) // timeframe_to_ms(timeframe)
+        if missing < 1:
+            return []
+        limit = min(missing + 1, self.max_backfill_klines)
+        if missing + 1 > self.max_backfill_klines:
+            logger.warning(f"Backfill {stream} truncated to {limit} klines, missing about {missing}")
+        klines = self.backfill_client.fetch_ohlcv(symbol, timeframe, limit)
+        return sorted((k for k in klines if k.finished and k.timestamp > last_timestamp), key=lambda k: k.timestamp)
+
+    def backfill(self, streams: List[str]):
+        """
+        补齐断线期间已完成的K线并按顺序投递
+        只处理收到过已完成K线的stream, 各stream的REST请求并发执行
+        """
+        if self.backfill_client is None:
+            return
+        with self._finished_lock:
+            pending = {stream: self.last_finished_timestamps[stream] for stream in streams
+                       if stream in self.last_finished_timestamps}
+        if not pending:
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(4, len(pending))) as pool:
+            futures = {stream: pool.submit(self._fetch_missing_klines, stream, last_timestamp)
+                       for stream, last_timestamp in pending.items()}
+            for stream, future in futures.items():
+                try:
+                    klines = future.result()
+                except Exception as e:
+                    logger.error(f"Backfill {stream} failed: {e}")
+                    continue
+                for kline in klines:
+                    self.dispatch(kline, stream)
+                if klines:
+                    logger.info(f"Backfilled {len(klines)} finished klines for {stream}")
+
+    def dispatch(self, kline: Kline, stream: Optional[str] = None, received_at: Optional[float] = None):
+        if stream is None:
+            stream = kline.symbol.binance_ws_sub_kline(kline.timeframe)
+        self.stream_message_counts[stream] = self.stream_message_counts.get(stream, 0) + 1
+
+        if kline.finished:
+            with self._finished_lock:
+                if kline.timestamp <= self.last_finished_timestamps.get(stream, -1):
+                    metrics.inc('kline.duplicate_dropped')
+                    return
+                self.last_finished_timestamps[stream] = kline.timestamp
+
+        super().dispatch(kline, stream, received_at)
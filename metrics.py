@@ -0,0 +1,178 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+import log
+
+logger = log.getLogger(__name__)
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# 耗时分桶上界(毫秒)
+DEFAULT_BUCKETS_MS: List[float] = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class Histogram:
+    """固定分桶的耗时直方图(毫秒)"""
+
+    def __init__(self, buckets: Optional[List[float]] = None):
+        self.buckets: List[float] = buckets or DEFAULT_BUCKETS_MS
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, q: float) -> float:
+        """按分桶上界估算分位数"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'avg_ms': self.total / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max,
+            'buckets': {f'le_{bound}': count for bound, count in zip(self.buckets + [float('inf')], self.counts)},
+        }
+
+
+class MetricsRegistry:
+    """
+    进程内的轻量指标注册表
+    - 计时器/直方图: 各处理阶段耗时
+    - 计数器: 丢弃、合并的更新等
+    - 仪表: 执行器队列深度等实时值
+    """
+
+    def __init__(self):
+        self.enabled: bool = True
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    def inc(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value_ms: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(value_ms)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def timed(self, name: str) -> Callable[[F], F]:
+        """方法耗时装饰器"""
+        def decorator(fn: F) -> F:
+            @functools.wraps(fn)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.timer(name):
+                    return fn(*args, **kwargs)
+            return wrapper  # type: ignore[return-value]
+        return decorator
+
+    def register_gauge(self, name: str, fn: Callable[[], float]) -> None:
+        with self._lock:
+            self._gauges[name] = fn
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def histogram(self, name: str) -> Optional[Histogram]:
+        with self._lock:
+            return self._histograms.get(name)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {name: histogram.snapshot() for name, histogram in self._histograms.items()}
+            gauges = dict(self._gauges)
+        gauge_values: Dict[str, float] = {}
+        for name, fn in gauges.items():
+            try:
+                gauge_values[name] = fn()
+            except Exception as e:
+                logger.debug(f"Gauge {name} failed: {e}")
+        return {'counters': counters, 'histograms': histograms, 'gauges': gauge_values}
+
+    def summary(self) -> str:
+        snapshot = self.snapshot()
+        parts = [f"{name}: n={h['count']} avg={h['avg_ms']:.2f}ms p99<={h['p99_ms']:.2f}ms max={h['max_ms']:.2f}ms"
+                 for name, h in sorted(snapshot['histograms'].items())]
+        parts += [f"{name}={value}" for name, value in sorted(snapshot['counters'].items())]
+        parts += [f"{name}={value}" for name, value in sorted(snapshot['gauges'].items())]
+        return ' | '.join(parts)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
+
+
+def start_http_server(port: int = 9100, host: str = '127.0.0.1', registry: MetricsRegistry = metrics) -> threading.Thread:
+    """在后台线程启动本地指标HTTP服务, GET /metrics 返回JSON快照"""
+    import uvicorn
+    from fastapi import FastAPI
+
+    app = FastAPI(title='smart-trader metrics')
+
+    @app.get('/metrics')
+    def get_metrics() -> Dict[str, Any]:
+        return registry.snapshot()
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, name='metrics-http', daemon=True)
+    thread.start()
+    logger.info(f"Metrics endpoint: http://{host}:{port}/metrics")
+    return thread
+
+
+def start_log_reporter(interval: float = 60, registry: MetricsRegistry = metrics) -> threading.Thread:
+    """在后台线程定期输出指标摘要"""
+    def report() -> None:
+        while True:
+            time.sleep(interval)
+            logger.info(f"Metrics | {registry.summary()}")
+
+    thread = threading.Thread(target=report, name='metrics-reporter', daemon=True)
+    thread.start()
+    return thread
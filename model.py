@@ -1,10 +1,11 @@
 from datetime import datetime
-from typing import Any
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
 from pydantic import BaseModel
 from enum import Enum
 from dataclasses import dataclass
 import builtins
 from decimal import Decimal
+import numpy as np
 class PositionSide(Enum):
     LONG = 'long'
     SHORT = 'short'
@@ -163,7 +164,29 @@ class SymbolInfo(BaseModel):
     def format_qty(self, qty: float | str):
         return self.format_precision(qty, self.qty_precision())
 
+# (base, quote) -> Symbol, 相同交易对的K线共享同一个Symbol对象
+_interned_symbols: Dict[Tuple[str, str], Symbol] = {}
+
+
+def intern_symbol(symbol: Symbol) -> Symbol:
+    """返回相同交易对的共享Symbol对象, 在批量创建K线的入口处调用"""
+    key = (symbol.base, symbol.quote)
+    interned = _interned_symbols.get(key)
+    if interned is None:
+        interned = _interned_symbols.setdefault(key, symbol)
+    return interned
+
+
 class Kline:
+    """
+    单根K线
+    使用__slots__, 不带__dict__; datetime字符串在首次访问时才格式化并缓存
+    symbol应为intern_symbol返回的共享对象, 由数据加载、行情解析等入口保证
+    seq为事件循环投递时分配的单调递增序号, 0表示未经事件循环投递(历史数据、回测)
+    """
+    __slots__ = ('symbol', 'timeframe', 'open', 'high', 'low', 'close', 'volume', 'timestamp', 'finished', 'seq',
+                 '_datetime')
+
     def __init__(self, symbol: Symbol, timeframe: str, open: float, high: float, low: float, close: float, volume: float, timestamp: int, finished: bool):
         self.symbol = symbol
         self.timeframe = timeframe
@@ -173,9 +196,21 @@ class Kline:
         self.close = close
         self.volume = volume
         self.timestamp = timestamp
-        self.datetime = datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S')
         self.finished = finished
-        
+        self.seq: int = 0
+        self._datetime: Optional[str] = None
+
+    @property
+    def datetime(self) -> str:
+        if self._datetime is None:
+            self._datetime = Kline.format_datetime(self.timestamp)
+        return self._datetime
+
+    @staticmethod
+    def format_datetime(timestamp: int) -> str:
+        """毫秒时间戳转换为本地时间字符串"""
+        return datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S')
+
     def to_dict(self) -> dict[str, Any]:
         return {
             'datetime': self.datetime,
@@ -188,6 +223,86 @@ class Kline:
             'finished': self.finished
         }
 
+class KlineBatch:
+    """
+    按列存储的一组已完成K线, 按时间升序
+    列为NumPy数组, 可以是内存映射文件上的只读视图; 按下标访问时才创建Kline对象
+    @param path 列来自内存映射文件(KLINE_BATCH_DTYPE的.npy)时的路径, 序列化时只传递路径, 其他进程映射同一文件而不复制数据
+    """
+
+    def __init__(self, symbol: Symbol, timeframe: str, timestamp: np.ndarray, open: np.ndarray, high: np.ndarray,
+                 low: np.ndarray, close: np.ndarray, volume: np.ndarray, path: Optional[str] = None):
+        self.symbol = intern_symbol(symbol)
+        self.timeframe = timeframe
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.path = path
+
+    @classmethod
+    def open_file(cls, path: str, symbol: Symbol, timeframe: str) -> 'KlineBatch':
+        """只读映射.npy文件, 数据由操作系统页缓存在进程间共享"""
+        data = np.load(path, mmap_mode='r')
+        return cls(symbol, timeframe, data['timestamp'], data['open'], data['high'], data['low'],
+                   data['close'], data['volume'], path=path)
+
+    @classmethod
+    def from_columns(cls, symbol: Symbol, timeframe: str, timestamp: Iterable[int], open: Iterable[float],
+                     high: Iterable[float], low: Iterable[float], close: Iterable[float],
+                     volume: Iterable[float]) -> 'KlineBatch':
+        """由列数据(如DataFrame的列)创建, 按时间戳排序"""
+        timestamp = np.asarray(timestamp, dtype=np.int64)
+        order = np.argsort(timestamp, kind='stable')
+        columns = [np.asarray(column, dtype=np.float64)[order] for column in (open, high, low, close, volume)]
+        return cls(symbol, timeframe, timestamp[order], *columns)
+
+    @classmethod
+    def from_klines(cls, klines: Iterable['Kline']) -> 'KlineBatch':
+        """由已完成的Kline列表创建, symbol和timeframe取第一根K线"""
+        klines = list(klines)
+        if not klines:
+            raise ValueError("Cannot create KlineBatch from empty klines")
+        return cls.from_columns(klines[0].symbol, klines[0].timeframe, [k.timestamp for k in klines],
+                                [k.open for k in klines], [k.high for k in klines], [k.low for k in klines],
+                                [k.close for k in klines], [k.volume for k in klines])
+
+    def __reduce__(self):
+        if self.path is not None:
+            return KlineBatch.open_file, (self.path, self.symbol, self.timeframe)
+        return KlineBatch, (self.symbol, self.timeframe, self.timestamp, self.open, self.high, self.low,
+                            self.close, self.volume)
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return KlineBatch(self.symbol, self.timeframe, self.timestamp[index], self.open[index], self.high[index],
+                              self.low[index], self.close[index], self.volume[index])
+        return Kline(symbol=self.symbol, timeframe=self.timeframe, open=float(self.open[index]),
+                     high=float(self.high[index]), low=float(self.low[index]), close=float(self.close[index]),
+                     volume=float(self.volume[index]), timestamp=int(self.timestamp[index]), finished=True)
+
+    def __iter__(self) -> Iterator['Kline']:
+        # 分块转换为Python数值, 避免一次性创建全部K线
+        chunk = 4096
+        for start in range(0, len(self), chunk):
+            end = start + chunk
+            for ts, open_, high, low, close, volume in zip(
+                    self.timestamp[start:end].tolist(), self.open[start:end].tolist(),
+                    self.high[start:end].tolist(), self.low[start:end].tolist(),
+                    self.close[start:end].tolist(), self.volume[start:end].tolist()):
+                yield Kline(symbol=self.symbol, timeframe=self.timeframe, open=open_, high=high, low=low,
+                            close=close, volume=volume, timestamp=ts, finished=True)
+
+
+KLINE_BATCH_DTYPE = np.dtype([('timestamp', np.int64), ('open', np.float64), ('high', np.float64),
+                              ('low', np.float64), ('close', np.float64), ('volume', np.float64)])
+
+
 @dataclass
 class Order:
     # ID规则 side + 10random + [i]
@@ -1,9 +1,9 @@
-from typing import List
 import log
 import os
 from data_event_loop import BinanceDataEventLoop
 from client.binance_client import BinanceSwapClient
 import dotenv
+import metrics
 
 from task.strategy_task import StrategyTask
 
@@ -35,25 +35,32 @@ def create_binance_client(client_type: str) -> BinanceSwapClient:
 # main binance client
 main_binance_client: BinanceSwapClient = create_binance_client('main')
 
+def start_metrics():
+    # METRICS_PORT 未设置时只输出周期日志
+    metrics_port = os.environ.get('METRICS_PORT')
+    if metrics_port:
+        metrics.start_http_server(port=int(metrics_port))
+    metrics.start_log_reporter(interval=float(os.environ.get('METRICS_LOG_INTERVAL', '60')))
+
 def main():
     from template import dogeusdc
 
+    start_metrics()
+
     tasks: list[StrategyTask] = []
 
     doge_task = dogeusdc.market_trend_task(main_binance_client)
     if doge_task:
         tasks.append(doge_task)
 
-    kline_subscribes: List[str] = []
-    data_event_loop = BinanceDataEventLoop(kline_subscribes=kline_subscribes)
+    data_event_loop = BinanceDataEventLoop(backfill_client=main_binance_client)
+    data_event_loop.register_gauges()
 
     for task in tasks:
-        for timeframe in task.strategy.timeframes:
-            sub_key = task.symbol.binance_ws_sub_kline(timeframe)
-            if sub_key not in kline_subscribes:
-                kline_subscribes.append(sub_key)
         data_event_loop.add_task(task)
 
+    # 订阅前并发加载所有策略的历史K线
+    data_event_loop.warm_up(max_concurrency=int(os.environ.get('WARM_UP_CONCURRENCY', '4')))
     data_event_loop.start()
 
 # def test():
@@ -67,7 +67,7 @@ def run_alpha_trend_backtest(data_files=None, start_timestamp=1759516200000):
             logger.info(f"加载了 {len(klines)} 根{timeframe} K线数据")
 
 
-        backtest_task = BacktestTask(symbol, strategy, backtest_client, historical_data)
+        backtest_task = BacktestTask(symbol, strategy, backtest_client, historical_data, precompute_signals=True)
 
         # 5. 创建多时间框架回测事件循环
         def progress_callback(current, total):
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+参数扫描脚本
+对SignalGridStrategy或AlphaTrendStrategy的参数网格/随机采样并行回测, 输出排序后的结果
+
+示例:
+    python run_sweep.py --strategy signal_grid --timeframes 15m --start 2026-01-01 --end 2026-03-19 \
+        --grid '{"grid_spacing_rate": [0.05, 0.1], "fixed_take_profit_rate": [0.1, 0.15], "max_order": [12, 24]}'
+    python run_sweep.py --strategy alpha_trend --timeframes 15m 5m --random 50 \
+        --grid '{"atr_multiple": [0.5, 2.0], "period": [6, 14], "stop_loss_rate": [0.01, 0.05]}'
+中断后使用相同的--results重新运行会跳过已完成的参数组合; 数据、基础配置或回测环境变化后会重新运行
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from model import Symbol, OrderSide, PositionSide
+from backtest.data_loader import HistoricalDataLoader
+from backtest.sweep import SweepSettings, grid_search, random_search, run_sweep
+from strategy.alpha_trend_strategy import AlphaTrendStrategyConfig
+from strategy.grids_strategy_v2 import SignalGridStrategyConfig
+from strategy.alpha_trend_signal.alpha_trend_signal import AlphaTrendSignal
+from strategy.alpha_trend_signal.alpha_trend_grids_signal import AlphaTrendGridsSignal
+from config import DATA_PATH
+from utils.json_util import loads
+import log
+
+logger = log.getLogger(__name__)
+
+
+def base_config(strategy: str, symbol: Symbol, timeframes: list[str]):
+    if strategy == 'signal_grid':
+        # 与run_backtest.py示例相同的基础配置
+        return SignalGridStrategyConfig(
+            symbol=symbol,
+            timeframe=timeframes[0],
+            position_side=PositionSide.LONG,
+            master_side=OrderSide.BUY,
+            per_order_qty=0.02,
+            grid_spacing_rate=0.1,
+            max_order=24,
+            enable_exit_signal=True,
+            signal=AlphaTrendGridsSignal(AlphaTrendSignal(OrderSide.BUY)),
+            exit_signal_take_profit_min_rate=0.15,
+            fixed_rate_take_profit=True,
+            fixed_take_profit_rate=0.15,
+            enable_order_stop_loss=True,
+            order_stop_loss_rate=0.02,
+            enable_trailing_stop=True,
+            trailing_stop_rate=0.02,
+            trailing_stop_activation_profit_rate=0.02,
+        )
+    return AlphaTrendStrategyConfig(symbol=symbol, timeframes=timeframes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并行参数扫描回测')
+    parser.add_argument('--strategy', choices=['signal_grid', 'alpha_trend'], default='signal_grid')
+    parser.add_argument('--base', default='eth', help='基础币种')
+    parser.add_argument('--quote', default='usdt', help='计价币种')
+    parser.add_argument('--timeframes', nargs='+', default=['15m'], help='时间框架, alpha_trend需要主/辅两个')
+    parser.add_argument('--start', default='2026-01-01', help='数据开始日期')
+    parser.add_argument('--end', default='2026-03-19', help='数据结束日期')
+    parser.add_argument('--backtest-start', default=None, help='回测开始日期, 之前的数据用于预热, 默认跳过前300根K线')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--grid', required=True,
+                        help='JSON参数空间; 网格搜索时为候选值列表, 随机搜索时两个值的列表表示区间')
+    parser.add_argument('--random', type=int, default=0, help='随机采样的组数, 0表示网格搜索')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None, help='进程数, 默认CPU核数')
+    parser.add_argument('--results', default=None, help='结果文件(JSONL), 用于断点续跑')
+    parser.add_argument('--sort-by', default='net_return')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    symbol = Symbol(base=args.base, quote=args.quote)
+    space = loads(args.grid)
+    if args.random > 0:
+        param_sets = random_search({name: tuple(values) if len(values) == 2 else values for name, values in space.items()},
+                                   args.random, args.seed)
+    else:
+        param_sets = grid_search(space)
+
+    data_loader = HistoricalDataLoader()
+    historical_data = {}
+    for timeframe in args.timeframes:
+        file_path = data_loader.ensure_data(symbol, timeframe, args.start, args.end, args.data_dir)
+        # 内存映射加载, 所有子进程共享同一份数据
+        historical_data[timeframe] = data_loader.load_mmap(file_path, symbol, timeframe)
+        logger.info(f"加载了 {len(historical_data[timeframe])} 根{timeframe} K线数据")
+
+    settings = SweepSettings()
+    if args.backtest_start:
+        settings.start_timestamp = int(datetime.fromisoformat(args.backtest_start).timestamp() * 1000)
+
+    results_file = args.results or f"{DATA_PATH}/sweep_{args.strategy}_{symbol.simple()}_{'_'.join(args.timeframes)}.jsonl"
+    table = run_sweep(base_config(args.strategy, symbol, args.timeframes), param_sets, historical_data, settings,
+                      max_workers=args.workers, results_file=results_file, sort_by=args.sort_by)
+
+    print(table.head(args.top).to_string())
+    print(f"Results saved to: {results_file}")
+
+
+if __name__ == '__main__':
+    main()
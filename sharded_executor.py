@@ -0,0 +1,313 @@
+import concurrent.futures
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+import log
+from metrics import metrics
+
+logger = log.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class OverflowPolicy(Enum):
+    """
+    lane积压达到上限时的处理策略, 不可替换的消息(如已完成K线)在任何策略下都不会被丢弃
+    - DROP_OLDEST: 丢弃最早的可替换消息(未完成K线), 新消息入队
+    - BLOCK: 阻塞提交方直到lane有空位, 背压传导到数据源
+    - SHED: 丢弃新到的可替换消息
+    """
+    DROP_OLDEST = 'drop_oldest'
+    BLOCK = 'block'
+    SHED = 'shed'
+
+
+class _MailboxEntry(Generic[T]):
+    __slots__ = ('value', 'alive', 'key', 'replaceable')
+
+    def __init__(self, value: T, key: Optional[Hashable], replaceable: bool):
+        self.value = value
+        self.alive = True
+        self.key = key
+        self.replaceable = replaceable
+
+
+class CoalescingMailbox(Generic[T]):
+    """
+    最新值优先的合并邮箱
+    同一个key下尚未被消费的可替换消息会被后到的消息取代(旧消息作废, 新消息排到队尾),
+    不可替换的消息(如已完成K线)总是按顺序投递且只投递一次
+    作废的消息在队尾时直接移除, 否则留在队列中, 数量超过有效消息时压缩队列, 队列长度不超过有效消息数的两倍
+    """
+
+    def __init__(self):
+        self._entries: Deque[_MailboxEntry[T]] = deque()
+        self._replaceable: Dict[Hashable, _MailboxEntry[T]] = {}
+        self._size: int = 0
+        # 队列中已作废的消息数
+        self._dead: int = 0
+        self.coalesced_count: int = 0
+
+    def put(self, value: T, key: Optional[Hashable] = None, replaceable: bool = False) -> bool:
+        """
+        放入消息
+        @param key 合并key, 如 (symbol, timeframe)
+        @param replaceable 该消息是否允许被同key的后续消息取代
+        @return 是否取代了一条尚未消费的旧消息
+        """
+        coalesced = False
+        if key is not None:
+            previous = self._replaceable.pop(key, None)
+            if previous is not None and previous.alive:
+                self._discard(previous)
+                self.coalesced_count += 1
+                coalesced = True
+
+        entry = _MailboxEntry(value, key, replaceable)
+        self._entries.append(entry)
+        self._size += 1
+        if key is not None and replaceable:
+            self._replaceable[key] = entry
+        return coalesced
+
+    def _discard(self, entry: _MailboxEntry[T]) -> None:
+        entry.alive = False
+        self._size -= 1
+        if self._entries[-1] is entry:
+            # 同一个key连续更新时旧消息总在队尾, O(1)移除
+            self._entries.pop()
+            return
+        self._dead += 1
+        self._compact()
+
+    def _compact(self) -> None:
+        """作废的消息多于有效消息时重建队列"""
+        if self._dead > self._size:
+            self._entries = deque(e for e in self._entries if e.alive)
+            self._dead = 0
+
+    def replaces(self, key: Optional[Hashable]) -> bool:
+        """放入该key的可替换消息时是否会取代一条未消费的旧消息(队列长度不变)"""
+        if key is None:
+            return False
+        previous = self._replaceable.get(key)
+        return previous is not None and previous.alive
+
+    def drop_oldest(self) -> bool:
+        """丢弃最早的一条可替换消息, 没有可丢弃的消息时返回False"""
+        for entry in self._entries:
+            if entry.alive and entry.replaceable:
+                if self._replaceable.get(entry.key) is entry:
+                    del self._replaceable[entry.key]
+                self._discard(entry)
+                return True
+        return False
+
+    def get(self) -> T:
+        """取出最早的有效消息, 邮箱为空时抛出IndexError"""
+        while True:
+            entry = self._entries.popleft()
+            if entry.alive:
+                entry.alive = False
+                self._size -= 1
+                self._compact()
+                return entry.value
+            self._dead -= 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._replaceable.clear()
+        self._size = 0
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class _Lane:
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.items: CoalescingMailbox[Tuple[Callable[..., Any], Tuple[Any, ...]]] = CoalescingMailbox()
+        # lane是否已经在线程池中排队或执行
+        self.scheduled: bool = False
+        self.lagging: bool = False
+        self.max_pending: Optional[int] = None
+        self.overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST
+        # 已请求移除, 积压任务执行完后删除
+        self.removed: bool = False
+
+
+class ShardedExecutor:
+    """
+    分片串行执行器
+    同一个lane内的任务严格按提交顺序串行执行, 不同lane分布在共享线程池上并行执行
+    @param max_workers 线程池大小
+    @param lag_threshold lane积压任务数超过该值时告警
+    @param batch_size 单个lane每次占用线程最多执行的任务数, 避免繁忙lane长期占用线程
+    """
+
+    def __init__(self, max_workers: int = 5, lag_threshold: int = 100, batch_size: int = 32):
+        self.max_workers = max_workers
+        self.lag_threshold = lag_threshold
+        self.batch_size = batch_size
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._lanes: Dict[Hashable, _Lane] = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._space = threading.Condition(self._lock)
+        self._active_lanes: int = 0
+        self._shutdown: bool = False
+        self.coalesced_count: int = 0
+
+    def _get_lane(self, lane_key: Hashable) -> _Lane:
+        lane = self._lanes.get(lane_key)
+        if lane is None:
+            lane = _Lane(lane_key)
+            self._lanes[lane_key] = lane
+        else:
+            # 等待移除期间又被使用, 保留该lane
+            lane.removed = False
+        return lane
+
+    def remove_lane(self, lane_key: Hashable) -> None:
+        """移除lane, 空闲的lane立即删除, 正在执行的lane在积压任务执行完后删除"""
+        with self._lock:
+            lane = self._lanes.get(lane_key)
+            if lane is None:
+                return
+            if lane.scheduled:
+                lane.removed = True
+            else:
+                del self._lanes[lane_key]
+
+    def configure_lane(self, lane_key: Hashable, max_pending: Optional[int],
+                       overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST) -> None:
+        """
+        设置lane的积压上限
+        @param max_pending 积压任务数上限, None表示不限制
+        @param overflow_policy 达到上限时的处理策略
+        """
+        with self._lock:
+            lane = self._get_lane(lane_key)
+            lane.max_pending = max_pending
+            lane.overflow_policy = overflow_policy
+
+    def submit(self, lane_key: Hashable, fn: Callable[..., Any], *args: Any,
+               coalesce_key: Optional[Hashable] = None, replaceable: bool = False) -> bool:
+        """
+        提交任务到指定lane
+        @param coalesce_key 合并key, lane繁忙时同key的可替换任务只保留最新一条
+        @param replaceable 该任务是否允许被同key的后续任务取代, 也只有可替换的任务会因积压被丢弃
+        @return 任务是否入队
+        """
+        with self._lock:
+            if self._shutdown:
+                return False
+            lane = self._get_lane(lane_key)
+            if not self._reserve(lane, coalesce_key, replaceable):
+                return False
+            if lane.items.put((fn, args), coalesce_key, replaceable):
+                self.coalesced_count += 1
+                metrics.inc('executor.coalesced')
+            self._check_lag(lane)
+            if not lane.scheduled:
+                lane.scheduled = True
+                self._active_lanes += 1
+                self._executor.submit(self._drain, lane)
+            return True
+
+    def _is_full(self, lane: _Lane, coalesce_key: Optional[Hashable]) -> bool:
+        return (lane.max_pending is not None and len(lane.items) >= lane.max_pending
+                and not lane.items.replaces(coalesce_key))
+
+    def _reserve(self, lane: _Lane, coalesce_key: Optional[Hashable], replaceable: bool) -> bool:
+        """lane已满时按溢出策略腾出空位, 返回新任务是否可以入队, 调用方需持有锁"""
+        if not self._is_full(lane, coalesce_key):
+            return True
+
+        policy = lane.overflow_policy
+        if policy == OverflowPolicy.BLOCK:
+            # 不能在lane自身的执行线程中提交, 否则会死锁
+            metrics.inc('executor.overflow.blocked')
+            start = time.perf_counter()
+            while self._is_full(lane, coalesce_key) and not self._shutdown:
+                self._space.wait()
+            metrics.observe('executor.overflow.block_wait', (time.perf_counter() - start) * 1000)
+            return not self._shutdown
+
+        if policy == OverflowPolicy.SHED:
+            if replaceable:
+                metrics.inc('executor.overflow.shed')
+                logger.debug(f"Lane {lane.key} is full, shed new update")
+                return False
+            return True
+
+        if lane.items.drop_oldest():
+            metrics.inc('executor.overflow.dropped')
+            logger.debug(f"Lane {lane.key} is full, dropped oldest update")
+        return True
+
+    def _check_lag(self, lane: _Lane) -> None:
+        depth = len(lane.items)
+        if not lane.lagging and depth > self.lag_threshold:
+            lane.lagging = True
+            logger.warning(f"Lane {lane.key} is falling behind, pending: {depth}")
+        elif lane.lagging and depth <= self.lag_threshold // 2:
+            lane.lagging = False
+            logger.info(f"Lane {lane.key} caught up, pending: {depth}")
+
+    def _drain(self, lane: _Lane) -> None:
+        for _ in range(self.batch_size):
+            with self._lock:
+                if not lane.items:
+                    lane.scheduled = False
+                    self._check_lag(lane)
+                    if lane.removed and self._lanes.get(lane.key) is lane:
+                        del self._lanes[lane.key]
+                    self._active_lanes -= 1
+                    self._idle.notify_all()
+                    return
+                fn, args = lane.items.get()
+                if lane.max_pending is not None:
+                    self._space.notify_all()
+            try:
+                fn(*args)
+            except Exception:
+                logger.error(f"Lane {lane.key} task failed", exc_info=True)
+
+        # 让出线程, lane重新排队以保证不同lane之间的公平性
+        with self._lock:
+            self._check_lag(lane)
+            if self._shutdown:
+                lane.items.clear()
+                self._space.notify_all()
+                lane.scheduled = False
+                self._active_lanes -= 1
+                self._idle.notify_all()
+                return
+            self._executor.submit(self._drain, lane)
+
+    def lane_depths(self) -> Dict[Hashable, int]:
+        """每个lane当前积压的任务数"""
+        with self._lock:
+            return {key: len(lane.items) for key, lane in self._lanes.items()}
+
+    def lagging_lanes(self) -> List[Hashable]:
+        with self._lock:
+            return [key for key, lane in self._lanes.items() if lane.lagging]
+
+    def shutdown(self, wait: bool = False) -> None:
+        """
+        关闭执行器
+        @param wait 为True时等待所有lane中已提交的任务执行完毕
+        """
+        with self._lock:
+            if wait:
+                while self._active_lanes > 0:
+                    self._idle.wait()
+            self._shutdown = True
+            self._space.notify_all()
+        self._executor.shutdown(wait=wait)
@@ -1,15 +1,18 @@
 from abc import ABC, abstractmethod
 import threading
+import time
 
 import numpy as np
-import pandas as pd
 from pandas import DataFrame
 from typing import List, Dict, Optional
 
 from client.ex_client import ExClient
-from model import Kline, OrderSide
+from metrics import metrics
+from model import Kline, OrderSide, Symbol
 import log
 from pydantic import BaseModel
+from strategy.kline_buffer import KlineBuffer, KlineFrameView
+from strategy.market_data_store import MarketDataStore, MarketSeries
 
 logger = log.getLogger(__name__)
 
@@ -26,8 +29,44 @@ class KlineData(BaseModel):
     model_config = {"arbitrary_types_allowed": True}
 
     timeframe: str
-    klines: DataFrame
+    view: KlineFrameView
     latest_kline: Optional[Kline]
+    # 使用共享行情存储时引用的序列
+    series: Optional[MarketSeries] = None
+
+    @property
+    def buffer(self) -> KlineBuffer:
+        return self.view.buffer
+
+    @property
+    def klines(self) -> DataFrame:
+        return self.view.to_frame()
+
+class IntraBarPolicy(BaseModel):
+    """
+    未完成K线触发on_kline的节流策略, 默认每次更新都触发; 已完成K线总是触发
+    @param min_interval 两次评估之间的最小间隔(秒)
+    @param min_price_change_rate 价格相对上次评估的变化比例达到该值时触发
+    @param on_level_touch 价格穿过策略relevant_price_levels返回的价格时触发
+    min_interval必须满足; 同时配置了min_price_change_rate和on_level_touch时满足任意一个即可
+    """
+    min_interval: float = 0
+    min_price_change_rate: float = 0
+    on_level_touch: bool = False
+
+    def is_throttled(self) -> bool:
+        return self.min_interval > 0 or self.min_price_change_rate > 0 or self.on_level_touch
+
+
+class _IntraBarState:
+    """某个时间框架上次评估的时间和价格, 以及之后是否穿过了关注的价格"""
+
+    def __init__(self):
+        self.evaluated_at: float = float('-inf')
+        self.evaluated_price: Optional[float] = None
+        self.last_price: Optional[float] = None
+        self.touched: bool = False
+
 
 class MultiTimeframeStrategy(Strategy):
     def __init__(self, timeframes: List[str]):
@@ -35,31 +74,66 @@ class MultiTimeframeStrategy(Strategy):
         self.timeframes: List[str] = timeframes
         self.kline_data_dict: Dict[str, KlineData] = {}
         self.init_kline_nums = 300
+        # 每个时间框架保留的K线数量, 未配置的时间框架默认保留 init_kline_nums + kline_retention_margin
+        self.kline_retention: Dict[str, Optional[int]] = {}
+        self.kline_retention_margin = 200
         self.on_kline_finished_lock = threading.Lock()
         self.on_kline_lock = threading.Lock()
         self.data_lock = threading.Lock()
+        self.market_data_store: Optional[MarketDataStore] = None
+        self.intra_bar_policy: IntraBarPolicy = IntraBarPolicy()
+        self._intra_bar_states: Dict[str, _IntraBarState] = {}
 
         for timeframe in timeframes:
-            empty_df = DataFrame({
-                'datetime': pd.Series(dtype='str'),
-                'open': pd.Series(dtype='float64'),
-                'high': pd.Series(dtype='float64'),
-                'low': pd.Series(dtype='float64'),
-                'close': pd.Series(dtype='float64'),
-                'volume': pd.Series(dtype='float64'),
-                'finished': pd.Series(dtype='boolean')
-            })
-            self.kline_data_dict[timeframe] = KlineData(timeframe=timeframe, klines=empty_df, latest_kline=None)
+            self.kline_data_dict[timeframe] = KlineData(timeframe=timeframe, view=KlineFrameView(KlineBuffer()), latest_kline=None)
 
     def exchange_client(self) -> ExClient:
         raise NotImplementedError()
 
+    def signals_by_timeframe(self) -> Dict[str, List['Signal']]:
+        """策略在各时间框架上使用的信号, 回测时用于预先计算信号"""
+        return {}
+
+    def relevant_price_levels(self, timeframe: str) -> List[float]:
+        """关注的价格(如挂单价格), 配合IntraBarPolicy.on_level_touch使用, 价格穿过时才在K线内评估"""
+        return []
+
     def klines(self, timeframe: str) -> DataFrame:
         """将指定时间框架的klines转换为DataFrame进行分析"""
         if timeframe not in self.kline_data_dict:
             raise ValueError(f"Timeframe {timeframe} not found")
         return self.kline_data_dict[timeframe].klines
 
+    def kline_buffer(self, timeframe: str) -> KlineBuffer:
+        """指定时间框架的K线缓冲区, 可直接读取NumPy列视图"""
+        if timeframe not in self.kline_data_dict:
+            raise ValueError(f"Timeframe {timeframe} not found")
+        return self.kline_data_dict[timeframe].buffer
+
+    def use_market_data_store(self, store: MarketDataStore):
+        """
+        使用共享行情存储, 订阅相同(symbol, timeframe)的策略共享一份K线数据和历史数据加载
+        需要在收到第一根K线之前设置
+        """
+        self.market_data_store = store
+
+    def release_market_data(self):
+        """释放引用的共享序列"""
+        if self.market_data_store is None:
+            return
+        for kline_data in self.kline_data_dict.values():
+            if kline_data.series is not None:
+                self.market_data_store.release(kline_data.series.symbol, kline_data.timeframe)
+                kline_data.series = None
+                kline_data.view = KlineFrameView(KlineBuffer())
+        self.market_data_store = None
+
+    def retention(self, timeframe: str) -> Optional[int]:
+        """指定时间框架保留的K线数量, None表示不限制"""
+        if timeframe in self.kline_retention:
+            return self.kline_retention[timeframe]
+        return self.init_kline_nums + self.kline_retention_margin
+
     def latest_kline(self, timeframe: str) -> Optional[Kline]:
         """获取指定时间框架的最新K线"""
         if timeframe not in self.kline_data_dict:
@@ -74,46 +148,116 @@ class MultiTimeframeStrategy(Strategy):
         """处理K线完成事件（多时间框架版本）"""
         pass
 
+    def warm_up(self, symbol: Symbol, timeframe: str):
+        """启动前加载历史K线, 避免在处理第一根实时K线时请求交易所"""
+        self._initialize_timeframe(symbol, timeframe)
+
     def _initialize_klines_if_needed(self, kline: Kline):
         """Initialize klines with historical data if the DataFrame is empty"""
-        timeframe = kline.timeframe
-        if len(self.kline_data_dict[timeframe].klines) == 0:
-            ohlcv = self.exchange_client().fetch_ohlcv(kline.symbol, timeframe, self.init_kline_nums)
-            df = DataFrame([row.to_dict() for row in ohlcv])
-            self.kline_data_dict[timeframe].klines = df
-
-    def _update_klines(self, kline: Kline):
-        """Update the last kline and manage the DataFrame"""
-        timeframe = kline.timeframe
-        self.kline_data_dict[timeframe].latest_kline = kline
+        self._initialize_timeframe(kline.symbol, kline.timeframe)
+
+    def _initialize_timeframe(self, symbol: Symbol, timeframe: str):
+        """
+        加载尚未加载的历史K线
+        请求交易所时不持有data_lock, 同一策略的多个时间框架可以并发加载, 慢请求也不阻塞其他时间框架的K线处理
+        """
+        kline_data = self.kline_data_dict[timeframe]
+        if self.market_data_store is not None:
+            series = kline_data.series
+            if series is None:
+                with self.data_lock:
+                    series = self._acquire_series(symbol, timeframe)
+            # 共享序列由MarketDataStore保证只加载一次
+            self.market_data_store.initialize(series, lambda: self._fetch_history(symbol, timeframe))
+            return
 
-        kline_dict = kline.to_dict()
-        df = self.kline_data_dict[timeframe].klines
+        if len(kline_data.buffer) > 0:
+            return
+        ohlcv = self._fetch_history(symbol, timeframe)
+        with self.data_lock:
+            self._install_history(kline_data.buffer, timeframe, ohlcv)
+
+    def _fetch_history(self, symbol: Symbol, timeframe: str) -> List[Kline]:
+        return self.exchange_client().fetch_ohlcv(symbol, timeframe, self.init_kline_nums)
+
+    def _acquire_series(self, symbol: Symbol, timeframe: str) -> MarketSeries:
+        """引用共享序列, 需持有data_lock"""
+        kline_data = self.kline_data_dict[timeframe]
+        if kline_data.series is None:
+            kline_data.series = self.market_data_store.acquire(symbol, timeframe, self.retention(timeframe))
+            kline_data.view = KlineFrameView(kline_data.series.buffer)
+        return kline_data.series
+
+    def _install_history(self, buffer: KlineBuffer, timeframe: str, ohlcv: List[Kline]):
+        """写入加载的历史K线, 需持有data_lock; 缓冲区已有数据(如并发加载先完成)时忽略"""
+        if len(buffer) == 0:
+            buffer.set_maxlen(self.retention(timeframe))
+            buffer.extend(ohlcv)
 
-        # 检查是否需要更新最后一个kline或添加新的kline
-        if len(df) > 0 and df['datetime'].iloc[-1] == kline.datetime:
-            # Update last row
-            df.loc[df.index[-1]] = kline_dict
+    def _update_klines(self, kline: Kline):
+        """Update the last kline and manage the buffer"""
+        kline_data = self.kline_data_dict[kline.timeframe]
+        kline_data.latest_kline = kline
+        if kline_data.series is not None and self.market_data_store is not None:
+            # 共享序列每帧只写入一次
+            self.market_data_store.update(kline)
         else:
-            # Append new row
-            new_df = pd.concat([df, DataFrame([kline_dict])], ignore_index=True)
-            self.kline_data_dict[timeframe].klines = new_df
+            # 与最后一根K线时间相同则原地更新, 否则追加
+            kline_data.buffer.upsert(kline)
+
+    def _should_evaluate(self, kline: Kline) -> bool:
+        """按intra_bar_policy判断本次K线更新是否触发on_kline"""
+        policy = self.intra_bar_policy
+        state = self._intra_bar_states.get(kline.timeframe)
+        if state is None:
+            state = self._intra_bar_states[kline.timeframe] = _IntraBarState()
+        price = kline.close
+        now = time.monotonic()
+
+        if not kline.finished and policy.is_throttled():
+            if policy.on_level_touch and state.last_price is not None:
+                low, high = min(state.last_price, price), max(state.last_price, price)
+                state.touched = state.touched or any(low <= level <= high for level in self.relevant_price_levels(kline.timeframe))
+            state.last_price = price
+
+            if now - state.evaluated_at < policy.min_interval:
+                return False
+            triggers = []
+            if policy.min_price_change_rate > 0:
+                triggers.append(state.evaluated_price is None or
+                                abs(price - state.evaluated_price) >= state.evaluated_price * policy.min_price_change_rate)
+            if policy.on_level_touch:
+                triggers.append(state.touched)
+            if triggers and not any(triggers):
+                return False
+
+        state.evaluated_at = now
+        state.evaluated_price = price
+        state.last_price = price
+        state.touched = False
+        return True
 
     def _call_on_kline(self, timeframe: str):
         """Safely call the on_kline method with locking"""
         if self.on_kline_lock.acquire(blocking=False):
             try:
-                self.on_kline(timeframe)
+                with metrics.timer('on_kline'):
+                    self.on_kline(timeframe)
             finally:
                 self.on_kline_lock.release()
+        else:
+            metrics.inc('strategy.on_kline_skipped')
 
     def _call_on_kline_finished(self, timeframe: str):
         """Safely call the on_kline_finished method with locking"""
         if self.on_kline_finished_lock.acquire(blocking=False):
             try:
-                self.on_kline_finished(timeframe)
+                with metrics.timer('on_kline_finished'):
+                    self.on_kline_finished(timeframe)
             finally:
                 self.on_kline_finished_lock.release()
+        else:
+            metrics.inc('strategy.on_kline_finished_skipped')
 
     def run(self, kline: Kline):
         """处理K线数据（多时间框架版本）"""
@@ -122,16 +266,17 @@ class MultiTimeframeStrategy(Strategy):
         if timeframe not in self.kline_data_dict:
             raise ValueError(f"Timeframe {timeframe} not registered in the strategy")
 
-        if self.data_lock.acquire(blocking=kline.finished):
-            try:
-                self._initialize_klines_if_needed(kline)
+        # 未加载历史K线时(未预热或预热失败)在锁外加载
+        self._initialize_klines_if_needed(kline)
+        # 任务的lane已保证串行, data_lock只在写入K线和加载历史数据时短暂持有, 未完成K线也等待而不丢弃
+        with self.data_lock:
+            with metrics.timer('update_klines'):
                 self._update_klines(kline)
-            finally:
-                self.data_lock.release()
-        else:
-            return
 
-        self._call_on_kline(timeframe)
+        if self._should_evaluate(kline):
+            self._call_on_kline(timeframe)
+        else:
+            metrics.inc('strategy.on_kline_throttled')
 
         if kline.finished:
             self._call_on_kline_finished(timeframe)
@@ -173,11 +318,25 @@ class SingleTimeframeStrategy(MultiTimeframeStrategy):
 class Signal:
     def __init__(self, side: OrderSide):
         self.side: OrderSide = side
+        # 为True时使用on_bar增量更新指标, 而不是每次对全部历史重新计算
+        self.incremental: bool = False
 
     @abstractmethod
     def run(self, klines: DataFrame) -> int:
         pass
 
+    def on_bar(self, bar: Kline) -> None:
+        """增量模式下用一根已完成K线更新指标状态"""
+        raise NotImplementedError(f"{type(self).__name__} does not support incremental update")
+
+    def precompute(self, klines: DataFrame) -> bool:
+        """
+        回测时对完整历史一次性向量化计算指标和信号, 之后run按当前K线查表
+        只使用不依赖未来数据的指标, 第i根K线的值只由前i根K线决定
+        @return 是否支持预计算
+        """
+        return False
+
     def is_entry(self, df: DataFrame) -> bool:
         signal = self.run(df)
         if self.side == OrderSide.BUY:
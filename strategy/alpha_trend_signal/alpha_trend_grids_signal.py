@@ -29,6 +29,9 @@ class AlphaTrendGridsSignal(Signal):
         self.ats.run(klines)
         return 0
 
+    def precompute(self, klines: DataFrame) -> bool:
+        return self.ats.precompute(klines)
+
     def is_entry(self, df) -> bool:
         return self.ats.is_entry(df) or self.ats.is_exit(df)
 
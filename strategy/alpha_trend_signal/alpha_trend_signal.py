@@ -1,10 +1,14 @@
+from typing import NamedTuple
+
 import talib as ta
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
-from model import OrderSide
+from model import Kline, OrderSide
 from strategy import Signal
+from strategy.indicator_cache import frame_key, indicator_cache
+from strategy.indicators import MACD, AlphaTrend, AlphaTrendValue, MACDValue
 
 _datetime = 'datetime'
 _high = 'high'
@@ -23,67 +27,106 @@ _signal = 'signal'
 _macd = 'macd'
 _macd_signal = 'macd_signal'
 _macd_hist = 'macd_hist'
+_finished = 'finished'
 
-def _alpha_trend_indicator(df: DataFrame, atr_multiple: float = 1.0, period: int = 8):
-    # 计算技术指标
-    high_values, low_values, close_values, volume_values = df[[_high, _low, _close, _volume]].values.T.astype(np.float64)
+class AlphaTrendResult(NamedTuple):
+    atr: np.ndarray
+    atr_base_low: np.ndarray
+    atr_base_high: np.ndarray
+    mfi: np.ndarray
+    alpha_trend: np.ndarray
+    # -1: alpha_trend低于两根K线前, 1: 高于两根K线前, NaN: 无信号
+    signal: np.ndarray
+
+
+class MACDResult(NamedTuple):
+    macd: np.ndarray
+    signal: np.ndarray
+    hist: np.ndarray
+
+
+def _float_values(df: DataFrame, column: str) -> np.ndarray:
+    # float64列直接返回底层数组, 不复制
+    return df[column].to_numpy(dtype=np.float64)
+
+
+def alpha_trend_values(df: DataFrame, atr_multiple: float = 1.0, period: int = 8) -> AlphaTrendResult:
+    """计算alpha_trend指标和信号, 只读取df的行情列, 不修改df"""
+    high_values = _float_values(df, _high)
+    low_values = _float_values(df, _low)
+    close_values = _float_values(df, _close)
+    volume_values = _float_values(df, _volume)
     atr_values = ta.ATR(high_values, low_values, close_values, timeperiod=period)
     atr_range_values = atr_values * atr_multiple
     atr_base_low_values = low_values - atr_range_values
     atr_base_high_values = high_values + atr_range_values
     mfi_values = ta.MFI(high_values, low_values, close_values, volume_values, timeperiod=period)
 
-    df[_atr] = atr_values
-    df[_atr_base_low] = atr_base_low_values
-    df[_atr_base_high] = atr_base_high_values
-    df[_mfi] = mfi_values
-
     alpha_trend_values = np.full(len(df), np.nan)
     if period < len(df):
         alpha_trend_values[period] = atr_base_low_values[period] if mfi_values[period] >= 50 else atr_base_high_values[period]
-        
+
         for i in range(period + 1, len(df)):
             if mfi_values[i] >= 50:
                 alpha_trend_values[i] = max(alpha_trend_values[i-1], atr_base_low_values[i])
             else:
                 alpha_trend_values[i] = min(alpha_trend_values[i-1], atr_base_high_values[i])
-    
-    df[_alpha_trend] = alpha_trend_values
-
-    # 通过alpha_trend交叉计算买卖信号
-    alpha_trend_shift2 = df[_alpha_trend].shift(2)
-    df[_buy_signal] = (df[_alpha_trend] > alpha_trend_shift2).astype('boolean')
-    df[_sell_signal] = (df[_alpha_trend] < alpha_trend_shift2).astype('boolean')
-
-    # 新增一列 _signal 用于存储最终信号
-    df[_signal] = np.nan
-    df[_signal] = np.select(
-        [df[_sell_signal], df[_buy_signal]],  # 条件列表，按优先级排序
-        [-1, 1],                              # 对应条件的取值
-        default=np.nan                        # 默认值
+
+    # 通过alpha_trend与两根K线前比较计算买卖信号, 卖出信号优先
+    alpha_trend_shift2 = np.full(len(df), np.nan)
+    alpha_trend_shift2[2:] = alpha_trend_values[:-2]
+    signal_values = np.select(
+        [alpha_trend_values < alpha_trend_shift2, alpha_trend_values > alpha_trend_shift2],
+        [-1, 1],
+        default=np.nan
     )
 
-    return df
+    return AlphaTrendResult(atr_values, atr_base_low_values, atr_base_high_values, mfi_values,
+                            alpha_trend_values, signal_values)
 
-def _macd_indicator(df: DataFrame, macd_fast_period: int = 12, macd_slow_period: int = 26, macd_signal_period: int = 9) -> DataFrame:
-    close_values = np.asarray(df[_close].values, dtype=np.float64)
-    macd_values, macd_signal_values, macd_hist_values = ta.MACD(
-        close_values,
+
+def macd_values(df: DataFrame, macd_fast_period: int = 12, macd_slow_period: int = 26, macd_signal_period: int = 9) -> MACDResult:
+    """计算MACD, 不修改df"""
+    return MACDResult(*ta.MACD(
+        _float_values(df, _close),
         fastperiod=macd_fast_period,
         slowperiod=macd_slow_period,
         signalperiod=macd_signal_period
-    )
+    ))
+
 
-    df[_macd] = macd_values
-    df[_macd_signal] = macd_signal_values
-    df[_macd_hist] = macd_hist_values
+def _alpha_trend_indicator(df: DataFrame, atr_multiple: float = 1.0, period: int = 8):
+    """将alpha_trend指标写入df的列, 用于导出和分析; 策略计算信号使用alpha_trend_values"""
+    result = alpha_trend_values(df, atr_multiple, period)
+    df[_atr] = result.atr
+    df[_atr_base_low] = result.atr_base_low
+    df[_atr_base_high] = result.atr_base_high
+    df[_mfi] = result.mfi
+    df[_alpha_trend] = result.alpha_trend
+    df[_buy_signal] = pd.array(result.signal == 1, dtype='boolean')
+    df[_sell_signal] = pd.array(result.signal == -1, dtype='boolean')
+    df[_signal] = result.signal
+    return df
+
+def _macd_indicator(df: DataFrame, macd_fast_period: int = 12, macd_slow_period: int = 26, macd_signal_period: int = 9) -> DataFrame:
+    result = macd_values(df, macd_fast_period, macd_slow_period, macd_signal_period)
+    df[_macd] = result.macd
+    df[_macd_signal] = result.signal
+    df[_macd_hist] = result.hist
     return df
 
 
 class AlphaTrendSignal(Signal):
+    """
+    @param incremental 增量模式: 每根已完成K线只更新一次指标状态, 未完成K线在状态上试算, 不再对全部历史重算,
+    也不再向klines写入指标列
+    """
+
     def __init__(self, side: OrderSide, atr_multiple: float = 1.0, period: int = 8, reverse: bool = False,
-                 macd_fast_period: int = 12, macd_slow_period: int = 26, macd_signal_period: int = 9):
+                 macd_fast_period: int = 12, macd_slow_period: int = 26, macd_signal_period: int = 9,
+                 incremental: bool = False):
         super().__init__(side)
+        self.incremental = incremental
         self.atr_multiple = atr_multiple
         self.period = period
         self.reverse = reverse
@@ -101,21 +144,53 @@ class AlphaTrendSignal(Signal):
         self.previous_macd: float = 0.0
         self.previous_macd_signal: float = 0.0
 
-    def _compute_signal(self, df: DataFrame, first_run: bool = False) -> int:
-        if len(df) < self.period + 2:
+        # 增量模式的指标状态
+        self._alpha_trend = AlphaTrend(atr_multiple, period)
+        self._macd = MACD(macd_fast_period, macd_slow_period, macd_signal_period)
+        self._bar_datetime: str | None = None
+        self._last_valid_signal: int = 0
+
+        # 回测预计算的指标和信号, 按K线时间查表
+        self._precomputed: dict | None = None
+        self._precomputed_index: dict | None = None
+
+    def _alpha_trend_result(self, klines: DataFrame) -> AlphaTrendResult:
+        """
+        klines上的alpha_trend结果, 相同K线窗口和参数的结果在所有信号实例间共享
+        klines没有来源信息时直接计算
+        """
+        key = frame_key(klines)
+        if key is None:
+            return alpha_trend_values(klines, self.atr_multiple, self.period)
+        return indicator_cache.get_or_compute(
+            key + (_alpha_trend, self.atr_multiple, self.period),
+            lambda: alpha_trend_values(klines, self.atr_multiple, self.period))
+
+    def _macd_result(self, klines: DataFrame) -> MACDResult:
+        key = frame_key(klines)
+        if key is None:
+            return macd_values(klines, self.macd_fast_period, self.macd_slow_period, self.macd_signal_period)
+        return indicator_cache.get_or_compute(
+            key + (_macd, self.macd_fast_period, self.macd_slow_period, self.macd_signal_period),
+            lambda: macd_values(klines, self.macd_fast_period, self.macd_slow_period, self.macd_signal_period))
+
+    def _compute_signal(self, result: AlphaTrendResult, first_run: bool = False) -> int:
+        if len(result.signal) < self.period + 2:
             return 0
 
+        last_valid_signal = None
         if first_run:
-            last_valid_index = df[_signal].last_valid_index()
-            if last_valid_index is not None:
-                self.current_signal = int(df[_signal].loc[last_valid_index])
+            valid = np.flatnonzero(~np.isnan(result.signal))
+            if len(valid) > 0:
+                last_valid_signal = int(result.signal[valid[-1]])
+
+        signal = 0 if np.isnan(result.signal[-1]) else int(result.signal[-1])
+        return self._update_current_signal(signal, last_valid_signal)
 
-        signal = 0
-        last_row = df.iloc[-1]
-        if pd.notna(last_row[_buy_signal]) and last_row[_buy_signal]:
-            signal = 1
-        if pd.notna(last_row[_sell_signal]) and last_row[_sell_signal]:
-            signal = -1
+    def _update_current_signal(self, signal: int, last_valid_signal: int | None = None) -> int:
+        """只在信号方向变化时返回信号, last_valid_signal为首次运行时历史上最后一个信号"""
+        if last_valid_signal is not None:
+            self.current_signal = last_valid_signal
 
         if signal == 0:
             return 0
@@ -126,15 +201,140 @@ class AlphaTrendSignal(Signal):
         else:
             return 0
     
-    def _macd_signal(self, df: DataFrame):
-        if len(df) < max(self.macd_fast_period, self.macd_slow_period, self.macd_signal_period) + 2:
+    def _macd_signal(self, result: MACDResult):
+        if len(result.macd) < max(self.macd_fast_period, self.macd_slow_period, self.macd_signal_period) + 2:
             return
-        
+        self._update_macd(MACDValue(result.macd[-1], result.signal[-1], result.hist[-1]))
+
+    def _update_macd(self, value: MACDValue):
         self.previous_macd = self.current_macd
         self.previous_macd_signal = self.current_macd_signal
-        self.current_macd = df[_macd].iloc[-1] if len(df[_macd]) > 0 and pd.notna(df[_macd].iloc[-1]) else 0
-        self.current_macd_signal = df[_macd_signal].iloc[-1] if len(df[_macd_signal]) > 0 and pd.notna(df[_macd_signal].iloc[-1]) else 0
-        self.current_macd_hist = df[_macd_hist].iloc[-1] if len(df[_macd_hist]) > 0 and pd.notna(df[_macd_hist].iloc[-1]) else 0
+        self.current_macd = 0 if np.isnan(value.macd) else value.macd
+        self.current_macd_signal = 0 if np.isnan(value.signal) else value.signal
+        self.current_macd_hist = 0 if np.isnan(value.hist) else value.hist
+
+    def _feed(self, high: float, low: float, close: float, volume: float, bar_datetime: str) -> AlphaTrendValue:
+        value = self._alpha_trend.update(high, low, close, volume)
+        self._macd.update(close)
+        self._bar_datetime = bar_datetime
+        if value.signal != 0:
+            self._last_valid_signal = value.signal
+        return value
+
+    def on_bar(self, bar: Kline) -> None:
+        self._feed(bar.high, bar.low, bar.close, bar.volume, bar.datetime)
+
+    def incremental_signal(self, klines: DataFrame) -> int:
+        """
+        增量计算信号, 结果与true_signal一致
+        klines中新的已完成K线依次更新指标状态, 最后一根K线未完成时只试算不更新状态
+        """
+        datetimes = klines[_datetime].to_numpy()
+        last_time = datetimes[-1]
+
+        if self.datetime == last_time:
+            return self.current_kline_status
+
+        # 没有finished列时视为全部已完成
+        finished = klines[_finished].to_numpy() if _finished in klines.columns else np.ones(len(klines), dtype=bool)
+        start = len(klines)
+        while start > 0 and (self._bar_datetime is None or datetimes[start - 1] > self._bar_datetime):
+            start -= 1
+
+        high_values, low_values, close_values, volume_values = klines[[_high, _low, _close, _volume]].values.T.astype(np.float64)
+        value = self._alpha_trend.value
+        macd_value = self._macd.value
+        for i in range(start, len(klines)):
+            if finished[i]:
+                value = self._feed(high_values[i], low_values[i], close_values[i], volume_values[i], datetimes[i])
+                macd_value = self._macd.value
+            elif i == len(klines) - 1:
+                value = self._alpha_trend.peek(high_values[i], low_values[i], close_values[i], volume_values[i])
+                macd_value = self._macd.peek(close_values[i])
+
+        if len(klines) < self.period + 2:
+            self.current_kline_status = 0
+        else:
+            last_valid_signal = None
+            if self.datetime is None:
+                last_valid_signal = value.signal or self._last_valid_signal
+            self.current_kline_status = self._update_current_signal(value.signal, last_valid_signal)
+        self.current_alpha_trend = value.alpha_trend
+
+        if len(klines) >= max(self.macd_fast_period, self.macd_slow_period, self.macd_signal_period) + 2:
+            self._update_macd(macd_value)
+
+        self.datetime = last_time
+
+        return self.current_kline_status
+
+    def precompute(self, klines: DataFrame) -> bool:
+        """
+        对完整历史一次性计算alpha_trend、信号和MACD
+        TA-Lib和alpha_trend的递推都只依赖当前及之前的K线, 第i行的结果与只用前i根K线计算相同, 不会引入未来数据
+        """
+        result = alpha_trend_values(klines, self.atr_multiple, self.period)
+        macd = macd_values(klines, self.macd_fast_period, self.macd_slow_period, self.macd_signal_period)
+        self._precomputed = {
+            _alpha_trend: result.alpha_trend,
+            _signal: np.nan_to_num(result.signal, nan=0).astype(np.int64),
+            # 截至每根K线最后一个有效信号, 对应批量计算首次运行时的last_valid_signal
+            'last_valid_signal': pd.Series(result.signal).ffill().fillna(0).to_numpy().astype(np.int64),
+            _macd: macd.macd,
+            _macd_signal: macd.signal,
+            _macd_hist: macd.hist,
+            _close: _float_values(klines, _close),
+        }
+        self._precomputed_index = {dt: i for i, dt in enumerate(klines[_datetime].to_numpy())}
+        return True
+
+    def _precomputed_row(self, klines: DataFrame) -> int | None:
+        """最后一根K线在预计算结果中的行号, K线未完成或与预计算数据不一致时返回None"""
+        if self._precomputed_index is None:
+            return None
+        last_row = len(klines) - 1
+        if _finished in klines.columns and not klines[_finished].iat[last_row]:
+            return None
+        i = self._precomputed_index.get(klines[_datetime].iat[last_row])
+        if i is None or self._precomputed[_close][i] != klines[_close].iat[last_row]:
+            return None
+        return i
+
+    def precomputed_signal(self, klines: DataFrame) -> int | None:
+        """
+        从预计算结果读取当前K线的信号, 状态更新与true_signal一致
+        @return 不能使用预计算结果时返回None
+        """
+        last_time = klines[_datetime].iat[-1]
+        if self.datetime == last_time:
+            return self.current_kline_status
+
+        i = self._precomputed_row(klines)
+        if i is None:
+            return None
+
+        table = self._precomputed
+        if len(klines) < self.period + 2:
+            self.current_kline_status = 0
+        else:
+            last_valid_signal = int(table['last_valid_signal'][i]) if self.datetime is None else None
+            self.current_kline_status = self._update_current_signal(int(table[_signal][i]), last_valid_signal)
+        self.current_alpha_trend = table[_alpha_trend][i]
+
+        if len(klines) >= max(self.macd_fast_period, self.macd_slow_period, self.macd_signal_period) + 2:
+            self._update_macd(MACDValue(table[_macd][i], table[_macd_signal][i], table[_macd_hist][i]))
+
+        self.datetime = last_time
+
+        return self.current_kline_status
+
+    def alpha_trend_history(self, klines: DataFrame) -> pd.Series:
+        """klines每根K线的alpha_trend值"""
+        if self._precomputed_index is not None:
+            rows = [self._precomputed_index.get(dt) for dt in klines[_datetime].to_numpy()]
+            if all(i is not None for i in rows):
+                return pd.Series(self._precomputed[_alpha_trend][rows], index=klines.index)
+        return pd.Series(self._alpha_trend_result(klines).alpha_trend, index=klines.index)
 
     def golden_cross(self) -> bool:
         """Check if MACD line crosses above the signal line (bullish crossover)"""
@@ -159,19 +359,20 @@ class AlphaTrendSignal(Signal):
         if self.datetime == last_time:
             return self.current_kline_status
 
-        df = _alpha_trend_indicator(klines, self.atr_multiple, self.period)        
-        self.current_kline_status = self._compute_signal(df, self.datetime is None)
-        self.current_alpha_trend = df[_alpha_trend].iloc[-1] if len(df[_alpha_trend]) > 0 else 0
+        result = self._alpha_trend_result(klines)
+        self.current_kline_status = self._compute_signal(result, self.datetime is None)
+        self.current_alpha_trend = result.alpha_trend[-1] if len(result.alpha_trend) > 0 else 0
 
-        df = _macd_indicator(df, self.macd_fast_period, self.macd_slow_period, self.macd_signal_period)
-        self._macd_signal(df)
+        self._macd_signal(self._macd_result(klines))
 
         self.datetime = last_time
 
         return self.current_kline_status
 
     def run(self, klines: DataFrame) -> int:
-        signal = self.true_signal(klines)
+        signal = self.precomputed_signal(klines) if self._precomputed is not None else None
+        if signal is None:
+            signal = self.incremental_signal(klines) if self.incremental else self.true_signal(klines)
 
         # Apply reversal if enabled
         if self.reverse:
@@ -1,11 +1,11 @@
 import os
 import secrets
-from typing import Optional, Dict
+from typing import List, Optional, Dict
 from pydantic import BaseModel
 from pandas import DataFrame
 
 from strategy import MultiTimeframeStrategy
-from strategy.alpha_trend_signal.alpha_trend_signal import AlphaTrendSignal, _alpha_trend
+from strategy.alpha_trend_signal.alpha_trend_signal import AlphaTrendSignal
 from client.ex_client import ExSwapClient
 from model import OrderSide, PositionSide, PlaceOrderBehavior, Symbol, OrderStatus
 from utils.json_util import dump_file, loads
@@ -82,6 +82,9 @@ class AlphaTrendStrategy(MultiTimeframeStrategy):
         logger.info(f"AlphaTrendStrategy initialized for {config.symbol.binance()} with timeframes: {self.config.timeframes}")
 
 
+    def signals_by_timeframe(self) -> Dict[str, List[AlphaTrendSignal]]:
+        return {timeframe: [signal] for timeframe, signal in self.signals.items()}
+
     def is_default_timeframe(self, timeframe: str) -> bool:
         """Check if the timeframe is the default timeframe"""
         return timeframe == self.config.timeframes[0]
@@ -124,7 +127,8 @@ class AlphaTrendStrategy(MultiTimeframeStrategy):
             max_price = fixed_stop_loss_price
 
         # Get alpha_trend values and filter those within the range
-        alpha_trend_values = df[_alpha_trend].dropna()
+        main_timeframe = self.config.timeframes[0]
+        alpha_trend_values = self.signals[main_timeframe].alpha_trend_history(df).dropna()
         valid_alpha_trend = alpha_trend_values[(alpha_trend_values >= min_price) & (alpha_trend_values <= max_price)]
 
         if valid_alpha_trend.empty:
@@ -1,11 +1,12 @@
-import json
 from client.ex_client import ExSwapClient
-from model import Kline
-from strategy import SingleTimeframeStrategy
+from model import Kline, Symbol
+from strategy import SingleTimeframeStrategy, Signal
+from strategy.market_data_store import MarketDataStore
 from strategy.grids_strategy_v2 import SignalGridStrategy, SignalGridStrategyConfig
 import log
 from pydantic import BaseModel
-from typing import Literal
+from typing import Dict, List, Literal
+from utils.json_util import dump_file
 
 logger = log.getLogger(__name__)
 
@@ -47,6 +48,29 @@ class BidirectionalGridRotationStrategy(SingleTimeframeStrategy):
         if max_order_diff > 0:
             self.running_strategy.config.max_order -= max_order_diff
 
+    def use_market_data_store(self, store: MarketDataStore):
+        # 行情由内部的多空两个策略维护, 两者共享同一份数据
+        self.long_strategy.use_market_data_store(store)
+        self.short_strategy.use_market_data_store(store)
+
+    def release_market_data(self):
+        self.long_strategy.release_market_data()
+        self.short_strategy.release_market_data()
+
+    def signals_by_timeframe(self) -> Dict[str, List[Signal]]:
+        """多空两个子策略使用的信号, 两个子策略共用同一个信号对象时只计算一次"""
+        merged: Dict[str, List[Signal]] = {}
+        for strategy in (self.long_strategy, self.short_strategy):
+            for timeframe, signals in strategy.signals_by_timeframe().items():
+                timeframe_signals = merged.setdefault(timeframe, [])
+                timeframe_signals.extend(signal for signal in signals
+                                         if not any(signal is existing for existing in timeframe_signals))
+        return merged
+
+    def warm_up(self, symbol: Symbol, timeframe: str):
+        self.long_strategy.warm_up(symbol, timeframe)
+        self.short_strategy.warm_up(symbol, timeframe)
+
     def run_strategy(self, kline: Kline):
         self.long_strategy.run(kline)
         self.short_strategy.run(kline)
@@ -55,8 +79,7 @@ class BidirectionalGridRotationStrategy(SingleTimeframeStrategy):
         if self.is_order_full(self.running_strategy):
             self.rotation()
             logger.info(f"Rotation to {self.running_strategy.config.position_side}-{self.running_strategy.config.master_side.value}")
-            with open(self.config.config_backup_path, "w") as f:
-                json.dump({"current_strategy": self.running_strategy.config.position_side}, f)
+            dump_file({"current_strategy": self.running_strategy.config.position_side}, self.config.config_backup_path)
         
         self.run_strategy(kline)
 
@@ -3,12 +3,13 @@ import secrets
 import threading
 from typing import Any, List, Callable, Dict
 from client.ex_client import ExSwapClient
-from strategy import SingleTimeframeStrategy
+from strategy import IntraBarPolicy, SingleTimeframeStrategy
 from model import OrderSide, OrderStatus, PlaceOrderBehavior, PositionSide
 import logging
 from pydantic import BaseModel, ConfigDict
 from model import Symbol
 from strategy import Signal
+from utils.json_util import dumpb
 
 logger = logging.getLogger(__name__)
 
@@ -102,8 +103,8 @@ class OrderRecorder(BaseModel):
             refresh_orders = True
 
         if refresh_orders and self.order_file_path:
-            with open(self.order_file_path, 'w') as f:
-                f.write(self.model_dump_json())
+            with open(self.order_file_path, 'wb') as f:
+                f.write(dumpb(self))
 
     def check_reload(self, force: bool = False) -> List[Order] | None:
         '''
@@ -215,6 +216,8 @@ class SignalGridStrategyConfig(BaseModel):
     enable_trailing_stop: bool = False
     trailing_stop_rate: float = 0.02
     trailing_stop_activation_profit_rate: float = 0.01
+    # K线内的评估频率, 默认每次K线更新都检查限价止盈订单; on_level_touch时只在价格穿过挂单价格时查询
+    intra_bar_policy: IntraBarPolicy = IntraBarPolicy()
 
 class SignalGridStrategy(SingleTimeframeStrategy):
 
@@ -222,6 +225,7 @@ class SignalGridStrategy(SingleTimeframeStrategy):
         super().__init__(config.timeframe)
         self.config = config
         self.ex_client = ex_client
+        self.intra_bar_policy = config.intra_bar_policy
 
         self.order_manager = OrderManager(order_file_path=self.config.order_file_path)
         self.order_manager.load_orders(True)
@@ -233,6 +237,21 @@ class SignalGridStrategy(SingleTimeframeStrategy):
     def exchange_client(self) -> ExSwapClient:
         return self.ex_client
 
+    def relevant_price_levels(self, timeframe: str) -> List[float]:
+        """限价止盈订单的价格, 以及等待成交的入场订单价格"""
+        if not (self.config.fixed_rate_take_profit and self.config.take_profit_use_limit_order):
+            return []
+        levels = []
+        for order in self.order_manager.orders:
+            if order.exit_id and order.exit_price:
+                levels.append(order.exit_price)
+            elif OrderStatus.is_open(order.status):
+                levels.append(order.price)
+        return levels
+
+    def signals_by_timeframe(self) -> Dict[str, List[Signal]]:
+        return {self.timeframe: [self.config.signal]} if self.config.signal is not None else {}
+
     def place_order(self, order_id: str, side: OrderSide, qty: float, price: float, first_price: float | None = None):
         if self.config.position_reverse:
             position_side = PositionSide.SHORT if self.config.position_side == PositionSide.LONG else PositionSide.LONG
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from pandas import DataFrame
+
+from metrics import metrics
+
+
+def frame_key(klines: DataFrame) -> Optional[Tuple]:
+    """
+    K线DataFrame的缓存键: (symbol, timeframe, 首根K线时间, 末根K线时间, K线数量, 末根K线OHLCV)
+    指标是路径相关的递推, 窗口不同结果不同, 因此包含窗口的起点和长度; 未完成K线会原地更新, 因此包含末根K线的行情
+    没有symbol/timeframe信息(attrs)的DataFrame返回None, 不使用缓存
+    """
+    symbol = klines.attrs.get('symbol')
+    timeframe = klines.attrs.get('timeframe')
+    if symbol is None or timeframe is None or len(klines) == 0:
+        return None
+    last = len(klines) - 1
+    return (symbol, timeframe, klines['datetime'].iat[0], klines['datetime'].iat[last], len(klines),
+            klines['open'].iat[last], klines['high'].iat[last], klines['low'].iat[last],
+            klines['close'].iat[last], klines['volume'].iat[last])
+
+
+class IndicatorCache:
+    """
+    进程内的指标结果缓存, LRU淘汰
+    同一根K线上参数相同的指标无论被多少个信号或策略使用都只计算一次
+    @param maxsize 缓存的结果数量上限
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        返回缓存的结果, 不存在时调用compute计算并缓存
+        计算在锁外进行, 并发的相同请求可能各自计算一次, 结果相同
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                metrics.inc('indicator_cache.hit')
+                return self._entries[key]
+        metrics.inc('indicator_cache.miss')
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                metrics.inc('indicator_cache.evicted')
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+indicator_cache = IndicatorCache()
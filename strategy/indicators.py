@@ -0,0 +1,227 @@
+"""
+增量指标
+每根K线只做O(1)的状态更新, 计算结果与TA-Lib的批量计算一致(相同的起始位置和初始化方式)
+- update(...) 用已完成K线更新状态并返回当前值
+- peek(...) 计算加入一根未完成K线后的值, 不改变状态
+指标尚未完成预热时返回NaN
+"""
+import math
+from collections import deque
+from typing import Deque, NamedTuple, Tuple
+
+NAN = float('nan')
+
+
+class EMA:
+    """指数移动平均, 与TA-Lib一致使用前period个值的简单平均作为初始值"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.count: int = 0
+        self._seed_sum: float = 0.0
+        self.value: float = NAN
+
+    def update(self, x: float) -> float:
+        self.value = self.peek(x)
+        self.count += 1
+        if self.count < self.period:
+            self._seed_sum += x
+        return self.value
+
+    def peek(self, x: float) -> float:
+        if self.count + 1 < self.period:
+            return NAN
+        if self.count + 1 == self.period:
+            return (self._seed_sum + x) / self.period
+        return (x - self.value) * self.k + self.value
+
+
+class WilderATR:
+    """Wilder平均真实波幅, 第一个值为前period个真实波幅的简单平均"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.prev_close: float = NAN
+        self.count: int = 0
+        self._tr_sum: float = 0.0
+        self.value: float = NAN
+
+    def _true_range(self, high: float, low: float) -> float:
+        return max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+
+    def update(self, high: float, low: float, close: float) -> float:
+        if self.count > 0:
+            tr = self._true_range(high, low)
+            if self.count < self.period:
+                self._tr_sum += tr
+            self.value = self._next(tr)
+        self.count += 1
+        self.prev_close = close
+        return self.value
+
+    def peek(self, high: float, low: float, close: float) -> float:
+        if self.count == 0:
+            return NAN
+        return self._next(self._true_range(high, low))
+
+    def _next(self, tr: float) -> float:
+        # count为已处理的K线数, 第一根K线没有真实波幅
+        if self.count < self.period:
+            return NAN
+        if self.count == self.period:
+            return (self._tr_sum + tr) / self.period
+        return (self.value * (self.period - 1) + tr) / self.period
+
+
+class MFI:
+    """资金流量指标, 滑动窗口内的正负资金流之和"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.prev_tp: float = NAN
+        self._flows: Deque[Tuple[float, float]] = deque()
+        self._pos_sum: float = 0.0
+        self._neg_sum: float = 0.0
+        self.value: float = NAN
+
+    def _flow(self, high: float, low: float, close: float, volume: float) -> Tuple[float, float, float]:
+        tp = (high + low + close) / 3
+        money_flow = tp * volume
+        if tp > self.prev_tp:
+            return tp, money_flow, 0.0
+        if tp < self.prev_tp:
+            return tp, 0.0, money_flow
+        return tp, 0.0, 0.0
+
+    def _value(self, pos_sum: float, neg_sum: float) -> float:
+        total = pos_sum + neg_sum
+        if total < 1.0:
+            return 0.0
+        return 100.0 * (pos_sum / total)
+
+    def update(self, high: float, low: float, close: float, volume: float) -> float:
+        tp, pos, neg = self._flow(high, low, close, volume)
+        if not math.isnan(self.prev_tp):
+            self._flows.append((pos, neg))
+            self._pos_sum += pos
+            self._neg_sum += neg
+            if len(self._flows) > self.period:
+                old_pos, old_neg = self._flows.popleft()
+                self._pos_sum -= old_pos
+                self._neg_sum -= old_neg
+            if len(self._flows) == self.period:
+                self.value = self._value(self._pos_sum, self._neg_sum)
+        self.prev_tp = tp
+        return self.value
+
+    def peek(self, high: float, low: float, close: float, volume: float) -> float:
+        if math.isnan(self.prev_tp) or len(self._flows) + 1 < self.period:
+            return NAN
+        _, pos, neg = self._flow(high, low, close, volume)
+        pos_sum, neg_sum = self._pos_sum + pos, self._neg_sum + neg
+        if len(self._flows) == self.period:
+            old_pos, old_neg = self._flows[0]
+            pos_sum -= old_pos
+            neg_sum -= old_neg
+        return self._value(pos_sum, neg_sum)
+
+
+class MACDValue(NamedTuple):
+    macd: float
+    signal: float
+    hist: float
+
+
+class MACD:
+    """
+    MACD, 与TA-Lib一致:
+    快线EMA从第slow-fast根K线开始计算, 使快慢线在第slow-1根K线同时完成初始化;
+    三个输出都从信号线完成初始化(第slow+signal-2根K线)开始有值
+    """
+
+    def __init__(self, fast_period: int = 12, slow_period: int = 26, signal_period: int = 9):
+        if slow_period < fast_period:
+            fast_period, slow_period = slow_period, fast_period
+        self.fast = EMA(fast_period)
+        self.slow = EMA(slow_period)
+        self.signal = EMA(signal_period)
+        self._fast_offset = slow_period - fast_period
+        self.count: int = 0
+        self.value: MACDValue = MACDValue(NAN, NAN, NAN)
+
+    def update(self, close: float) -> MACDValue:
+        fast = self.fast.update(close) if self.count >= self._fast_offset else NAN
+        slow = self.slow.update(close)
+        self.count += 1
+        if math.isnan(slow):
+            return self.value
+        macd = fast - slow
+        signal = self.signal.update(macd)
+        self.value = MACDValue(NAN, NAN, NAN) if math.isnan(signal) else MACDValue(macd, signal, macd - signal)
+        return self.value
+
+    def peek(self, close: float) -> MACDValue:
+        fast = self.fast.peek(close) if self.count >= self._fast_offset else NAN
+        slow = self.slow.peek(close)
+        if math.isnan(slow):
+            return MACDValue(NAN, NAN, NAN)
+        macd = fast - slow
+        signal = self.signal.peek(macd)
+        return MACDValue(NAN, NAN, NAN) if math.isnan(signal) else MACDValue(macd, signal, macd - signal)
+
+
+class AlphaTrendValue(NamedTuple):
+    alpha_trend: float
+    # 1: alpha_trend高于两根K线前, -1: 低于两根K线前, 0: 无信号
+    signal: int
+
+
+class AlphaTrend:
+    """
+    AlphaTrend: 以ATR为带宽、MFI决定方向的跟踪线
+    MFI>=50时取 max(前值, low - ATR*multiple), 否则取 min(前值, high + ATR*multiple)
+    """
+
+    def __init__(self, atr_multiple: float = 1.0, period: int = 8):
+        self.atr_multiple = atr_multiple
+        self.period = period
+        self.atr = WilderATR(period)
+        self.mfi = MFI(period)
+        # 最近三根已完成K线的alpha_trend值, 用于与两根K线前比较
+        self._history: Deque[float] = deque([NAN, NAN, NAN], maxlen=3)
+        self.count: int = 0
+        self.value: AlphaTrendValue = AlphaTrendValue(NAN, 0)
+
+    def _next(self, atr: float, mfi: float, high: float, low: float, prev: float) -> float:
+        if math.isnan(atr) or math.isnan(mfi):
+            return NAN
+        if mfi >= 50:
+            base = low - atr * self.atr_multiple
+            return base if math.isnan(prev) else max(prev, base)
+        base = high + atr * self.atr_multiple
+        return base if math.isnan(prev) else min(prev, base)
+
+    @staticmethod
+    def _signal(current: float, two_bars_ago: float) -> int:
+        # NaN比较结果为False, 与批量计算一致; 同时满足时卖出信号优先
+        if current < two_bars_ago:
+            return -1
+        if current > two_bars_ago:
+            return 1
+        return 0
+
+    def update(self, high: float, low: float, close: float, volume: float) -> AlphaTrendValue:
+        atr = self.atr.update(high, low, close)
+        mfi = self.mfi.update(high, low, close, volume)
+        alpha_trend = self._next(atr, mfi, high, low, self._history[-1])
+        self._history.append(alpha_trend)
+        self.count += 1
+        self.value = AlphaTrendValue(alpha_trend, self._signal(alpha_trend, self._history[0]))
+        return self.value
+
+    def peek(self, high: float, low: float, close: float, volume: float) -> AlphaTrendValue:
+        atr = self.atr.peek(high, low, close)
+        mfi = self.mfi.peek(high, low, close, volume)
+        alpha_trend = self._next(atr, mfi, high, low, self._history[-1])
+        return AlphaTrendValue(alpha_trend, self._signal(alpha_trend, self._history[1]))
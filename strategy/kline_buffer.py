@@ -0,0 +1,255 @@
+import threading
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+from pandas import DataFrame
+
+from model import Kline, KlineBatch
+
+# DataFrame列顺序, 与Kline.to_dict保持一致
+FRAME_COLUMNS = ('datetime', 'open', 'high', 'low', 'close', 'volume', 'finished')
+
+_DTYPES: Dict[str, type] = {
+    'timestamp': np.int64,
+    'datetime': object,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64,
+    'finished': np.bool_,
+}
+
+
+class KlineBuffer:
+    """
+    预分配的列式K线缓冲区
+    - 每列一个NumPy数组, 追加和更新最后一根K线均为O(1), 容量不足时按倍数扩容(均摊O(1))
+    - column()返回只读的零拷贝视图, 供指标直接计算
+    - to_frame()在策略需要时才构建DataFrame, 数据未变化时复用同一个DataFrame; 多个策略共享同一个缓冲区时
+      各自通过KlineFrameView持有自己的DataFrame
+    - 构建的DataFrame的attrs中带有symbol和timeframe, 供指标缓存识别数据来源
+    - 写入时只保存时间戳, datetime字符串在构建DataFrame时才为新K线格式化, 每根K线只格式化一次
+    - 设置maxlen后只保留最近maxlen根K线: 窗口起点随追加前移, 写到数组末尾时才整体搬回头部,
+      容量至少为2倍maxlen, 搬移的开销均摊到每根K线为O(1)
+    @param capacity 初始容量
+    @param maxlen 保留的K线数量上限, None表示不限制
+    """
+
+    def __init__(self, capacity: int = 1024, maxlen: Optional[int] = None):
+        self._capacity = max(capacity, 1)
+        self._columns: Dict[str, np.ndarray] = {name: np.empty(self._capacity, dtype=dtype)
+                                                for name, dtype in _DTYPES.items()}
+        self._start: int = 0
+        self._end: int = 0
+        # [_start, _formatted)内的K线已格式化datetime
+        self._formatted: int = 0
+        # 追加/淘汰K线时递增, 需要重建DataFrame
+        self.version: int = 0
+        # 任意写入时递增, 只更新了最后一根K线时修补DataFrame即可
+        self.revision: int = 0
+        self.lock = threading.RLock()
+        self.maxlen: Optional[int] = None
+        self.set_maxlen(maxlen)
+        # 写入的第一根K线的symbol和timeframe
+        self.symbol: Optional[str] = None
+        self.timeframe: Optional[str] = None
+        self._default_view = KlineFrameView(self)
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def set_maxlen(self, maxlen: Optional[int]) -> None:
+        if maxlen is not None and maxlen < 1:
+            raise ValueError(f"maxlen must be positive, got {maxlen}")
+        self.maxlen = maxlen
+        if maxlen is None:
+            return
+        with self.lock:
+            if self._capacity < 2 * maxlen:
+                self._resize(2 * maxlen)
+            self._trim()
+
+    def last_timestamp(self) -> Optional[int]:
+        if self._end == self._start:
+            return None
+        return int(self._columns['timestamp'][self._end - 1])
+
+    def column(self, name: str) -> np.ndarray:
+        """指定列的只读视图, 缓冲区扩容后旧视图不再随之更新"""
+        if name == 'datetime':
+            with self.lock:
+                self._format_datetimes()
+        view = self._columns[name][self._start:self._end]
+        view.flags.writeable = False
+        return view
+
+    def upsert(self, kline: Kline) -> bool:
+        """
+        写入一根K线: 与最后一根K线时间相同时原地更新, 否则追加
+        @return 是否追加了新K线
+        """
+        with self.lock:
+            self._set_source(kline)
+            self.revision += 1
+            if self._end > self._start and self._columns['timestamp'][self._end - 1] == kline.timestamp:
+                self._write(self._end - 1, kline)
+                return False
+
+            if self._end == self._capacity:
+                self._make_room(1)
+            self._write(self._end, kline)
+            self._end += 1
+            self._trim()
+            self.version += 1
+            return True
+
+    def extend(self, klines: Iterable[Kline] | KlineBatch) -> None:
+        """批量追加K线, 如初始化时加载的历史数据; KlineBatch按列整体复制"""
+        if isinstance(klines, KlineBatch):
+            self._extend_batch(klines)
+            return
+        klines = list(klines)
+        if self.maxlen is not None:
+            klines = klines[-self.maxlen:]
+        if not klines:
+            return
+        with self.lock:
+            self._set_source(klines[0])
+            if self._end + len(klines) > self._capacity:
+                self._make_room(len(klines))
+            end = self._end + len(klines)
+            columns = self._columns
+            columns['timestamp'][self._end:end] = [k.timestamp for k in klines]
+            columns['open'][self._end:end] = [k.open for k in klines]
+            columns['high'][self._end:end] = [k.high for k in klines]
+            columns['low'][self._end:end] = [k.low for k in klines]
+            columns['close'][self._end:end] = [k.close for k in klines]
+            columns['volume'][self._end:end] = [k.volume for k in klines]
+            columns['finished'][self._end:end] = [k.finished for k in klines]
+            self._end = end
+            self._trim()
+            self.version += 1
+            self.revision += 1
+
+    def _extend_batch(self, batch: KlineBatch) -> None:
+        if self.maxlen is not None:
+            batch = batch[-self.maxlen:]
+        n = len(batch)
+        if n == 0:
+            return
+        with self.lock:
+            self._set_source(batch[0])
+            if self._end + n > self._capacity:
+                self._make_room(n)
+            end = self._end + n
+            columns = self._columns
+            columns['timestamp'][self._end:end] = batch.timestamp
+            columns['open'][self._end:end] = batch.open
+            columns['high'][self._end:end] = batch.high
+            columns['low'][self._end:end] = batch.low
+            columns['close'][self._end:end] = batch.close
+            columns['volume'][self._end:end] = batch.volume
+            columns['finished'][self._end:end] = True
+            self._end = end
+            self._trim()
+            self.version += 1
+            self.revision += 1
+
+    def to_frame(self) -> DataFrame:
+        """当前K线的DataFrame, 只在数据变化后首次调用时重新构建"""
+        return self._default_view.to_frame()
+
+    def _build_frame(self) -> DataFrame:
+        self._format_datetimes()
+        frame = DataFrame({name: self._columns[name][self._start:self._end] for name in FRAME_COLUMNS})
+        if self.symbol is not None:
+            frame.attrs['symbol'] = self.symbol
+            frame.attrs['timeframe'] = self.timeframe
+        return frame
+
+    def _set_source(self, kline: Kline) -> None:
+        if self.symbol is None:
+            self.symbol = kline.symbol.binance()
+            self.timeframe = kline.timeframe
+
+    def _format_datetimes(self) -> None:
+        """为尚未格式化的K线生成datetime字符串; 原地更新的K线时间戳不变, 已格式化的值仍然有效"""
+        start = max(self._start, self._formatted)
+        if start < self._end:
+            self._columns['datetime'][start:self._end] = [
+                Kline.format_datetime(ts) for ts in self._columns['timestamp'][start:self._end].tolist()]
+        self._formatted = self._end
+
+    def _last_row(self) -> tuple:
+        self._format_datetimes()
+        index = self._end - 1
+        return tuple(self._columns[name][index] for name in FRAME_COLUMNS)
+
+    def _write(self, index: int, kline: Kline) -> None:
+        columns = self._columns
+        columns['timestamp'][index] = kline.timestamp
+        columns['open'][index] = kline.open
+        columns['high'][index] = kline.high
+        columns['low'][index] = kline.low
+        columns['close'][index] = kline.close
+        columns['volume'][index] = kline.volume
+        columns['finished'][index] = kline.finished
+
+    def _trim(self) -> None:
+        if self.maxlen is not None and len(self) > self.maxlen:
+            self._start = self._end - self.maxlen
+            self.version += 1
+
+    def _make_room(self, n: int) -> None:
+        size = len(self)
+        capacity = self._capacity
+        if self._start > 0 and size + n <= capacity:
+            # 窗口前面已经淘汰的位置足够, 搬回数组头部即可
+            self._resize(capacity)
+            return
+        while capacity < size + n:
+            capacity *= 2
+        self._resize(capacity)
+
+    def _resize(self, capacity: int) -> None:
+        size = len(self)
+        for name, array in self._columns.items():
+            new_array = np.empty(capacity, dtype=array.dtype)
+            new_array[:size] = array[self._start:self._end]
+            self._columns[name] = new_array
+        self._capacity = capacity
+        self._formatted = min(max(self._formatted - self._start, 0), size)
+        self._start = 0
+        self._end = size
+
+
+class KlineFrameView:
+    """
+    KlineBuffer上的DataFrame视图
+    K线追加/淘汰后重建DataFrame; 只更新了最后一根K线时原地修补行情列, 不必重建整个DataFrame
+    """
+
+    def __init__(self, buffer: KlineBuffer):
+        self.buffer = buffer
+        self._frame: Optional[DataFrame] = None
+        self._version: int = -1
+        self._revision: int = -1
+
+    def to_frame(self) -> DataFrame:
+        buffer = self.buffer
+        with buffer.lock:
+            if self._frame is None or self._version != buffer.version:
+                self._frame = buffer._build_frame()
+            elif self._revision != buffer.revision and len(self._frame) > 0:
+                frame = self._frame
+                row = len(frame) - 1
+                for name, value in zip(FRAME_COLUMNS, buffer._last_row()):
+                    frame.iat[row, frame.columns.get_loc(name)] = value
+            self._version = buffer.version
+            self._revision = buffer.revision
+            return self._frame
@@ -0,0 +1,120 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import log
+from model import Kline, Symbol
+from strategy.kline_buffer import KlineBuffer
+
+logger = log.getLogger(__name__)
+
+SeriesKey = Tuple[str, str]
+
+
+def series_key(symbol: Symbol, timeframe: str) -> SeriesKey:
+    return symbol.binance(), timeframe
+
+
+class MarketSeries:
+    """某个(symbol, timeframe)的共享K线序列"""
+
+    def __init__(self, symbol: Symbol, timeframe: str, maxlen: Optional[int]):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.buffer = KlineBuffer(maxlen=maxlen)
+        self.refcount: int = 0
+        self.initialized: bool = False
+        self.last_kline: Optional[Kline] = None
+        # 已写入K线的最大投递序号
+        self.last_seq: int = 0
+        # 保证历史数据只加载一次
+        self.init_lock = threading.Lock()
+
+
+class MarketDataStore:
+    """
+    进程内共享的行情存储, 按(symbol, timeframe)保存一份K线缓冲区
+    - 订阅同一stream的多个策略共享同一份数据, 历史K线只加载一次
+    - 同一帧K线无论由多少个策略提交都只写入一次, 已经写入更新数据后到达的旧K线会被忽略
+    - 多个策略在不同lane上写入同一序列, 按投递序号判断新旧, 落后的lane不会用旧的未完成更新覆盖新数据
+    - 引用计数归零时释放序列
+    """
+
+    def __init__(self):
+        self._series: Dict[SeriesKey, MarketSeries] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, symbol: Symbol, timeframe: str, maxlen: Optional[int] = None) -> MarketSeries:
+        """
+        获取并引用序列, 不存在时创建
+        @param maxlen 调用方需要保留的K线数量, 共享序列取所有调用方中最大的, None表示不限制
+        """
+        key = series_key(symbol, timeframe)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = MarketSeries(symbol, timeframe, maxlen)
+                self._series[key] = series
+            elif series.buffer.maxlen is not None and (maxlen is None or maxlen > series.buffer.maxlen):
+                series.buffer.set_maxlen(maxlen)
+            series.refcount += 1
+            return series
+
+    def release(self, symbol: Symbol, timeframe: str) -> None:
+        key = series_key(symbol, timeframe)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                return
+            series.refcount -= 1
+            if series.refcount <= 0:
+                del self._series[key]
+                logger.info(f"Released market data {key}")
+
+    def get(self, symbol: Symbol, timeframe: str) -> Optional[MarketSeries]:
+        with self._lock:
+            return self._series.get(series_key(symbol, timeframe))
+
+    def keys(self) -> List[SeriesKey]:
+        with self._lock:
+            return list(self._series.keys())
+
+    def initialize(self, series: MarketSeries, fetch: Callable[[], List[Kline]]) -> None:
+        """加载历史K线, 多个策略同时初始化时只有第一个会请求交易所"""
+        if series.initialized:
+            return
+        with series.init_lock:
+            if series.initialized:
+                return
+            # 策略总是先初始化再写入实时K线, 此时缓冲区为空
+            series.buffer.extend(fetch())
+            series.initialized = True
+
+    def update(self, kline: Kline) -> bool:
+        """
+        写入一帧K线
+        @return 是否写入, 重复或过期的K线返回False
+        """
+        series = self.get(kline.symbol, kline.timeframe)
+        if series is None:
+            return False
+        buffer = series.buffer
+        with buffer.lock:
+            last = series.last_kline
+            if last is kline:
+                return False
+            if kline.seq and kline.seq <= series.last_seq:
+                # 晚于更新数据到达的旧K线
+                return False
+            last_timestamp = buffer.last_timestamp()
+            if last_timestamp is not None and kline.timestamp < last_timestamp:
+                return False
+            if last is not None and kline.timestamp == last.timestamp and last.finished:
+                # 已完成K线之后到达的同一根K线(重复或过期的未完成更新)
+                return False
+            buffer.upsert(kline)
+            series.last_kline = kline
+            series.last_seq = max(series.last_seq, kline.seq)
+            return True
+
+
+market_data_store = MarketDataStore()
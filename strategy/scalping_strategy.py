@@ -88,6 +88,9 @@ class ScalpingStrategy(SingleTimeframeStrategy):
 
         logger.info(f"ScalpingStrategy initialized for {config.symbol.binance()}")
 
+    def signals_by_timeframe(self) -> Dict[str, List[AlphaTrendSignal]]:
+        return {self.timeframe: [self.long_signal, self.short_signal]}
+
     def _generate_order_id(self, side: OrderSide) -> str:
         """Generate unique order ID"""
         return f"{side.value}{secrets.token_hex(nbytes=5)}"
@@ -6,11 +6,12 @@ from typing import List
 from datetime import datetime
 
 from pydantic import BaseModel
-from strategy import SingleTimeframeStrategy
+from strategy import IntraBarPolicy, SingleTimeframeStrategy
 from client.ex_client import ExSwapClient, ExClient
 from model import PlaceOrderBehavior, PositionSide, Symbol, OrderSide, OrderStatus
 import log
 from config import DATA_PATH
+from utils.json_util import dumpb
 import builtins
 
 logger = log.getLogger(__name__)
@@ -185,6 +186,8 @@ class SimpleGridStrategyConfig(BaseModel):
     - 为True时订单延迟加载
     - 为False时订单立即加载, 可以搭配initial_quota使用
     - initial_quota 表示已有持仓数量, 默认为0, 立即加载时会减去该数量, 避免重复开仓、仓位膨胀
+    intra_bar_policy K线内的评估频率, 默认每次K线更新都运行策略(查询订单并保存状态)
+    - on_level_touch 价格穿过未成交挂单价格时才运行, 新网格的下单延后到K线完成
     '''
     symbol: Symbol
     upper_price: float
@@ -197,6 +200,7 @@ class SimpleGridStrategyConfig(BaseModel):
     delay_pending_order: bool = False
     initial_quota: float = 0
     backup_file: str = ""
+    intra_bar_policy: IntraBarPolicy = IntraBarPolicy()
 
 
 class SimpleGridStrategy(SingleTimeframeStrategy):
@@ -206,6 +210,7 @@ class SimpleGridStrategy(SingleTimeframeStrategy):
         self.ex_client = ex_client
         self.grids: List[OrderPair] = []
         self.lock = threading.Lock()
+        self.intra_bar_policy = self.config.intra_bar_policy
         if self.config.backup_file:
             self.backup_file = self.config.backup_file
         else:
@@ -230,10 +235,9 @@ class SimpleGridStrategy(SingleTimeframeStrategy):
     def save_state(self):
         """将当前状态保存到备份文件"""
         try:
-            with open(self.backup_file, 'w') as f:
+            with open(self.backup_file, 'wb') as f:
                 data = OrderPairListModel(items=self.grids)
-                json_str = data.model_dump_json(indent=2)
-                f.write(json_str)
+                f.write(dumpb(data, indent=True))
                 # logger.info(f"保存 {len(self.grids)} 个网格到备份文件 {self.backup_file}")
         except Exception as e:
             logger.error(f"保存备份文件 {self.backup_file} 失败: {e}")
@@ -286,6 +290,16 @@ class SimpleGridStrategy(SingleTimeframeStrategy):
                 grid.cancel_orders(self.ex_client)
                 # logger.info(f"取消远离价格的网格 {index}: 当前价格 {current_price}, 网格范围 [{grid.entry_price}, {grid.exit_price}]")
 
+    def relevant_price_levels(self, timeframe: str) -> List[float]:
+        """未成交挂单的价格"""
+        levels = []
+        for grid in self.grids:
+            if grid.entry_order_id and not grid.entry_filled:
+                levels.append(grid.entry_price)
+            if grid.exit_order_id and not grid.exit_filled:
+                levels.append(grid.exit_price)
+        return levels
+
     def get_current_price(self) -> float:
         """获取当前市场价格"""
         return self.latest_kline_obj.close
@@ -1,22 +1,23 @@
-import json
 import log
-import re
 from typing import Any, Dict, List, Optional
-from data_event_loop import Task
-from model import Symbol, Kline
+from data_event_loop import KlineTask
+from model import Symbol, Kline, KlineBatch
 from strategy import MultiTimeframeStrategy
+from strategy.kline_buffer import KlineBuffer
 from backtest.backtest_client import BacktestClient
 
 logger = log.getLogger(__name__)
 
 
-class BacktestTask(Task):
+class BacktestTask(KlineTask):
     """
     回测任务，使用模拟客户端运行策略
+    @param precompute_signals 对完整历史一次性向量化计算策略信号, 回放时按当前K线查表, 不再每根K线重算全部指标
     """
 
     def __init__(self, symbol: Symbol, strategy: MultiTimeframeStrategy, backtest_client: BacktestClient,
-                 historical_data: Optional[Dict[str, List[Kline]]] = None):
+                 historical_data: Optional[Dict[str, List[Kline] | KlineBatch]] = None,
+                 precompute_signals: bool = False):
         super().__init__()
         self.name: str = 'BacktestTask'
         self.symbol: Symbol = symbol
@@ -36,41 +37,33 @@ class BacktestTask(Task):
                 else:
                     logger.warning(f"No historical data provided for timeframe {timeframe}")
 
-    def run(self, data: str) -> None:
-        """
-        处理回测数据
-        data是BacktestEventLoop构造的WebSocket格式消息
-        """
-        data_obj: Dict[str, Any] = json.loads(data)
-
-        kline_key: str = data_obj.get('stream', '')
-        is_kline: bool = '@kline_' in kline_key
-        kline: Dict[str, Any] | None = data_obj.get('data', {}).get('k', None)
+            if precompute_signals:
+                self.precompute_signals(historical_data)
 
-        if is_kline and kline:
-            match = re.match(r'(\w+)(usdt|usdc|btc)@kline_(\d+\w)', kline_key)
-            if not match:
-                raise ValueError(f'Invalid kline key: {kline_key}')
+    def precompute_signals(self, historical_data: Dict[str, List[Kline] | KlineBatch]) -> None:
+        for timeframe, signals in self.strategy.signals_by_timeframe().items():
+            klines = historical_data.get(timeframe)
+            if not klines:
+                continue
+            buffer = KlineBuffer(capacity=len(klines))
+            buffer.extend(klines)
+            df = buffer.to_frame()
+            for signal in signals:
+                if signal.precompute(df):
+                    logger.info(f"Precomputed {type(signal).__name__} on {len(klines)} {timeframe} klines")
 
-            kline_obj = Kline(
-                symbol=Symbol(base=match.group(1), quote=match.group(2)),
-                timeframe=match.group(3),
-                open=float(kline['o']),
-                high=float(kline['h']),
-                low=float(kline['l']),
-                close=float(kline['c']),
-                volume=float(kline['v']),
-                timestamp=int(kline['t']),
-                finished=kline.get('x', False)
-            )
+    def streams(self) -> List[str]:
+        return [self.symbol.binance_ws_sub_kline(timeframe) for timeframe in self.timeframes]
 
-            # 检查是否是当前任务关注的交易对和时间框架
-            if self.symbol.binance() == kline_obj.symbol.binance() and kline_obj.timeframe in self.timeframes:
-                try:
-                    self.strategy.run(kline_obj)
-                except Exception as e:
-                    logger.error(f"Error running strategy for kline {kline_obj.timestamp}: {e}")
-                    # 继续运行，不中断回测
+    def run_kline(self, kline: Kline) -> None:
+        """
+        处理回测K线
+        """
+        try:
+            self.strategy.run(kline)
+        except Exception as e:
+            logger.error(f"Error running strategy for kline {kline.timestamp}: {e}")
+            # 继续运行，不中断回测
 
     def get_results(self) -> Dict[str, Any]:
         """
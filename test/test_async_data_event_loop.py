@@ -0,0 +1,139 @@
+import asyncio
+import json
+from typing import List
+
+from async_data_event_loop import AsyncBinanceDataEventLoop, AsyncTask
+from data_event_loop import KlineTask
+from model import Kline, Symbol
+
+
+def _ws_message(stream: str, ts: int, close: float, finished: bool) -> str:
+    return json.dumps({
+        'stream': stream,
+        'data': {'e': 'kline', 'k': {
+            't': ts, 'o': '99.0', 'h': '101.0', 'l': '98.0', 'c': str(close), 'v': '10.0', 'x': finished,
+        }},
+    })
+
+
+class RecordingAsyncTask(AsyncTask):
+    def __init__(self, stream: str):
+        super().__init__()
+        self.name = 'RecordingAsyncTask'
+        self.stream = stream
+        self.closes: List[float] = []
+
+    def streams(self) -> List[str]:
+        return [self.stream]
+
+    async def run_kline(self, kline: Kline) -> None:
+        await asyncio.sleep(0)
+        self.closes.append(kline.close)
+
+
+class RecordingSyncTask(KlineTask):
+    def __init__(self, symbol: Symbol, timeframe: str):
+        super().__init__()
+        self.name = 'RecordingSyncTask'
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.klines: List[Kline] = []
+
+    def streams(self) -> List[str]:
+        return [self.symbol.binance_ws_sub_kline(self.timeframe)]
+
+    def run_kline(self, kline: Kline) -> None:
+        self.klines.append(kline)
+
+
+def test_async_and_adapted_sync_tasks_receive_klines():
+    loop = AsyncBinanceDataEventLoop()
+    async_task = RecordingAsyncTask('ethusdt@kline_5m')
+    sync_task = RecordingSyncTask(Symbol(base='eth', quote='usdt'), '5m')
+    other = RecordingAsyncTask('btcusdt@kline_5m')
+    loop.add_task(async_task)
+    loop.add_task(sync_task)
+    loop.add_task(other)
+
+    async def scenario():
+        loop.start_workers()
+        loop.handle_message(_ws_message('ethusdt@kline_5m', 1, 100.0, True))
+        await loop.join()
+        # 任务繁忙期间到达的未完成K线只保留最新一条
+        for close in (101.0, 102.0, 103.0):
+            loop.handle_message(_ws_message('ethusdt@kline_5m', 2, close, False))
+        loop.handle_message(_ws_message('ethusdt@kline_5m', 2, 104.0, True))
+        await loop.join()
+        await loop.stop_workers()
+
+    asyncio.run(scenario())
+
+    assert async_task.closes == [100.0, 104.0]
+    assert [k.close for k in sync_task.klines] == [100.0, 104.0]
+    assert other.closes == []
+    assert set(loop.subscribed_streams()) == {'ethusdt@kline_5m', 'btcusdt@kline_5m'}
+
+
+class FakeWebSocket:
+    """发送一条K线后一直保持连接, 直到被关闭"""
+
+    def __init__(self, message: str):
+        self.message = message
+        self.sent: List[str] = []
+        self.closed = False
+        self._closed_event = asyncio.Event()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def send(self, data: str) -> None:
+        self.sent.append(data)
+
+    async def close(self) -> None:
+        self.closed = True
+        self._closed_event.set()
+
+    def __aiter__(self):
+        return self._messages()
+
+    async def _messages(self):
+        yield self.message
+        await self._closed_event.wait()
+
+
+def test_stop_while_connected(monkeypatch):
+    import threading
+    import async_data_event_loop
+
+    sockets: List[FakeWebSocket] = []
+
+    def connect(*args, **kwargs):
+        sockets.append(FakeWebSocket(_ws_message('ethusdt@kline_5m', 1, 100.0, True)))
+        return sockets[-1]
+
+    monkeypatch.setattr(async_data_event_loop.websockets, 'connect', connect)
+    monkeypatch.setattr(async_data_event_loop, 'uvloop', None)
+    loop = AsyncBinanceDataEventLoop()
+    received = threading.Event()
+
+    class SignallingTask(RecordingAsyncTask):
+        async def run_kline(self, kline: Kline) -> None:
+            await super().run_kline(kline)
+            received.set()
+
+    task = SignallingTask('ethusdt@kline_5m')
+    loop.add_task(task)
+    thread = threading.Thread(target=loop.start, daemon=True)
+    thread.start()
+
+    assert received.wait(5)
+    loop.stop()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert len(sockets) == 1 and sockets[0].closed
+    assert task.closes == [100.0]
+    assert loop._worker_futures == []
@@ -169,3 +169,45 @@ class TestSymbolInfo:
         client = BacktestClient(symbol_infos={SYMBOL.binance(): custom})
         info = client.symbol_info(SYMBOL)
         assert info.tick_size == 0.1
+
+
+# ── Open order book ──────────────────────────────────────────────────────────
+
+class TestOpenOrderBook:
+    def _reference_fills(self, orders, kline):
+        """逐个扫描全部订单的原始实现"""
+        return [o.custom_id for o in orders if o.status == OrderStatus.OPEN and o.order_type == 'limit'
+                and ((o.side == OrderSide.BUY and kline.low <= o.price) or
+                     (o.side == OrderSide.SELL and kline.high >= o.price))]
+
+    def test_matches_full_scan(self):
+        import random
+        rng = random.Random(3)
+        client = _client()
+        live = {}
+        for step in range(300):
+            for _ in range(rng.randint(0, 4)):
+                order_id = f'o{len(client.orders)}'
+                side = rng.choice([OrderSide.BUY, OrderSide.SELL])
+                client.place_order_v2(order_id, SYMBOL, side, 0.01, price=round(rng.uniform(1900, 2100), 1),
+                                      position_side=PositionSide.LONG)
+                live[order_id] = client.orders[order_id]
+            for order_id in rng.sample(sorted(live), min(len(live), rng.randint(0, 2))):
+                client.cancel(order_id, SYMBOL)
+            low = rng.uniform(1900, 2050)
+            kline = _make_kline(low, low + rng.uniform(0, 50), low, TS_BASE + step)
+
+            expected = self._reference_fills(client.orders.values(), kline)
+            filled_before = len(client.order_history)
+            client.check_pending_orders(kline)
+            assert [o.custom_id for o in client.order_history[filled_before:]] == expected
+            live = {k: v for k, v in live.items() if v.status == OrderStatus.OPEN}
+        assert len(client._open_orders[SYMBOL.binance()]) == len(live)
+
+    def test_canceled_order_is_not_filled(self):
+        client = _client()
+        client.place_order_v2('b1', SYMBOL, OrderSide.BUY, 1.0, price=1990.0, position_side=PositionSide.LONG)
+        client.cancel('b1', SYMBOL)
+        client.check_pending_orders(_make_kline(low=1980.0, high=2010.0, close=2000.0))
+        assert client.orders['b1'].status == OrderStatus.CANCELED
+        assert client.order_history == []
@@ -0,0 +1,153 @@
+import pytest
+
+from backtest.backtest_client import BacktestClient
+
+from backtest.backtest_event_loop import BacktestEventLoop
+from backtest.multi_timeframe_backtest_event_loop import MultiTimeframeBacktestEventLoop
+from data_event_loop import KlineTask, Task
+from model import Kline, Symbol
+
+SYMBOL = Symbol(base='eth', quote='usdt')
+
+
+def _klines(timeframe: str, n: int, step_ms: int):
+    return [Kline(symbol=SYMBOL, timeframe=timeframe, open=100 + i, high=101 + i, low=99 + i, close=100.5 + i,
+                  volume=10 + i, timestamp=1_700_000_000_000 + i * step_ms, finished=True)
+            for i in range(n)]
+
+
+class RecordingTask(KlineTask):
+    def __init__(self, timeframes):
+        super().__init__()
+        self.timeframes = timeframes
+        self.klines = []
+
+    def streams(self):
+        return [SYMBOL.binance_ws_sub_kline(timeframe) for timeframe in self.timeframes]
+
+    def run_kline(self, kline: Kline) -> None:
+        self.klines.append(kline)
+
+
+class RawTask(Task):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def run(self, data: str):
+        self.messages.append(data)
+
+
+def _fields(klines):
+    return [(k.timeframe, k.timestamp, k.datetime, k.open, k.high, k.low, k.close, k.volume, k.finished)
+            for k in klines]
+
+
+@pytest.mark.parametrize('wire_compat', [False, True])
+def test_backtest_event_loop_dispatch(wire_compat):
+    klines = _klines('1m', 10, 60_000)
+    loop = BacktestEventLoop(klines, start_index=2, wire_compat=wire_compat)
+    task, other, raw = RecordingTask(['1m']), RecordingTask(['5m']), RawTask()
+    for t in (task, other, raw):
+        loop.add_task(t)
+    loop.start()
+
+    assert _fields(task.klines) == _fields(klines[2:])
+    # 直接投递时任务收到的就是历史数据中的Kline对象
+    assert all(a is b for a, b in zip(task.klines, klines[2:])) != wire_compat
+    assert other.klines == []
+    assert len(raw.messages) == 8
+
+
+@pytest.mark.parametrize('wire_compat', [False, True])
+def test_multi_timeframe_event_loop_dispatch(wire_compat):
+    historical_data = {'1m': _klines('1m', 10, 60_000), '5m': _klines('5m', 2, 300_000)}
+    loop = MultiTimeframeBacktestEventLoop(historical_data, start_index=0, wire_compat=wire_compat)
+    task = RecordingTask(['1m', '5m'])
+    loop.add_task(task)
+    loop.start()
+
+    # 按收盘时间投递, 5m K线在其区间内最后一根1m K线之后
+    expected = sorted(historical_data['1m'] + historical_data['5m'],
+                      key=lambda k: (k.timestamp + (300_000 if k.timeframe == '5m' else 60_000), k.timeframe == '5m'))
+    assert _fields(task.klines) == _fields(expected)
+    assert [k.timeframe for k in task.klines[:6]] == ['1m'] * 5 + ['5m']
+
+
+def test_multi_symbol_replay_streams_by_close_time():
+    other = Symbol(base='btc', quote='usdt')
+    btc = [Kline(symbol=other, timeframe='15m', open=1, high=2, low=0.5, close=1.5, volume=1,
+                 timestamp=1_700_000_000_000 + i * 900_000, finished=True) for i in range(4)]
+    historical_data = {('ETHUSDT', '5m'): _klines('5m', 12, 300_000), ('BTCUSDT', '15m'): btc}
+    loop = MultiTimeframeBacktestEventLoop(historical_data, start_index=0)
+    eth_task, btc_task = RecordingTask(['5m']), RecordingTask([])
+    btc_task.streams = lambda: [other.binance_ws_sub_kline('15m')]
+    for t in (eth_task, btc_task):
+        loop.add_task(t)
+
+    replayed = list(loop.replay())
+    assert loop.total_klines == len(replayed) == 16
+    assert [(k.symbol.binance(), k.timeframe) for k in replayed[:4]] == \
+        [('ETHUSDT', '5m')] * 3 + [('BTCUSDT', '15m')]
+    close_times = [k.timestamp + (900_000 if k.timeframe == '15m' else 300_000) for k in replayed]
+    assert close_times == sorted(close_times)
+
+    loop.start()
+    assert loop.is_completed
+    assert len(eth_task.klines) == 12 and btc_task.klines == btc
+
+
+class ClockTask(RecordingTask):
+    """记录每次投递时的回测时钟和fetch_ohlcv可见的K线数量"""
+
+    def __init__(self, timeframes, client):
+        super().__init__(timeframes)
+        self.client = client
+        self.clock = []
+        self.visible = []
+
+    def run_kline(self, kline: Kline) -> None:
+        super().run_kline(kline)
+        self.clock.append(self.client.current_timestamp)
+        self.visible.append({timeframe: len(self.client.fetch_ohlcv(SYMBOL, timeframe, 1000))
+                             for timeframe in self.timeframes})
+
+
+def _replay_with_clock(historical_data):
+    client = BacktestClient()
+    for timeframe, klines in historical_data.items():
+        client.load_historical_data(timeframe, klines)
+    loop = MultiTimeframeBacktestEventLoop(historical_data, start_index=0)
+    loop.set_backtest_client(client)
+    task = ClockTask(list(historical_data), client)
+    loop.add_task(task)
+    loop.start()
+    return task
+
+
+def test_multi_timeframe_fetch_ohlcv_returns_exactly_the_delivered_bars():
+    task = _replay_with_clock({'5m': _klines('5m', 12, 300_000), '15m': _klines('15m', 4, 900_000)})
+
+    assert len(task.klines) == 16
+    assert task.clock == sorted(task.clock)
+    delivered = {'5m': 0, '15m': 0}
+    for i, (kline, visible) in enumerate(zip(task.klines, task.visible)):
+        delivered[kline.timeframe] += 1
+        # 同一收盘时间的K线依次投递, 投递完这一时刻的最后一根后, 可见的K线恰好是已投递的K线
+        if i + 1 == len(task.klines) or task.clock[i + 1] != task.clock[i]:
+            assert visible == delivered
+        else:
+            # 同一毫秒收盘、稍后投递的高时间框架K线已经收盘, 此时可见
+            assert visible['5m'] == delivered['5m']
+            assert visible['15m'] == delivered['15m'] + 1
+
+
+def test_multi_timeframe_hides_higher_timeframe_bar_until_it_closes():
+    task = _replay_with_clock({'1m': _klines('1m', 120, 60_000), '1h': _klines('1h', 2, 3_600_000)})
+
+    minutes = [visible for kline, visible in zip(task.klines, task.visible) if kline.timeframe == '1m']
+    # 第一根1h K线在其最后一根1m K线处理前不可见, 之后一直可见直到下一根1h K线收盘
+    assert [visible['1h'] for visible in minutes[:59]] == [0] * 59
+    assert [visible['1h'] for visible in minutes[59:119]] == [1] * 60
+    assert minutes[119]['1h'] == 2
+    assert [visible['1m'] for visible in minutes] == list(range(1, 121))
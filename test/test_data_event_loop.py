@@ -0,0 +1,275 @@
+import json
+import threading
+import time
+from typing import List
+
+from data_event_loop import BinanceDataEventLoop, DataEventLoop, KlineTask, Task, parse_kline_message, plan_stream_shards
+from model import Kline, Symbol
+
+
+def _ws_message(stream: str, ts: int = 1_700_000_000_000, close: float = 100.0, finished: bool = False) -> str:
+    return json.dumps({
+        'stream': stream,
+        'data': {'e': 'kline', 'k': {
+            't': ts, 'o': '99.0', 'h': '101.0', 'l': '98.0', 'c': str(close), 'v': '10.0', 'x': finished,
+        }},
+    })
+
+
+class RecordingKlineTask(KlineTask):
+    def __init__(self, symbol: Symbol, timeframes: List[str]):
+        super().__init__()
+        self.name = 'RecordingKlineTask'
+        self.symbol = symbol
+        self.timeframes = timeframes
+        self.klines: List[Kline] = []
+
+    def streams(self) -> List[str]:
+        return [self.symbol.binance_ws_sub_kline(tf) for tf in self.timeframes]
+
+    def run_kline(self, kline: Kline) -> None:
+        self.klines.append(kline)
+
+
+class RecordingRawTask(Task):
+    def __init__(self):
+        super().__init__()
+        self.messages: List[str] = []
+
+    def run(self, data: str):
+        self.messages.append(data)
+
+
+def test_parse_kline_message():
+    kline = parse_kline_message(_ws_message('ethusdt@kline_5m', close=101.5, finished=True))
+    assert kline is not None
+    assert kline.symbol.binance() == 'ETHUSDT'
+    assert kline.timeframe == '5m'
+    assert kline.close == 101.5
+    assert kline.finished is True
+
+
+def test_parse_non_kline_message_returns_none():
+    assert parse_kline_message(json.dumps({'result': None, 'id': 2})) is None
+
+
+def test_dispatch_only_to_subscribed_tasks():
+    loop = DataEventLoop()
+    eth = RecordingKlineTask(Symbol(base='eth', quote='usdt'), ['5m'])
+    btc = RecordingKlineTask(Symbol(base='btc', quote='usdt'), ['5m', '15m'])
+    raw = RecordingRawTask()
+    loop.add_task(eth)
+    loop.add_task(btc)
+    loop.add_task(raw)
+
+    loop.loop(_ws_message('ethusdt@kline_5m'))
+    loop.loop(_ws_message('btcusdt@kline_15m'))
+    loop.executor.shutdown(wait=True)
+
+    assert [k.timeframe for k in eth.klines] == ['5m']
+    assert [k.timeframe for k in btc.klines] == ['15m']
+    assert len(raw.messages) == 2
+    assert set(loop.subscribed_streams()) == {'ethusdt@kline_5m', 'btcusdt@kline_5m', 'btcusdt@kline_15m'}
+
+
+def test_string_run_is_compatible_shim():
+    task = RecordingKlineTask(Symbol(base='eth', quote='usdt'), ['5m'])
+    task.run(_ws_message('ethusdt@kline_5m'))
+    task.run(_ws_message('btcusdt@kline_5m'))
+    assert len(task.klines) == 1
+
+
+def test_plan_stream_shards_is_deterministic_and_balanced():
+    streams = [f'coin{i}usdt@kline_1m' for i in range(10)]
+    rates = {stream: 1.0 for stream in streams}
+    rates['coin0usdt@kline_1m'] = 9.0
+
+    shards = plan_stream_shards(list(reversed(streams)), 2, rates)
+
+    assert shards == plan_stream_shards(streams, 2, rates)
+    assert sorted(s for shard in shards for s in shard) == sorted(streams)
+    heavy = next(shard for shard in shards if 'coin0usdt@kline_1m' in shard)
+    assert heavy == ['coin0usdt@kline_1m']
+
+
+def test_plan_stream_shards_respects_connection_limit():
+    streams = [f'coin{i}usdt@kline_1m' for i in range(5)]
+    shards = plan_stream_shards(streams, 1, max_streams_per_connection=2)
+    assert len(shards) == 3
+    assert all(len(shard) <= 2 for shard in shards)
+
+
+def test_binance_loop_drops_duplicate_finished_klines():
+    loop = BinanceDataEventLoop()
+    task = RecordingKlineTask(Symbol(base='eth', quote='usdt'), ['5m'])
+    loop.add_task(task)
+
+    loop.loop(_ws_message('ethusdt@kline_5m', ts=1, finished=True))
+    loop.loop(_ws_message('ethusdt@kline_5m', ts=1, finished=True))
+    loop.loop(_ws_message('ethusdt@kline_5m', ts=2, finished=False))
+    loop.executor.shutdown(wait=True)
+
+    assert [(k.timestamp, k.finished) for k in task.klines] == [(1, True), (2, False)]
+    assert loop.stream_message_counts['ethusdt@kline_5m'] == 3
+
+
+class FakeOhlcvClient:
+    def __init__(self, klines: List[Kline]):
+        self.klines = klines
+        self.calls: List[tuple] = []
+
+    def fetch_ohlcv(self, symbol: Symbol, timeframe: str, limit: int = 100) -> List[Kline]:
+        self.calls.append((symbol.binance(), timeframe, limit))
+        return self.klines[-limit:]
+
+
+def test_backfill_replays_missing_finished_klines_in_order():
+    symbol = Symbol(base='eth', quote='usdt')
+    step = 5 * 60 * 1000
+    now = int(time.time() * 1000) // step * step
+    history = [Kline(symbol, '5m', 1.0, 1.0, 1.0, float(i), 1.0, now - (5 - i) * step, True) for i in range(5)]
+    history.append(Kline(symbol, '5m', 1.0, 1.0, 1.0, 99.0, 1.0, now, False))
+    client = FakeOhlcvClient(history)
+
+    loop = BinanceDataEventLoop(backfill_client=client)
+    task = RecordingKlineTask(symbol, ['5m'])
+    loop.add_task(task)
+    loop.dispatch(history[1], 'ethusdt@kline_5m')
+
+    loop.backfill(['ethusdt@kline_5m', 'btcusdt@kline_5m'])
+    loop.executor.shutdown(wait=True)
+
+    assert [k.close for k in task.klines] == [1.0, 2.0, 3.0, 4.0]
+    assert len(client.calls) == 1
+    assert loop.last_finished_timestamps['ethusdt@kline_5m'] == history[4].timestamp
+
+
+class SlowOhlcvClient:
+    def __init__(self, fail_timeframe: str = ''):
+        self.fail_timeframe = fail_timeframe
+        self.calls: List[str] = []
+        self.active = 0
+        self.max_active = 0
+
+    def fetch_ohlcv(self, symbol: Symbol, timeframe: str, limit: int = 100) -> List[Kline]:
+        self.calls.append(timeframe)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        self.active -= 1
+        if timeframe == self.fail_timeframe:
+            raise ConnectionError('rate limited')
+        return [Kline(symbol, timeframe, 1, 1, 1, 1, 1, 1_700_000_000_000 + i * 60_000, True) for i in range(limit)]
+
+
+def test_warm_up_loads_history_concurrently_before_first_kline():
+    from strategy import MultiTimeframeStrategy
+    from task.strategy_task import StrategyTask
+
+    client = SlowOhlcvClient(fail_timeframe='4h')
+
+    class WarmStrategy(MultiTimeframeStrategy):
+        def exchange_client(self):
+            return client
+
+    symbol = Symbol(base='btc', quote='usdt')
+    loop = DataEventLoop()
+    strategies = [WarmStrategy(['1m', '5m']), WarmStrategy(['15m', '4h'])]
+    for strategy in strategies:
+        strategy.init_kline_nums = 10
+        loop.add_task(StrategyTask(symbol, strategy))
+
+    start = time.perf_counter()
+    failed = loop.warm_up(max_concurrency=4, max_requests_per_second=1000)
+    assert time.perf_counter() - start < 0.15
+    assert failed == 1
+    assert client.max_active > 1
+    assert sorted(client.calls) == ['15m', '1m', '4h', '5m']
+    assert len(strategies[0].klines('1m')) == 10
+
+    loop.dispatch(Kline(symbol, '1m', 2, 2, 2, 2, 1, 1_700_000_000_000 + 10 * 60_000, False))
+    loop.executor.shutdown(wait=True)
+    assert len(client.calls) == 4
+    assert len(strategies[0].klines('1m')) == 11
+
+
+def test_warm_up_fetches_timeframes_of_one_strategy_concurrently():
+    from strategy import MultiTimeframeStrategy
+    from task.strategy_task import StrategyTask
+
+    client = SlowOhlcvClient()
+
+    class WarmStrategy(MultiTimeframeStrategy):
+        def exchange_client(self):
+            return client
+
+    symbol = Symbol(base='btc', quote='usdt')
+    loop = DataEventLoop()
+    strategy = WarmStrategy(['1m', '5m', '15m', '1h'])
+    strategy.init_kline_nums = 10
+    loop.add_task(StrategyTask(symbol, strategy))
+
+    assert loop.warm_up(max_concurrency=4, max_requests_per_second=1000) == 0
+    # 请求交易所时不持有策略的data_lock
+    assert client.max_active > 1
+    assert all(len(strategy.klines(timeframe)) == 10 for timeframe in strategy.timeframes)
+
+
+def test_history_fetch_on_first_kline_does_not_hold_data_lock():
+    from strategy import MultiTimeframeStrategy
+
+    release = threading.Event()
+
+    class BlockingClient:
+        def fetch_ohlcv(self, symbol: Symbol, timeframe: str, limit: int = 100) -> List[Kline]:
+            if timeframe == '5m':
+                release.wait(5)
+            return [Kline(symbol, timeframe, 1, 1, 1, 1, 1, 1_700_000_000_000 + i * 60_000, True) for i in range(limit)]
+
+    class LazyStrategy(MultiTimeframeStrategy):
+        def __init__(self):
+            super().__init__(['1m', '5m'])
+            self.init_kline_nums = 10
+            self.finished = []
+
+        def exchange_client(self):
+            return BlockingClient()
+
+        def on_kline_finished(self, timeframe: str):
+            self.finished.append(timeframe)
+
+    symbol = Symbol(base='btc', quote='usdt')
+    strategy = LazyStrategy()
+    strategy.warm_up(symbol, '1m')
+    # 5m未预热, 收到第一根5m K线时加载历史数据, 请求卡住
+    slow = threading.Thread(target=strategy.run, args=(Kline(symbol, '5m', 2, 2, 2, 2, 1, 1_700_000_600_000, False),))
+    slow.start()
+    time.sleep(0.05)
+    fast = threading.Thread(target=strategy.run, args=(Kline(symbol, '1m', 2, 2, 2, 2, 1, 1_700_000_600_000, True),))
+    fast.start()
+    fast.join(1)
+    try:
+        assert not fast.is_alive()
+        assert strategy.finished == ['1m']
+    finally:
+        release.set()
+        slow.join(5)
+        fast.join(5)
+    assert len(strategy.klines('5m')) == 11
+
+
+def test_unfinished_kline_waits_for_data_lock_instead_of_dropping():
+    from strategy import MultiTimeframeStrategy
+
+    symbol = Symbol(base='btc', quote='usdt')
+    strategy = MultiTimeframeStrategy(['1m'])
+    strategy.kline_buffer('1m').extend([Kline(symbol, '1m', 1, 1, 1, 1, 1, 1_700_000_000_000, True)])
+
+    strategy.data_lock.acquire()
+    timer = threading.Timer(0.05, strategy.data_lock.release)
+    timer.start()
+    strategy.run(Kline(symbol, '1m', 2, 2, 2, 2, 1, 1_700_000_060_000, False))
+    timer.join()
+
+    # 锁被占用时未完成K线仍然写入, 不会丢弃最新价格
+    assert strategy.kline_buffer('1m').column('close')[-1] == 2
@@ -0,0 +1,118 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from backtest.backtest_client import BacktestClient
+from backtest.data_loader import HistoricalDataLoader
+from model import Kline, KlineBatch, Symbol, intern_symbol
+from strategy.kline_buffer import KlineBuffer
+
+SYMBOL = Symbol(base='eth', quote='usdt')
+
+
+def _write_csv(path, n: int = 500):
+    rng = np.random.default_rng(5)
+    close = 2000 + np.cumsum(rng.normal(0, 1, n))
+    df = pd.DataFrame({'timestamp': 1_700_000_000_000 + np.arange(n) * 60_000, 'open': close, 'high': close + 1,
+                       'low': close - 1, 'close': close, 'volume': rng.uniform(1, 10, n)})
+    # 乱序写入, 发布时按时间排序
+    df.sample(frac=1, random_state=1).to_csv(path, index=False)
+    return df
+
+
+def _fields(klines):
+    return [(k.timestamp, k.datetime, k.open, k.high, k.low, k.close, k.volume, k.finished) for k in klines]
+
+
+def test_load_mmap_matches_load_csv(tmp_path):
+    file_path = str(tmp_path / 'ethusdt_1m.csv')
+    _write_csv(file_path)
+    loader = HistoricalDataLoader()
+    batch = loader.load_mmap(file_path, SYMBOL, '1m')
+    klines = sorted(HistoricalDataLoader().load_csv(file_path, SYMBOL, '1m'), key=lambda k: k.timestamp)
+
+    assert isinstance(batch.close, np.memmap) or isinstance(batch.close.base, np.memmap)
+    assert _fields(batch) == _fields(klines)
+    assert _fields([batch[10], batch[-1]]) == _fields([klines[10], klines[-1]])
+    assert _fields(batch[100:103]) == _fields(klines[100:103])
+    # 已发布的文件直接复用
+    assert loader.publish_columns(file_path) == batch.path
+
+
+def test_pickle_passes_only_the_path(tmp_path):
+    file_path = str(tmp_path / 'ethusdt_1m.csv')
+    _write_csv(file_path, 5000)
+    batch = HistoricalDataLoader().load_mmap(file_path, SYMBOL, '1m')
+
+    data = pickle.dumps(batch)
+    assert len(data) < 1000
+    restored = pickle.loads(data)
+    assert restored.path == batch.path
+    assert _fields(restored[:50]) == _fields(batch[:50])
+
+    in_memory = KlineBatch(SYMBOL, '1m', np.array(batch.timestamp), np.array(batch.open), np.array(batch.high),
+                           np.array(batch.low), np.array(batch.close), np.array(batch.volume))
+    assert _fields(pickle.loads(pickle.dumps(in_memory))[:50]) == _fields(batch[:50])
+
+
+def test_fetch_ohlcv_from_batch(tmp_path):
+    file_path = str(tmp_path / 'ethusdt_1m.csv')
+    _write_csv(file_path)
+    batch = HistoricalDataLoader().load_mmap(file_path, SYMBOL, '1m')
+    batch_client, list_client = BacktestClient(), BacktestClient()
+    batch_client.load_historical_data('1m', batch)
+    list_client.load_historical_data('1m', list(batch))
+
+    for timestamp in (0, int(batch.timestamp[0]), int(batch.timestamp[0]) + 59_999, int(batch.timestamp[250]) + 1,
+                      int(batch.timestamp[-1]) + 60_000):
+        for client in (batch_client, list_client):
+            client.update_current_timestamp(timestamp)
+        assert _fields(batch_client.fetch_ohlcv(SYMBOL, '1m', 100)) == _fields(list_client.fetch_ohlcv(SYMBOL, '1m', 100))
+
+
+def test_fetch_ohlcv_matches_full_scan(tmp_path):
+    file_path = str(tmp_path / 'ethusdt_1m.csv')
+    _write_csv(file_path)
+    klines = list(HistoricalDataLoader().load_mmap(file_path, SYMBOL, '1m'))
+    client = BacktestClient()
+    client.load_historical_data('1m', klines[::-1])
+    for timestamp in (0, klines[0].timestamp, klines[0].timestamp + 59_999, klines[10].timestamp - 1,
+                      klines[300].timestamp, klines[-1].timestamp + 60_000):
+        client.update_current_timestamp(timestamp)
+        expected = [k for k in klines if k.timestamp + 60_000 - 1 <= timestamp][-100:]
+        assert _fields(client.fetch_ohlcv(SYMBOL, '1m', 100)) == _fields(expected)
+
+
+def test_buffer_extend_from_batch(tmp_path):
+    file_path = str(tmp_path / 'ethusdt_1m.csv')
+    _write_csv(file_path)
+    batch = HistoricalDataLoader().load_mmap(file_path, SYMBOL, '1m')
+    from_batch, from_list = KlineBuffer(maxlen=300), KlineBuffer(maxlen=300)
+    from_batch.extend(batch)
+    from_list.extend(list(batch))
+    assert (from_batch.symbol, from_batch.timeframe) == (from_list.symbol, from_list.timeframe)
+    pd.testing.assert_frame_equal(from_batch.to_frame(), from_list.to_frame())
+
+
+def test_load_batch_matches_load_csv(tmp_path):
+    file_path = str(tmp_path / 'ethusdt_1m.csv')
+    _write_csv(file_path)
+    loader = HistoricalDataLoader()
+    batch = loader.load_batch(file_path, SYMBOL, '1m')
+    klines = sorted(loader.load_csv(file_path, SYMBOL, '1m'), key=lambda k: k.timestamp)
+    assert _fields(batch) == _fields(klines)
+    assert _fields(KlineBatch.from_klines(klines[::-1])) == _fields(klines)
+    # 相同交易对的K线共享同一个Symbol对象
+    assert batch.symbol is klines[0].symbol is intern_symbol(Symbol(base='eth', quote='usdt'))
+
+
+def test_kline_is_compact_and_formats_datetime_lazily():
+    kline = Kline(symbol=SYMBOL, timeframe='1m', open=1, high=2, low=0.5, close=1.5, volume=3,
+                  timestamp=1_700_000_000_000, finished=True)
+    assert not hasattr(kline, '__dict__')
+    assert kline._datetime is None
+    assert kline.datetime == Kline.format_datetime(1_700_000_000_000)
+    assert kline.datetime is kline.datetime
+    restored = pickle.loads(pickle.dumps(kline))
+    assert (restored.timestamp, restored.datetime, restored.close) == (kline.timestamp, kline.datetime, kline.close)
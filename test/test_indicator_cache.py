@@ -0,0 +1,81 @@
+import numpy as np
+
+from model import Kline, OrderSide, Symbol
+from strategy.alpha_trend_signal.alpha_trend_signal import AlphaTrendSignal, alpha_trend_values
+from strategy.indicator_cache import IndicatorCache, frame_key, indicator_cache
+from strategy.kline_buffer import FRAME_COLUMNS, KlineBuffer
+
+
+def _klines(n: int = 120):
+    rng = np.random.default_rng(3)
+    close = 2000 + np.cumsum(rng.normal(0, 5, n))
+    symbol = Symbol(base='ETH', quote='USDT')
+    return [Kline(symbol=symbol, timeframe='5m', timestamp=1700000000000 + i * 300000,
+                  open=float(c), high=float(c + 3), low=float(c - 3), close=float(c), volume=float(100 + i),
+                  finished=True)
+            for i, c in enumerate(close)]
+
+
+def test_lru_eviction():
+    cache = IndicatorCache(maxsize=2)
+    calls = []
+
+    def compute(key):
+        calls.append(key)
+        return key
+
+    cache.get_or_compute('a', lambda: compute('a'))
+    cache.get_or_compute('b', lambda: compute('b'))
+    cache.get_or_compute('a', lambda: compute('a'))
+    cache.get_or_compute('c', lambda: compute('c'))
+    assert len(cache) == 2
+    # 'b'最久未使用, 被淘汰
+    cache.get_or_compute('b', lambda: compute('b'))
+    assert calls == ['a', 'b', 'c', 'b']
+
+
+def test_frame_key_tracks_window_and_last_bar():
+    buffer = KlineBuffer()
+    klines = _klines()
+    buffer.extend(klines[:-1])
+    key = frame_key(buffer.to_frame())
+    assert key[:2] == ('ETHUSDT', '5m')
+
+    buffer.upsert(klines[-1])
+    appended = frame_key(buffer.to_frame())
+    assert appended != key
+
+    last = klines[-1]
+    buffer.upsert(Kline(symbol=last.symbol, timeframe=last.timeframe, timestamp=last.timestamp, open=last.open,
+                        high=last.high, low=last.low, close=last.close + 1, volume=last.volume, finished=False))
+    assert frame_key(buffer.to_frame()) != appended
+
+
+def test_signals_share_indicator_results(monkeypatch):
+    indicator_cache.clear()
+    calls = []
+
+    def counting(df, *args):
+        calls.append(len(df))
+        return alpha_trend_values(df, *args)
+
+    monkeypatch.setattr('strategy.alpha_trend_signal.alpha_trend_signal.alpha_trend_values', counting)
+    buffer = KlineBuffer()
+    buffer.extend(_klines())
+
+    long_signal = AlphaTrendSignal(OrderSide.BUY)
+    short_signal = AlphaTrendSignal(OrderSide.SELL)
+    uncached = AlphaTrendSignal(OrderSide.BUY)
+    long_signal.run(buffer.to_frame())
+    short_signal.run(buffer.to_frame().copy())
+    assert len(calls) == 1
+    # 信号不向K线DataFrame写入指标列
+    assert list(buffer.to_frame().columns) == list(FRAME_COLUMNS)
+    assert short_signal.current_alpha_trend == long_signal.current_alpha_trend
+
+    frame = buffer.to_frame().copy()
+    frame.attrs.clear()
+    uncached.run(frame)
+    assert len(calls) == 2
+    assert uncached.current_kline_status == long_signal.current_kline_status
+    assert uncached.current_macd == long_signal.current_macd
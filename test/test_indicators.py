@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+import talib as ta
+
+from model import OrderSide
+from strategy.alpha_trend_signal.alpha_trend_signal import AlphaTrendSignal, _alpha_trend_indicator
+from strategy.indicators import EMA, MACD, MFI, AlphaTrend, WilderATR
+
+
+def _ohlcv(n: int = 400, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    close = 50000 + np.cumsum(rng.normal(0, 100, n))
+    high = close + np.abs(rng.normal(0, 50, n))
+    low = close - np.abs(rng.normal(0, 50, n))
+    volume = rng.uniform(100, 1000, n)
+    # 包含价格不变的K线, 覆盖MFI中资金流为0的分支
+    high[50:53], low[50:53], close[50:53] = high[49], low[49], close[49]
+    return high, low, close, volume
+
+
+def _assert_same(actual, expected):
+    np.testing.assert_allclose(np.asarray(actual, dtype=np.float64), expected, rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def _update_and_peek(indicator, rows):
+    """逐根K线先peek再update, 两者的结果都应与批量计算一致"""
+    peeked, updated = [], []
+    for row in rows:
+        peeked.append(indicator.peek(*row))
+        updated.append(indicator.update(*row))
+    return peeked, updated
+
+
+@pytest.mark.parametrize('period', [5, 8, 14])
+def test_atr_and_mfi_match_talib(period):
+    high, low, close, volume = _ohlcv()
+    for values in _update_and_peek(WilderATR(period), zip(high, low, close)):
+        _assert_same(values, ta.ATR(high, low, close, timeperiod=period))
+    for values in _update_and_peek(MFI(period), zip(high, low, close, volume)):
+        _assert_same(values, ta.MFI(high, low, close, volume, timeperiod=period))
+
+
+def test_ema_and_macd_match_talib():
+    _, _, close, _ = _ohlcv()
+    for values in _update_and_peek(EMA(10), zip(close)):
+        _assert_same(values, ta.EMA(close, timeperiod=10))
+
+    for fast, slow, signal in [(12, 26, 9), (8, 21, 5)]:
+        expected = ta.MACD(close, fastperiod=fast, slowperiod=slow, signalperiod=signal)
+        for values in _update_and_peek(MACD(fast, slow, signal), zip(close)):
+            values = np.asarray(values)
+            for i in range(3):
+                _assert_same(values[:, i], expected[i])
+
+
+def test_alpha_trend_matches_batch_indicator():
+    high, low, close, volume = _ohlcv()
+    df = _alpha_trend_indicator(pd.DataFrame({'high': high, 'low': low, 'close': close, 'volume': volume}))
+    expected_signal = np.nan_to_num(df['signal'].to_numpy(dtype=np.float64))
+
+    for values in _update_and_peek(AlphaTrend(1.0, 8), zip(high, low, close, volume)):
+        _assert_same([v.alpha_trend for v in values], df['alpha_trend'].to_numpy(dtype=np.float64))
+        _assert_same([v.signal for v in values], expected_signal)
+
+
+def test_incremental_signal_matches_full_recomputation():
+    high, low, close, volume = _ohlcv(300)
+    datetimes = pd.date_range('2024-01-01', periods=len(close), freq='5min').strftime('%Y-%m-%d %H:%M:%S')
+    history = pd.DataFrame({'datetime': datetimes, 'open': close, 'high': high, 'low': low, 'close': close,
+                            'volume': volume, 'finished': True})
+
+    batch = AlphaTrendSignal(OrderSide.BUY)
+    incremental = AlphaTrendSignal(OrderSide.BUY, incremental=True)
+    for end in range(60, len(history)):
+        # 每根K线先以未完成状态到达, 再以已完成状态到达
+        for finished in (False, True):
+            df = history.iloc[:end + 1].copy()
+            df.loc[df.index[-1], 'finished'] = finished
+            assert incremental.run(df.copy()) == batch.run(df.copy())
+            assert incremental.current_alpha_trend == pytest.approx(batch.current_alpha_trend, nan_ok=True)
+            assert incremental.current_macd == pytest.approx(batch.current_macd)
+            assert incremental.current_macd_signal == pytest.approx(batch.current_macd_signal)
+            assert incremental.golden_cross() == batch.golden_cross()
+            assert incremental.dead_cross() == batch.dead_cross()
+
+
+def test_precomputed_signal_matches_full_recomputation():
+    high, low, close, volume = _ohlcv(300)
+    datetimes = pd.date_range('2024-01-01', periods=len(close), freq='5min').strftime('%Y-%m-%d %H:%M:%S')
+    history = pd.DataFrame({'datetime': datetimes, 'open': close, 'high': high, 'low': low, 'close': close,
+                            'volume': volume, 'finished': True})
+
+    batch = AlphaTrendSignal(OrderSide.BUY)
+    precomputed = AlphaTrendSignal(OrderSide.BUY)
+    assert precomputed.precompute(history)
+    for end in range(60, len(history)):
+        df = history.iloc[:end + 1]
+        assert precomputed.run(df) == batch.run(df.copy())
+        assert precomputed.current_alpha_trend == pytest.approx(batch.current_alpha_trend, nan_ok=True)
+        assert precomputed.current_macd == pytest.approx(batch.current_macd)
+        assert precomputed.golden_cross() == batch.golden_cross()
+        assert precomputed.dead_cross() == batch.dead_cross()
+    # 预计算只读取信号, 不向策略的klines写入指标列
+    assert 'alpha_trend' not in history.columns
+    _assert_same(precomputed.alpha_trend_history(history.iloc[-50:]),
+                 _alpha_trend_indicator(history.copy())['alpha_trend'].to_numpy()[-50:])
@@ -0,0 +1,67 @@
+from model import Kline, Symbol
+from strategy import IntraBarPolicy, SingleTimeframeStrategy
+
+SYMBOL = Symbol(base='btc', quote='usdt')
+
+
+def _kline(close: float, finished: bool = False, i: int = 10) -> Kline:
+    return Kline(symbol=SYMBOL, timeframe='1m', open=close, high=close, low=close, close=close,
+                 volume=1, timestamp=1_700_000_000_000 + i * 60_000, finished=finished)
+
+
+class HistoryClient:
+    def fetch_ohlcv(self, symbol, timeframe, limit):
+        return [_kline(100.0, True, i) for i in range(limit)]
+
+
+class CountingStrategy(SingleTimeframeStrategy):
+    def __init__(self, policy: IntraBarPolicy, levels=()):
+        super().__init__('1m')
+        self.init_kline_nums = 5
+        self.intra_bar_policy = policy
+        self.levels = list(levels)
+        self.evaluations = []
+
+    def exchange_client(self):
+        return HistoryClient()
+
+    def relevant_price_levels(self, timeframe):
+        return self.levels
+
+    def _on_kline(self):
+        self.evaluations.append(self.latest_kline_obj.close)
+
+
+def _feed(strategy, prices, finished_last: bool = False):
+    for i, price in enumerate(prices):
+        strategy.run(_kline(price, finished_last and i == len(prices) - 1))
+
+
+def test_default_policy_evaluates_every_update():
+    strategy = CountingStrategy(IntraBarPolicy())
+    _feed(strategy, [100, 100.1, 100.2])
+    assert strategy.evaluations == [100, 100.1, 100.2]
+
+
+def test_min_interval(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('strategy.time.monotonic', lambda: now[0])
+    strategy = CountingStrategy(IntraBarPolicy(min_interval=1.0))
+    for t, price in [(0.0, 100), (0.5, 101), (1.2, 102), (1.5, 103)]:
+        now[0] = t
+        strategy.run(_kline(price))
+    # 已完成K线不受节流影响
+    strategy.run(_kline(104, finished=True))
+    assert strategy.evaluations == [100, 102, 104]
+
+
+def test_price_change_threshold():
+    strategy = CountingStrategy(IntraBarPolicy(min_price_change_rate=0.01))
+    _feed(strategy, [100, 100.5, 100.9, 101.0, 101.5, 102.1])
+    assert strategy.evaluations == [100, 101.0, 102.1]
+
+
+def test_level_touch_between_updates():
+    strategy = CountingStrategy(IntraBarPolicy(on_level_touch=True), levels=[99.0, 101.0])
+    _feed(strategy, [100, 100.5, 101.2, 101.5, 100.8, 98.5])
+    assert strategy.evaluations == [101.2, 100.8, 98.5]
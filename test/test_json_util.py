@@ -0,0 +1,56 @@
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from model import OrderSide, PositionSide, Symbol
+from strategy.grids_strategy_v2 import Order, OrderRecorder
+from utils.json_util import dump_file, dumpb, dumps, loads
+
+
+class Plain:
+    def __init__(self):
+        self.side = OrderSide.BUY
+        self.qty = 1.5
+
+
+def test_dumps_matches_stdlib_for_ws_payload():
+    payload = {"stream": "btcusdt@kline_1m", "data": {"k": {"t": 1, "o": "1.0", "x": False}}}
+    assert json.loads(dumps(payload)) == payload
+    assert loads(dumps(payload).encode()) == payload
+
+
+def test_custom_types():
+    data = {
+        'side': OrderSide.SELL,
+        'position_side': PositionSide.LONG,
+        'symbol': Symbol(base='doge', quote='usdc'),
+        'plain': Plain(),
+        'ts': pd.Timestamp('2024-01-01', tz='UTC'),
+        'dt': datetime(2024, 1, 1, tzinfo=timezone.utc),
+        'np': np.float64(2.5),
+        1: 'int key',
+    }
+    result = loads(dumps(data))
+    assert result['side'] == 'sell'
+    assert result['symbol'] == {'base': 'doge', 'quote': 'usdc'}
+    assert result['plain'] == {'side': 'buy', 'qty': 1.5}
+    assert result['ts'].startswith('2024-01-01T00:00:00')
+    assert result['dt'] == result['ts']
+    assert result['np'] == 2.5
+    assert result['1'] == 'int key'
+
+
+def test_pydantic_state_roundtrip(tmp_path):
+    orders = [Order(entry_id=f'BUY{i}', side=OrderSide.BUY, price=0.1, quantity=200,
+                    fixed_take_profit_rate=0.01, signal_min_take_profit_rate=0.005) for i in range(3)]
+    recorder = OrderRecorder(order_file_path='', orders=orders, history_orders=orders)
+    assert OrderRecorder.model_validate_json(dumpb(recorder)) == recorder
+    assert loads(dumpb(recorder, indent=True)) == loads(recorder.model_dump_json())
+
+    path = tmp_path / 'nested' / 'state.json'
+    dump_file({'recorder': recorder, 'count': 3}, str(path))
+    state = loads(path.read_bytes())
+    assert state['count'] == 3
+    assert OrderRecorder.model_validate(state['recorder']) == recorder
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from model import Kline, Symbol
+from strategy import MultiTimeframeStrategy
+from strategy.kline_buffer import FRAME_COLUMNS, KlineBuffer
+
+SYMBOL = Symbol(base='btc', quote='usdt')
+
+
+def _kline(i: int, close: float = 100.0, finished: bool = True) -> Kline:
+    return Kline(symbol=SYMBOL, timeframe='1m', open=close - 1, high=close + 1, low=close - 2, close=close,
+                 volume=10 + i, timestamp=1_700_000_000_000 + i * 60_000, finished=finished)
+
+
+def test_append_and_update_last():
+    buffer = KlineBuffer(capacity=2)
+    assert buffer.upsert(_kline(0))
+    assert buffer.upsert(_kline(1, finished=False))
+    assert not buffer.upsert(_kline(1, close=105, finished=True))
+    assert buffer.upsert(_kline(2))
+
+    assert len(buffer) == 3
+    assert buffer.capacity >= 3
+    assert list(buffer.column('close')) == [100.0, 105.0, 100.0]
+    assert list(buffer.column('finished')) == [True, True, True]
+    assert buffer.last_timestamp() == _kline(2).timestamp
+
+
+def test_column_view_is_zero_copy_and_read_only():
+    buffer = KlineBuffer()
+    buffer.extend([_kline(i) for i in range(5)])
+    view = buffer.column('close')
+    buffer.upsert(_kline(4, close=200))
+    assert view[-1] == 200
+    with pytest.raises(ValueError):
+        view[0] = 1
+
+
+def test_frame_is_cached_and_keeps_indicator_columns_on_tick_update():
+    buffer = KlineBuffer()
+    buffer.extend([_kline(i) for i in range(3)])
+    frame = buffer.to_frame()
+    assert tuple(frame.columns) == FRAME_COLUMNS
+    assert buffer.to_frame() is frame
+
+    frame['signal'] = np.arange(3)
+    buffer.upsert(_kline(2, close=150, finished=False))
+    assert buffer.to_frame() is frame
+    assert frame['close'].iloc[-1] == 150
+    assert not frame['finished'].iloc[-1]
+    assert frame['signal'].iloc[-1] == 2
+
+    buffer.upsert(_kline(3))
+    rebuilt = buffer.to_frame()
+    assert rebuilt is not frame
+    assert len(rebuilt) == 4
+    assert list(rebuilt['datetime']) == [_kline(i).datetime for i in range(4)]
+
+
+def test_retention_keeps_latest_window():
+    buffer = KlineBuffer(capacity=4, maxlen=3)
+    assert buffer.capacity >= 6
+    buffer.extend([_kline(i) for i in range(5)])
+    assert list(buffer.column('volume')) == [12, 13, 14]
+
+    resizes = 0
+    original_resize = buffer._resize
+
+    def counting_resize(capacity):
+        nonlocal resizes
+        resizes += 1
+        original_resize(capacity)
+
+    buffer._resize = counting_resize
+    for i in range(5, 105):
+        buffer.upsert(_kline(i))
+        assert len(buffer) == 3
+    assert list(buffer.column('volume')) == [112, 113, 114]
+    assert len(buffer.to_frame()) == 3
+    # 只在写到数组末尾时搬移, 每 capacity - maxlen 根K线一次
+    assert resizes <= 100 // (buffer.capacity - 3) + 1
+    assert buffer.capacity == 6
+
+
+class FakeClient:
+    def fetch_ohlcv(self, symbol, timeframe, limit):
+        return [_kline(i) for i in range(limit)]
+
+
+class RecordingStrategy(MultiTimeframeStrategy):
+    def __init__(self):
+        super().__init__(['1m'])
+        self.init_kline_nums = 5
+
+    def exchange_client(self):
+        return FakeClient()
+
+
+def test_strategy_keeps_klines_in_buffer():
+    strategy = RecordingStrategy()
+    strategy.run(_kline(4, close=120, finished=False))
+    strategy.run(_kline(5, finished=False))
+
+    df = strategy.klines('1m')
+    assert len(df) == 6
+    assert df['close'].iloc[4] == 120
+    assert not df['finished'].iloc[-1]
+    assert strategy.kline_buffer('1m').column('volume')[-1] == 15
+
+
+def test_strategy_retention_per_timeframe():
+    strategy = RecordingStrategy()
+    strategy.kline_retention_margin = 2
+    assert strategy.retention('1m') == 7
+    for i in range(5, 50):
+        strategy.run(_kline(i))
+    assert len(strategy.klines('1m')) == 7
+
+    strategy = RecordingStrategy()
+    strategy.kline_retention['1m'] = None
+    for i in range(5, 50):
+        strategy.run(_kline(i))
+    assert len(strategy.klines('1m')) == 50
+
+
+def test_datetime_is_formatted_once_per_materialised_kline(monkeypatch):
+    formatted = []
+    original = Kline.format_datetime
+    monkeypatch.setattr(Kline, 'format_datetime', staticmethod(lambda ts: formatted.append(ts) or original(ts)))
+
+    buffer = KlineBuffer(capacity=4, maxlen=5)
+    for i in range(20):
+        buffer.upsert(_kline(i, finished=False))
+        buffer.upsert(_kline(i, close=101))
+    # 写入K线时不格式化datetime
+    assert formatted == []
+
+    frame = buffer.to_frame()
+    assert list(frame['datetime']) == [original(_kline(i).timestamp) for i in range(15, 20)]
+    assert len(formatted) == 5
+
+    # 原地更新最后一根K线不重新格式化, 新K线只格式化自己
+    buffer.upsert(_kline(19, close=102, finished=False))
+    assert buffer.to_frame()['close'].iloc[-1] == 102
+    buffer.upsert(_kline(20))
+    assert list(buffer.to_frame()['datetime']) == [original(_kline(i).timestamp) for i in range(16, 21)]
+    assert list(buffer.column('datetime')) == list(buffer.to_frame()['datetime'])
+    assert len(formatted) == 6
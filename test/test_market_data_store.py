@@ -0,0 +1,123 @@
+from data_event_loop import DataEventLoop
+from model import Kline, Symbol
+from strategy import MultiTimeframeStrategy
+from strategy.market_data_store import MarketDataStore
+from task.strategy_task import StrategyTask
+
+SYMBOL = Symbol(base='btc', quote='usdt')
+
+
+def _kline(i: int, close: float = 100.0, finished: bool = True) -> Kline:
+    return Kline(symbol=SYMBOL, timeframe='1m', open=close, high=close, low=close, close=close,
+                 volume=1, timestamp=1_700_000_000_000 + i * 60_000, finished=finished)
+
+
+class CountingClient:
+    def __init__(self):
+        self.calls = 0
+
+    def fetch_ohlcv(self, symbol, timeframe, limit):
+        self.calls += 1
+        return [_kline(i) for i in range(limit)]
+
+
+class RecordingStrategy(MultiTimeframeStrategy):
+    def __init__(self, client: CountingClient):
+        super().__init__(['1m'])
+        self.init_kline_nums = 5
+        self.client = client
+
+    def exchange_client(self):
+        return self.client
+
+
+def test_strategies_share_series_and_warm_up_once():
+    store = MarketDataStore()
+    client = CountingClient()
+    a, b = RecordingStrategy(client), RecordingStrategy(client)
+    a.use_market_data_store(store)
+    b.use_market_data_store(store)
+
+    tick = _kline(5, close=101, finished=False)
+    a.run(tick)
+    b.run(tick)
+    finished = _kline(5, close=102)
+    a.run(finished)
+    # b晚到的旧tick不会覆盖已完成K线
+    b.run(tick)
+    b.run(finished)
+
+    assert client.calls == 1
+    assert a.kline_buffer('1m') is b.kline_buffer('1m')
+    assert len(a.klines('1m')) == 6
+    assert b.klines('1m')['close'].iloc[-1] == 102
+    assert bool(b.klines('1m')['finished'].iloc[-1])
+    assert a.klines('1m') is not b.klines('1m')
+
+
+def test_update_is_idempotent_and_ignores_stale_frames():
+    store = MarketDataStore()
+    series = store.acquire(SYMBOL, '1m')
+    store.initialize(series, lambda: [_kline(0), _kline(1)])
+
+    kline = _kline(2, finished=False)
+    assert store.update(kline)
+    assert not store.update(kline)
+    assert not store.update(_kline(1, close=50))
+    assert store.update(_kline(2, close=99))
+    assert len(series.buffer) == 3
+    assert series.buffer.column('close')[-1] == 99
+
+
+def test_stale_in_progress_update_does_not_overwrite_newer_one():
+    store = MarketDataStore()
+    series = store.acquire(SYMBOL, '1m')
+    store.initialize(series, lambda: [_kline(0), _kline(1)])
+
+    older, newer = _kline(2, close=101, finished=False), _kline(2, close=103, finished=False)
+    older.seq, newer.seq = 10, 11
+    # 两个lane处理同一根K线的两次未完成更新, 较快的lane先写入较新的一次
+    assert store.update(newer)
+    assert not store.update(older)
+    assert series.buffer.column('close')[-1] == 103
+    assert series.last_seq == 11
+
+
+def test_dispatch_tags_klines_with_increasing_seq():
+    loop = DataEventLoop(market_data_store=None)
+    klines = [_kline(2, close=101, finished=False), _kline(2, close=102, finished=False), _kline(2)]
+    for kline in klines:
+        loop.dispatch(kline)
+    assert [kline.seq for kline in klines] == sorted(kline.seq for kline in klines)
+    assert klines[0].seq > 0 and len({kline.seq for kline in klines}) == 3
+
+
+def test_release_drops_unused_series():
+    store = MarketDataStore()
+    store.acquire(SYMBOL, '1m', maxlen=10)
+    series = store.acquire(SYMBOL, '1m', maxlen=20)
+    assert series.buffer.maxlen == 20
+    store.release(SYMBOL, '1m')
+    assert store.keys() == [('BTCUSDT', '1m')]
+    store.release(SYMBOL, '1m')
+    assert store.keys() == []
+
+
+def test_event_loop_attaches_and_releases_store():
+    store = MarketDataStore()
+    loop = DataEventLoop(market_data_store=store)
+    client = CountingClient()
+    tasks = [StrategyTask(SYMBOL, RecordingStrategy(client)) for _ in range(2)]
+    for task in tasks:
+        loop.add_task(task)
+
+    loop.dispatch(_kline(5, finished=False))
+    loop.executor.shutdown(wait=True)
+
+    assert client.calls == 1
+    assert store.get(SYMBOL, '1m').refcount == 2
+    for task in tasks:
+        loop.remove_task(task)
+    assert store.keys() == []
+    assert loop.subscribed_streams() == []
+    assert loop.executor.lane_depths() == {}
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from data_event_loop import DataEventLoop, KlineTask
+from metrics import MetricsRegistry, metrics
+
+
+class RecordingTask(KlineTask):
+    def __init__(self):
+        self.name = 'recording'
+        self.klines = []
+
+    def streams(self):
+        return ['btcusdt@kline_1m']
+
+    def run_kline(self, kline):
+        time.sleep(0.002)
+        self.klines.append(kline)
+
+
+def _message(timestamp: int, finished: bool) -> str:
+    return ('{"stream":"btcusdt@kline_1m","data":{"e":"kline","E":%d,"s":"BTCUSDT","k":{"t":%d,"T":%d,"s":"BTCUSDT",'
+            '"i":"1m","o":"1","c":"2","h":"3","l":"0.5","v":"10","x":%s}}}'
+            % (timestamp, timestamp, timestamp + 59999, 'true' if finished else 'false'))
+
+
+def test_histogram_and_counters():
+    registry = MetricsRegistry()
+    for value in [1, 2, 3, 200]:
+        registry.observe('stage', value)
+    registry.inc('dropped')
+    registry.inc('dropped', 2)
+    registry.register_gauge('depth', lambda: 7)
+
+    snapshot = registry.snapshot()
+    assert snapshot['histograms']['stage']['count'] == 4
+    assert snapshot['histograms']['stage']['max_ms'] == 200
+    assert snapshot['histograms']['stage']['p50_ms'] == 2.5
+    assert snapshot['counters']['dropped'] == 3
+    assert snapshot['gauges']['depth'] == 7
+    assert 'stage' in registry.summary()
+
+
+def test_timed_decorator_and_disabled_registry():
+    registry = MetricsRegistry()
+
+    @registry.timed('call')
+    def call(x):
+        return x * 2
+
+    assert call(2) == 4
+    assert registry.histogram('call').count == 1
+
+    registry.enabled = False
+    call(3)
+    registry.inc('ignored')
+    assert registry.histogram('call').count == 1
+    assert registry.counter('ignored') == 0
+
+
+def test_event_loop_records_pipeline_stages():
+    metrics.reset()
+    loop = DataEventLoop(max_workers=2)
+    loop.register_gauges()
+    task = RecordingTask()
+    loop.add_task(task)
+
+    loop.loop(_message(0, True))
+    loop.loop(_message(60000, False))
+    loop.executor.shutdown(wait=True)
+
+    assert len(task.klines) == 2
+    for stage in ['receive', 'decode', 'dispatch', 'queue_wait', 'pipeline']:
+        assert metrics.histogram(stage).count == 2, stage
+    assert metrics.histogram('pipeline').max >= 2
+    assert metrics.snapshot()['gauges']['executor.queue_depth'] == 0
+
+
+def test_receive_latency_and_gauge_owner():
+    metrics.reset()
+    loop = DataEventLoop(max_workers=1)
+    loop.register_gauges()
+    loop.add_task(RecordingTask())
+    now = int(time.time() * 1000)
+    loop.loop(_message(now - 250, True))
+    loop.executor.shutdown(wait=True)
+    # receive只记录交易所事件时间到本地收到的延迟, 不包含解码和分发
+    assert 250 <= metrics.histogram('receive').max < 1250
+
+    # 其他事件循环(如回测)不会替换已注册的仪表
+    other = DataEventLoop(max_workers=1)
+    other.executor.configure_lane('busy', None, loop.overflow_policy)
+    release = threading.Event()
+    other.executor.submit('busy', release.wait)
+    other.executor.submit('busy', lambda: None)
+    assert metrics.snapshot()['gauges']['executor.queue_depth'] == 0
+    release.set()
+    other.executor.shutdown(wait=True)
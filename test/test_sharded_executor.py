@@ -0,0 +1,267 @@
+import threading
+import time
+
+from metrics import metrics
+from sharded_executor import CoalescingMailbox, OverflowPolicy, ShardedExecutor
+
+
+def test_same_lane_runs_in_submission_order():
+    executor = ShardedExecutor(max_workers=4)
+    results = []
+
+    def work(i: int):
+        time.sleep(0.0005 * (i % 3))
+        results.append(i)
+
+    for i in range(200):
+        executor.submit('ethusdt@kline_5m', work, i)
+    executor.shutdown(wait=True)
+
+    assert results == list(range(200))
+
+
+def test_lanes_run_in_parallel():
+    executor = ShardedExecutor(max_workers=2)
+    barrier = threading.Barrier(2, timeout=2)
+    passed = []
+
+    def work(name: str):
+        barrier.wait()
+        passed.append(name)
+
+    executor.submit('a', work, 'a')
+    executor.submit('b', work, 'b')
+    executor.shutdown(wait=True)
+
+    assert sorted(passed) == ['a', 'b']
+
+
+def test_lane_lag_is_reported():
+    executor = ShardedExecutor(max_workers=1, lag_threshold=5)
+    release = threading.Event()
+
+    executor.submit('slow', release.wait)
+    for _ in range(10):
+        executor.submit('slow', lambda: None)
+
+    assert executor.lagging_lanes() == ['slow']
+    assert executor.lane_depths()['slow'] >= 9
+
+    release.set()
+    executor.shutdown(wait=True)
+    assert executor.lagging_lanes() == []
+
+
+def test_failed_task_does_not_block_lane():
+    executor = ShardedExecutor(max_workers=1)
+    results = []
+
+    def boom():
+        raise RuntimeError('boom')
+
+    executor.submit('lane', boom)
+    executor.submit('lane', results.append, 1)
+    executor.shutdown(wait=True)
+
+    assert results == [1]
+
+
+def test_remove_lane_drops_idle_lane_and_busy_lane_after_drain():
+    executor = ShardedExecutor(max_workers=2)
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def block():
+        started.set()
+        release.wait()
+
+    executor.configure_lane('idle', 10)
+    executor.submit('busy', block)
+    executor.submit('busy', results.append, 1)
+    assert started.wait(2)
+    executor.remove_lane('idle')
+    executor.remove_lane('busy')
+    # 正在执行的lane在积压任务执行完前保留
+    assert executor.lane_depths() == {'busy': 1}
+
+    release.set()
+    executor.shutdown(wait=True)
+    assert results == [1]
+    assert executor.lane_depths() == {}
+
+
+def test_lane_reused_before_removal_completes_is_kept():
+    executor = ShardedExecutor(max_workers=1)
+    release = threading.Event()
+
+    executor.submit('lane', release.wait)
+    executor.remove_lane('lane')
+    executor.configure_lane('lane', 10)
+    release.set()
+    executor.shutdown(wait=True)
+    assert executor.lane_depths() == {'lane': 0}
+
+
+def test_mailbox_keeps_latest_unfinished_update():
+    mailbox = CoalescingMailbox()
+    mailbox.put('u1', key='eth@5m', replaceable=True)
+    mailbox.put('u2', key='eth@5m', replaceable=True)
+    mailbox.put('btc', key='btc@5m', replaceable=True)
+    mailbox.put('u3', key='eth@5m', replaceable=True)
+
+    assert len(mailbox) == 2
+    assert mailbox.coalesced_count == 2
+    assert [mailbox.get(), mailbox.get()] == ['btc', 'u3']
+
+
+def test_mailbox_delivers_finished_exactly_once_in_order():
+    mailbox = CoalescingMailbox()
+    mailbox.put('u1', key='eth@5m', replaceable=True)
+    mailbox.put('f1', key='eth@5m', replaceable=False)
+    mailbox.put('u2', key='eth@5m', replaceable=True)
+    mailbox.put('f2', key='eth@5m', replaceable=False)
+    mailbox.put('u3', key='eth@5m', replaceable=True)
+
+    assert [mailbox.get() for _ in range(len(mailbox))] == ['f1', 'f2', 'u3']
+
+
+def test_busy_lane_coalesces_unfinished_updates():
+    executor = ShardedExecutor(max_workers=1)
+    release = threading.Event()
+    results = []
+
+    executor.submit('task', release.wait)
+    for i in range(10):
+        executor.submit('task', results.append, f'u{i}', coalesce_key='eth@5m', replaceable=True)
+    executor.submit('task', results.append, 'f', coalesce_key='eth@5m', replaceable=False)
+    executor.submit('task', results.append, 'next', coalesce_key='eth@5m', replaceable=True)
+    release.set()
+    executor.shutdown(wait=True)
+
+    assert results == ['f', 'next']
+    assert executor.coalesced_count == 10
+
+
+def _blocked_lane(policy: OverflowPolicy, max_pending: int):
+    executor = ShardedExecutor(max_workers=1)
+    executor.configure_lane('task', max_pending, policy)
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def block():
+        started.set()
+        release.wait(2)
+
+    executor.submit('task', block)
+    assert started.wait(2)
+    return executor, release, results
+
+
+def test_drop_oldest_policy_keeps_finished_updates():
+    metrics.reset()
+    executor, release, results = _blocked_lane(OverflowPolicy.DROP_OLDEST, 3)
+
+    executor.submit('task', results.append, 'a-1', coalesce_key='a', replaceable=True)
+    executor.submit('task', results.append, 'b-1', coalesce_key='b', replaceable=True)
+    executor.submit('task', results.append, 'c-done', coalesce_key='c')
+    executor.submit('task', results.append, 'd-1', coalesce_key='d', replaceable=True)
+    executor.submit('task', results.append, 'e-done', coalesce_key='e')
+    executor.submit('task', results.append, 'f-done', coalesce_key='f')
+    # 没有可丢弃的未完成更新时, 已完成更新仍然入队
+    executor.submit('task', results.append, 'g-done', coalesce_key='g')
+    assert executor.lane_depths()['task'] == 4
+
+    release.set()
+    executor.shutdown(wait=True)
+
+    assert results == ['c-done', 'e-done', 'f-done', 'g-done']
+    assert metrics.counter('executor.overflow.dropped') == 3
+
+
+def test_shed_policy_rejects_new_unfinished_updates():
+    metrics.reset()
+    executor, release, results = _blocked_lane(OverflowPolicy.SHED, 2)
+
+    assert executor.submit('task', results.append, 1, coalesce_key='a', replaceable=True)
+    assert executor.submit('task', results.append, 2, coalesce_key='b', replaceable=True)
+    assert not executor.submit('task', results.append, 3, coalesce_key='c', replaceable=True)
+    # 同key的更新只是取代旧消息, 不占用新位置
+    assert executor.submit('task', results.append, 4, coalesce_key='a', replaceable=True)
+    assert executor.submit('task', results.append, 5, coalesce_key='c')
+
+    release.set()
+    executor.shutdown(wait=True)
+
+    assert results == [2, 4, 5]
+    assert metrics.counter('executor.overflow.shed') == 1
+
+
+def test_block_policy_applies_backpressure():
+    metrics.reset()
+    executor, release, results = _blocked_lane(OverflowPolicy.BLOCK, 1)
+    executor.submit('task', results.append, 1)
+
+    submitted = threading.Event()
+
+    def producer():
+        executor.submit('task', results.append, 2)
+        submitted.set()
+
+    threading.Thread(target=producer, daemon=True).start()
+    assert not submitted.wait(0.1)
+
+    release.set()
+    assert submitted.wait(2)
+    executor.shutdown(wait=True)
+
+    assert results == [1, 2]
+    assert metrics.counter('executor.overflow.blocked') == 1
+
+
+def test_hammered_key_keeps_queue_bounded():
+    executor, release, results = _blocked_lane(OverflowPolicy.DROP_OLDEST, 4)
+    executor.submit('task', results.append, 'f1', coalesce_key='eth@5m')
+    executor.submit('task', results.append, 'f2', coalesce_key='eth@15m')
+    mailbox = executor._lanes['task'].items
+    for i in range(1000):
+        executor.submit('task', results.append, f'u{i}', coalesce_key='eth@5m', replaceable=True)
+        assert len(mailbox._entries) <= 4
+
+    # 两个key交替更新时作废的消息被压缩, 队列长度不超过有效消息数的两倍
+    for i in range(1000):
+        executor.submit('task', results.append, f'b{i}', coalesce_key='btc@5m', replaceable=True)
+        executor.submit('task', results.append, f'e{i}', coalesce_key='eth@5m', replaceable=True)
+        assert len(mailbox._entries) <= 2 * len(mailbox)
+
+    release.set()
+    executor.shutdown(wait=True)
+    assert results == ['f1', 'f2', 'b999', 'e999']
+
+
+def test_mailbox_matches_unbounded_reference():
+    import random
+    rng = random.Random(9)
+    mailbox = CoalescingMailbox()
+    # 不压缩的参考实现: [value, key, replaceable, alive]
+    reference = []
+    for i in range(5000):
+        op = rng.random()
+        if op < 0.6:
+            key, replaceable = rng.choice(['a', 'b', 'c']), rng.random() < 0.8
+            for entry in reference:
+                if entry[1] == key and entry[2] and entry[3]:
+                    entry[3] = False
+            reference.append([i, key, replaceable, True])
+            mailbox.put(i, key, replaceable)
+        elif op < 0.7:
+            dropped = next((entry for entry in reference if entry[3] and entry[2]), None)
+            if dropped is not None:
+                dropped[3] = False
+            assert mailbox.drop_oldest() == (dropped is not None)
+        elif len(mailbox):
+            expected = next(entry for entry in reference if entry[3])
+            expected[3] = False
+            assert mailbox.get() == expected[0]
+        assert len(mailbox) == sum(entry[3] for entry in reference)
+        assert len(mailbox._entries) <= 2 * len(mailbox) + 1
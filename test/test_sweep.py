@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+import backtest.sweep as sweep
+from backtest.sweep import SweepSettings, build_config, grid_search, random_search, run_id, run_sweep
+from model import Kline, OrderSide, PositionSide, Symbol
+from strategy.alpha_trend_signal.alpha_trend_grids_signal import AlphaTrendGridsSignal
+from strategy.alpha_trend_signal.alpha_trend_signal import AlphaTrendSignal
+from strategy.grids_strategy_v2 import SignalGridStrategyConfig
+
+SYMBOL = Symbol(base='eth', quote='usdt')
+
+
+def _klines(n: int = 1000):
+    rng = np.random.default_rng(11)
+    close = 2000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    return [Kline(symbol=SYMBOL, timeframe='15m', open=float(c), high=float(c * 1.003), low=float(c * 0.997),
+                  close=float(c), volume=float(rng.uniform(100, 1000)), timestamp=1_700_000_000_000 + i * 900_000,
+                  finished=True)
+            for i, c in enumerate(close)]
+
+
+def _config():
+    return SignalGridStrategyConfig(symbol=SYMBOL, timeframe='15m', position_side=PositionSide.LONG,
+                                    master_side=OrderSide.BUY, per_order_qty=0.02, grid_spacing_rate=0.01,
+                                    max_order=5, signal=AlphaTrendGridsSignal(AlphaTrendSignal(OrderSide.BUY)),
+                                    fixed_rate_take_profit=True, fixed_take_profit_rate=0.01,
+                                    order_file_path='/nonexistent/should_not_be_used.json')
+
+
+def test_parameter_spaces():
+    assert grid_search({'a': [1, 2], 'b': [0.1]}) == [{'a': 1, 'b': 0.1}, {'a': 2, 'b': 0.1}]
+    samples = random_search({'a': (1, 3), 'b': (0.1, 0.2), 'c': ['x', 'y']}, 20, seed=1)
+    assert samples == random_search({'a': (1, 3), 'b': (0.1, 0.2), 'c': ['x', 'y']}, 20, seed=1)
+    assert all(s['a'] in (1, 2, 3) and 0.1 <= s['b'] <= 0.2 and s['c'] in ('x', 'y') for s in samples)
+    assert run_id({'a': 1, 'b': 2}) == run_id({'b': 2, 'a': 1})
+
+
+def test_sweep_ranks_and_resumes(tmp_path, monkeypatch):
+    param_sets = grid_search({'grid_spacing_rate': [0.005, 0.01], 'fixed_take_profit_rate': [0.005, 0.01]})
+    results_file = str(tmp_path / 'sweep.jsonl')
+    table = run_sweep(_config(), param_sets, {'15m': _klines()}, SweepSettings(), max_workers=2,
+                      results_file=results_file)
+
+    assert len(table) == 4
+    assert table['error'].isna().all()
+    assert (table['total_trades'] > 0).any()
+    assert list(table['net_return']) == sorted(table['net_return'], reverse=True)
+    with open(results_file) as f:
+        assert len(f.readlines()) == 4
+
+    # 所有组合都已完成, 再次运行不启动进程池
+    def fail(*args, **kwargs):
+        raise AssertionError('should not run')
+
+    monkeypatch.setattr(sweep, 'ProcessPoolExecutor', fail)
+    resumed = run_sweep(_config(), param_sets, {'15m': _klines()}, results_file=results_file)
+    assert sorted(resumed['run_id']) == sorted(table['run_id'])
+
+
+def test_sweep_with_memory_mapped_data(tmp_path):
+    import pandas as pd
+    from backtest.data_loader import HistoricalDataLoader
+
+    klines = _klines()
+    file_path = str(tmp_path / 'ethusdt_15m.csv')
+    pd.DataFrame({'timestamp': [k.timestamp for k in klines], 'open': [k.open for k in klines],
+                  'high': [k.high for k in klines], 'low': [k.low for k in klines],
+                  'close': [k.close for k in klines], 'volume': [k.volume for k in klines]}).to_csv(file_path, index=False)
+    batch = HistoricalDataLoader().load_mmap(file_path, SYMBOL, '15m')
+    loaded = HistoricalDataLoader().load_csv(file_path, SYMBOL, '15m')
+
+    param_sets = grid_search({'grid_spacing_rate': [0.005, 0.01]})
+    mapped = run_sweep(_config(), param_sets, {'15m': batch}, max_workers=2)
+    in_memory = run_sweep(_config(), param_sets, {'15m': loaded}, max_workers=2)
+    columns = ['run_id', 'net_return', 'total_trades']
+    assert mapped[columns].equals(in_memory[columns])
+
+
+def test_resume_ignores_results_from_other_settings_or_data(tmp_path, monkeypatch):
+    param_sets = grid_search({'grid_spacing_rate': [0.01]})
+    results_file = str(tmp_path / 'sweep.jsonl')
+    first = run_sweep(_config(), param_sets, {'15m': _klines()}, max_workers=1, results_file=results_file)
+
+    calls = []
+    real_executor = sweep.ProcessPoolExecutor
+
+    def counting(*args, **kwargs):
+        calls.append(1)
+        return real_executor(*args, **kwargs)
+
+    monkeypatch.setattr(sweep, 'ProcessPoolExecutor', counting)
+    fee = run_sweep(_config(), param_sets, {'15m': _klines()}, SweepSettings(taker_fee=0.001), max_workers=1,
+                    results_file=results_file)
+    data = run_sweep(_config(), param_sets, {'15m': _klines(900)}, max_workers=1, results_file=results_file)
+    base = run_sweep(_config().model_copy(update={'max_order': 6}), param_sets, {'15m': _klines()}, max_workers=1,
+                     results_file=results_file)
+    assert len(calls) == 3
+    assert len({first['run_id'][0], fee['run_id'][0], data['run_id'][0], base['run_id'][0]}) == 4
+
+
+def test_invalid_parameters_fail_before_running():
+    with pytest.raises(ValueError):
+        build_config(_config(), {'max_order': 'many'})
+    with pytest.raises(ValueError):
+        build_config(_config(), {'grid_spacing': 0.01})
+    base = _config()
+    config = build_config(base, {'max_order': '7'})
+    assert config.max_order == 7 and base.max_order == 5
+    # 每次回测使用独立的信号对象
+    assert config.signal is not base.signal
+    with pytest.raises(ValueError):
+        run_sweep(_config(), [{'max_order': 3}, {'max_order': 'many'}], {'15m': _klines()})
@@ -1,24 +1,47 @@
-import json
-from enum import Enum
 import os
+from datetime import datetime
+from enum import Enum
 from typing import Any
 
-def custom_serializer(obj: Any):
+import orjson
+from pydantic import BaseModel
+
+_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    """orjson无法原生序列化的类型: pydantic模型、枚举子类、pandas时间戳、普通对象"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode='json')
     if isinstance(obj, Enum):
         return obj.value
+    if isinstance(obj, datetime):
+        return obj.isoformat()
     if hasattr(obj, '__dict__'):
         return obj.__dict__
     raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
 
-def dumps(obj: Any) -> str:
-    return json.dumps(obj, default=custom_serializer)
 
-def dump_file(obj: Any, path: str):
-    if not os.path.exists(path):
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, 'w') as file:
-        json.dump(obj, file, default=custom_serializer)
-        file.write('\n')
+def dumpb(obj: Any, indent: bool = False) -> bytes:
+    if isinstance(obj, BaseModel):
+        # 顶层pydantic模型直接使用pydantic-core的Rust序列化, 与先model_dump再orjson相比少一次对象树遍历
+        return obj.model_dump_json(indent=2 if indent else None).encode()
+    option = _OPTIONS | orjson.OPT_INDENT_2 if indent else _OPTIONS
+    return orjson.dumps(obj, default=_default, option=option)
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    return dumpb(obj, indent).decode()
+
+
+def dump_file(obj: Any, path: str, indent: bool = False):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(dumpb(obj, indent))
+        file.write(b'\n')
+
 
-def loads(s: str) -> Any:
-    return json.loads(s)
+def loads(s: str | bytes) -> Any:
+    return orjson.loads(s)